@@ -0,0 +1,36 @@
+"""canonical forecasts
+
+Revision ID: 3e9d6b1c7f20
+Revises: 8c41e7b2a9d3
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e9d6b1c7f20'
+down_revision: Union[str, Sequence[str], None] = '8c41e7b2a9d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('prediction', sa.Column('source_ts', sa.DateTime(), nullable=True))
+    op.add_column('prediction', sa.Column('step', sa.Integer(), nullable=True))
+    # التوقعات المشتركة (بدون user_id): صف واحد لكل (عملة، فترة، شمعة، ساعة)
+    # ونفس الفهرس يخدم قراءة آخر توقع: ORDER BY source_ts DESC LIMIT 5
+    op.create_index('uq_prediction_forecast', 'prediction',
+                    ['asset_id', 'timeframe_id', 'source_ts', 'step'],
+                    unique=True, postgresql_where=sa.text('user_id IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_prediction_forecast', table_name='prediction')
+    op.drop_column('prediction', 'step')
+    op.drop_column('prediction', 'source_ts')
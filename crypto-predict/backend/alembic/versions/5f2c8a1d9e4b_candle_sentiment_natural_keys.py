@@ -0,0 +1,56 @@
+"""candle and sentiment natural keys
+
+Revision ID: 5f2c8a1d9e4b
+Revises: b77737fbf4f3
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f2c8a1d9e4b'
+down_revision: Union[str, Sequence[str], None] = 'b77737fbf4f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 1. المشاعر تحتاج timeframe_id ليكون المفتاح الطبيعي مطابقاً لجدول الشموع
+    op.execute("INSERT INTO timeframes (code, description) SELECT '1h', 'Hourly' "
+               "WHERE NOT EXISTS (SELECT 1 FROM timeframes WHERE code = '1h')")
+    op.add_column('sentiments', sa.Column('timeframe_id', sa.Integer(), nullable=True))
+    op.execute("UPDATE sentiments SET timeframe_id = (SELECT min(timeframe_id) FROM timeframes WHERE code = '1h')")
+    op.alter_column('sentiments', 'timeframe_id', nullable=False)
+    op.create_foreign_key('sentiments_timeframe_id_fkey', 'sentiments', 'timeframes',
+                          ['timeframe_id'], ['timeframe_id'])
+
+    # 2. حذف الصفوف المكررة من عمليات الرفع السابقة (نُبقي الأحدث)
+    op.execute("""
+        DELETE FROM candle_ohlcv a USING candle_ohlcv b
+        WHERE a.asset_id = b.asset_id AND a.timeframe_id = b.timeframe_id
+          AND a.timestamp = b.timestamp AND a.candle_id < b.candle_id
+    """)
+    op.execute("""
+        DELETE FROM sentiments a USING sentiments b
+        WHERE a.asset_id = b.asset_id AND a.timeframe_id = b.timeframe_id
+          AND a.timestamp = b.timestamp AND a.id < b.id
+    """)
+
+    # 3. المفاتيح الطبيعية (مطلوبة لـ ON CONFLICT)
+    op.create_unique_constraint('uq_candle_asset_tf_ts', 'candle_ohlcv',
+                                ['asset_id', 'timeframe_id', 'timestamp'])
+    op.create_unique_constraint('uq_sentiments_asset_tf_ts', 'sentiments',
+                                ['asset_id', 'timeframe_id', 'timestamp'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_sentiments_asset_tf_ts', 'sentiments', type_='unique')
+    op.drop_constraint('uq_candle_asset_tf_ts', 'candle_ohlcv', type_='unique')
+    op.drop_constraint('sentiments_timeframe_id_fkey', 'sentiments', type_='foreignkey')
+    op.drop_column('sentiments', 'timeframe_id')
@@ -0,0 +1,29 @@
+"""model log version
+
+Revision ID: 8c41e7b2a9d3
+Revises: 5f2c8a1d9e4b
+Create Date: 2026-10-18 14:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41e7b2a9d3'
+down_revision: Union[str, Sequence[str], None] = '5f2c8a1d9e4b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # رقم نسخة الـ model registry التي نشرها التدريب
+    op.add_column('model_logs', sa.Column('model_version', sa.String(length=20), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('model_logs', 'model_version')
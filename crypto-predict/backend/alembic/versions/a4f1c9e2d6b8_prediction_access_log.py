@@ -0,0 +1,50 @@
+"""prediction access log
+
+Revision ID: a4f1c9e2d6b8
+Revises: 3e9d6b1c7f20
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f1c9e2d6b8'
+down_revision: Union[str, Sequence[str], None] = '3e9d6b1c7f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # مفتاح التوقع يشمل نسخة الموديل: نسختان لنفس الشمعة توقعان مختلفان
+    op.drop_index('uq_prediction_forecast', table_name='prediction')
+    op.create_index('uq_prediction_forecast', 'prediction',
+                    ['asset_id', 'timeframe_id', 'source_ts', 'model_used', 'step'],
+                    unique=True, postgresql_where=sa.text('user_id IS NULL'))
+
+    op.create_table('prediction_access',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('asset_id', sa.Integer(), nullable=True),
+    sa.Column('timeframe_id', sa.Integer(), nullable=True),
+    sa.Column('source_ts', sa.DateTime(), nullable=True),
+    sa.Column('model_used', sa.String(length=20), nullable=True),
+    sa.Column('accessed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['asset_id'], ['crypto_assets.asset_id'], ),
+    sa.ForeignKeyConstraint(['timeframe_id'], ['timeframes.timeframe_id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('prediction_access')
+    op.drop_index('uq_prediction_forecast', table_name='prediction')
+    op.create_index('uq_prediction_forecast', 'prediction',
+                    ['asset_id', 'timeframe_id', 'source_ts', 'step'],
+                    unique=True, postgresql_where=sa.text('user_id IS NULL'))
@@ -0,0 +1,68 @@
+"""feature store: model features per candle
+
+Revision ID: a7e2d4f8c1b9
+Revises: f4a9c2e7b3d5
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e2d4f8c1b9'
+down_revision: Union[str, Sequence[str], None] = 'f4a9c2e7b3d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CANDLE_FEATURES = ['open', 'high', 'low', 'close', 'volume']
+SENTIMENT_FEATURES = ['sent_count', 'avg_sentiment', 'pos_count', 'neg_count', 'neu_count',
+                      'pos_ratio', 'neg_ratio', 'neu_ratio', 'has_news']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    features = ", ".join(f"{name} real NOT NULL" for name in CANDLE_FEATURES + SENTIMENT_FEATURES)
+    op.execute(f"""
+        CREATE TABLE feature_store (
+            asset_id integer NOT NULL REFERENCES crypto_assets (asset_id),
+            timeframe_id integer NOT NULL REFERENCES timeframes (timeframe_id),
+            timestamp timestamp without time zone NOT NULL,
+            {features},
+            price double precision NOT NULL
+        ) PARTITION BY RANGE (timestamp)
+    """)
+
+    # نفس أشهر الشموع بنفس الحدود؛ الأشهر التالية يُنشئها partition_service
+    partitions = bind.execute(sa.text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'candle_ohlcv'::regclass
+    """)).all()
+    for name, bound in partitions:
+        op.execute(f"CREATE TABLE {name.replace('candle_ohlcv', 'feature_store', 1)} PARTITION OF feature_store {bound}")
+
+    # تعبئة أولية من كل الشموع (نفس قواعد feature_store: ساعة بدون صف مشاعر = بدون أخبار = أصفار)،
+    # بترتيب الفهرس حتى تتجاور صفوف كل عملة في الجدول
+    values = [f"CAST(CAST(c.{name} AS float8) AS real)" for name in CANDLE_FEATURES]
+    values += [f"CAST(COALESCE(s.{name}, 0) AS real)" for name in SENTIMENT_FEATURES]
+    op.execute(f"""
+        INSERT INTO feature_store (asset_id, timeframe_id, timestamp, {", ".join(CANDLE_FEATURES + SENTIMENT_FEATURES)}, price)
+        SELECT c.asset_id, c.timeframe_id, c.timestamp, {", ".join(values)}, CAST(c.close AS float8)
+        FROM candle_ohlcv c
+        LEFT JOIN sentiments s ON s.asset_id = c.asset_id AND s.timeframe_id = c.timeframe_id
+         AND s.timestamp = c.timestamp AT TIME ZONE 'UTC'
+        WHERE c.asset_id IS NOT NULL AND c.timeframe_id IS NOT NULL
+        ORDER BY c.asset_id, c.timeframe_id, c.timestamp
+    """)
+    # المفتاح بعد تحميل البيانات (بناء واحد لكل partition)
+    op.execute("ALTER TABLE feature_store ADD CONSTRAINT feature_store_pkey PRIMARY KEY (asset_id, timeframe_id, timestamp)")
+    op.execute("ANALYZE feature_store")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE feature_store")
@@ -0,0 +1,30 @@
+"""feature store: updated_at marks rows whose values changed
+
+Revision ID: b9d4e2f7a3c6
+Revises: c5d8e1a3f7b2
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d4e2f7a3c6'
+down_revision: Union[str, Sequence[str], None] = 'c5d8e1a3f7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # بدون قيمة للصفوف الموجودة (NULL = لم تتغير منذ التعبئة): تعديل في الـ catalog فقط، بدون
+    # إعادة كتابة الـ partitions. الصفوف الجديدة والمعدّلة يكتبها FILL_SQL في feature_store.py
+    op.execute("ALTER TABLE feature_store ADD COLUMN updated_at timestamp without time zone")
+    op.execute("ALTER TABLE feature_store ALTER COLUMN updated_at SET DEFAULT timezone('utc', now())")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE feature_store DROP COLUMN updated_at")
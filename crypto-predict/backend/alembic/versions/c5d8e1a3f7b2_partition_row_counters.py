@@ -0,0 +1,88 @@
+"""row counters on partitions: direct statements count toward the parent
+
+Revision ID: c5d8e1a3f7b2
+Revises: a7e2d4f8c1b9
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d8e1a3f7b2'
+down_revision: Union[str, Sequence[str], None] = 'a7e2d4f8c1b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONED_COUNTED_TABLES = ['candle_ohlcv', 'sentiments']
+ACTIONS = ('insert', 'delete', 'truncate')
+
+
+def _set_counter_functions(counter: str) -> None:
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION count_rows_inserted() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO table_row_counts (table_name, delta)
+            SELECT {counter}, count(*) FROM new_rows HAVING count(*) > 0;
+            RETURN NULL;
+        END $$;
+
+        CREATE OR REPLACE FUNCTION count_rows_deleted() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO table_row_counts (table_name, delta)
+            SELECT {counter}, -count(*) FROM old_rows HAVING count(*) > 0;
+            RETURN NULL;
+        END $$;
+    """)
+
+
+def _partitions(bind, table: str) -> list:
+    return bind.execute(sa.text("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass)
+    """), {"table": table}).scalars().all()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    # العداد باسم الأب (TG_ARGV[0]) للـ triggers على الـ partitions
+    _set_counter_functions("COALESCE(TG_ARGV[0], TG_TABLE_NAME)")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION count_partition_truncated() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            removed bigint;
+        BEGIN
+            EXECUTE format('SELECT count(*) FROM %I.%I', TG_TABLE_SCHEMA, TG_TABLE_NAME) INTO removed;
+            IF removed > 0 THEN
+                INSERT INTO table_row_counts (table_name, delta) VALUES (TG_ARGV[0], -removed);
+            END IF;
+            RETURN NULL;
+        END $$;
+    """)
+
+    # الأشهر الموجودة؛ الأشهر التالية يُنشئ partition_service الـ triggers معها
+    for table in PARTITIONED_COUNTED_TABLES:
+        for name in _partitions(bind, table):
+            op.execute(f"""
+                CREATE TRIGGER {name}_count_insert AFTER INSERT ON {name}
+                    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows_inserted('{table}');
+                CREATE TRIGGER {name}_count_delete AFTER DELETE ON {name}
+                    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows_deleted('{table}');
+                CREATE TRIGGER {name}_count_truncate BEFORE TRUNCATE ON {name}
+                    FOR EACH STATEMENT EXECUTE FUNCTION count_partition_truncated('{table}');
+            """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    for table in PARTITIONED_COUNTED_TABLES:
+        for name in _partitions(bind, table):
+            for action in ACTIONS:
+                op.execute(f"DROP TRIGGER IF EXISTS {name}_count_{action} ON {name}")
+    op.execute("DROP FUNCTION IF EXISTS count_partition_truncated()")
+    _set_counter_functions("TG_TABLE_NAME")
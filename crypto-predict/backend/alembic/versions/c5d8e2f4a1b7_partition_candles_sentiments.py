@@ -0,0 +1,103 @@
+"""monthly partitions for candles and sentiments
+
+Revision ID: c5d8e2f4a1b7
+Revises: a4f1c9e2d6b8
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d8e2f4a1b7'
+down_revision: Union[str, Sequence[str], None] = 'a4f1c9e2d6b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (الجدول، عمود الـ id، اسم المفتاح الطبيعي، أعمدة الفهرس المغطّي)
+TABLES = [
+    ('candle_ohlcv', 'candle_id', 'uq_candle_asset_tf_ts', ['open', 'high', 'low', 'close', 'volume']),
+    ('sentiments', 'id', 'uq_sentiments_asset_tf_ts',
+     ['avg_sentiment', 'sent_count', 'pos_count', 'neg_count', 'neu_count',
+      'pos_ratio', 'neg_ratio', 'neu_ratio', 'has_news']),
+]
+MONTHS_AHEAD = 3
+
+
+def _next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _month_range(bind, table):
+    """من شهر أقدم صف (ناقص أسبوع للـ rollup الأسبوعي) حتى MONTHS_AHEAD شهراً بعد الآن أو بعد أحدث صف"""
+    oldest, newest = bind.execute(sa.text(f"SELECT min(timestamp), max(timestamp) FROM {table}")).one()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    start = (oldest.replace(tzinfo=None) - timedelta(days=7)) if oldest else now
+    end = max(now, newest.replace(tzinfo=None)) if newest else now
+    month = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(MONTHS_AHEAD):
+        end = _next_month(end.replace(day=1))
+    while month <= end:
+        yield month
+        month = _next_month(month)
+
+
+def _move_sequence(bind, source, target, column):
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence(:t, :c)"), {'t': source, 'c': column}).scalar()
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY {target}.{column}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    for table, id_column, key_name, covered in TABLES:
+        old = f'{table}_unpartitioned'
+        op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+        op.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {key_name} TO {key_name}_unpartitioned")
+        op.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey")
+
+        # نفس الأعمدة والقيم الافتراضية (بما فيها nextval للـ id)؛ مفتاح الـ partition يجب أن يكون ضمن الـ PK
+        op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)")
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY ({id_column}, timestamp)")
+        op.create_foreign_key(f'{table}_asset_id_fkey', table, 'crypto_assets', ['asset_id'], ['asset_id'])
+        op.create_foreign_key(f'{table}_timeframe_id_fkey', table, 'timeframes', ['timeframe_id'], ['timeframe_id'])
+        _move_sequence(bind, old, table, id_column)
+
+        # بدون partition افتراضي: الأشهر التالية يُنشئها partition_service قبل وصول بياناتها
+        for month in _month_range(bind, old):
+            op.execute(
+                f"CREATE TABLE {table}_y{month:%Y}m{month:%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{_next_month(month):%Y-%m-%d} 00:00:00+00')"
+            )
+
+        op.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+        # الفهرس بعد تحميل البيانات (بناء واحد لكل partition بدلاً من تحديثه صفاً صفاً)
+        op.create_index(key_name, table, ['asset_id', 'timeframe_id', sa.text('timestamp DESC')],
+                        unique=True, postgresql_include=covered)
+        op.drop_table(old)
+        op.execute(f"ANALYZE {table}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    for table, id_column, key_name, _ in TABLES:
+        partitioned = f'{table}_partitioned'
+        op.execute(f"ALTER TABLE {table} RENAME TO {partitioned}")
+        op.execute(f"ALTER INDEX {key_name} RENAME TO {key_name}_partitioned")
+        op.execute(f"ALTER TABLE {partitioned} RENAME CONSTRAINT {table}_pkey TO {partitioned}_pkey")
+
+        op.execute(f"CREATE TABLE {table} (LIKE {partitioned} INCLUDING DEFAULTS)")
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY ({id_column})")
+        op.create_foreign_key(f'{table}_asset_id_fkey', table, 'crypto_assets', ['asset_id'], ['asset_id'])
+        op.create_foreign_key(f'{table}_timeframe_id_fkey', table, 'timeframes', ['timeframe_id'], ['timeframe_id'])
+        _move_sequence(bind, partitioned, table, id_column)
+
+        op.execute(f"INSERT INTO {table} SELECT * FROM {partitioned}")
+        op.create_unique_constraint(key_name, table, ['asset_id', 'timeframe_id', 'timestamp'])
+        op.execute(f"DROP TABLE {partitioned} CASCADE")
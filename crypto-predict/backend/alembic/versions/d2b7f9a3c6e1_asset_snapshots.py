@@ -0,0 +1,66 @@
+"""latest price snapshot per asset
+
+Revision ID: d2b7f9a3c6e1
+Revises: c5d8e2f4a1b7
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b7f9a3c6e1'
+down_revision: Union[str, Sequence[str], None] = 'c5d8e2f4a1b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('asset_snapshots',
+    sa.Column('asset_id', sa.Integer(), nullable=False),
+    sa.Column('last_ts', sa.DateTime(), nullable=False),
+    sa.Column('last_close', sa.DECIMAL(precision=18, scale=8), nullable=False),
+    sa.Column('close_24h_ago', sa.DECIMAL(precision=18, scale=8), nullable=True),
+    sa.Column('high_24h', sa.DECIMAL(precision=18, scale=8), nullable=True),
+    sa.Column('low_24h', sa.DECIMAL(precision=18, scale=8), nullable=True),
+    sa.Column('volume_24h', sa.DECIMAL(precision=28, scale=8), nullable=True),
+    sa.Column('change_24h_pct', sa.Float(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['asset_id'], ['crypto_assets.asset_id'], ),
+    sa.PrimaryKeyConstraint('asset_id')
+    )
+
+    # تعبئة أولية من الشموع الساعية الموجودة (نفس حساب snapshot_service)؛ بعدها يحدّثها الإدخال
+    op.execute("""
+        INSERT INTO asset_snapshots (asset_id, last_ts, last_close, close_24h_ago, high_24h, low_24h, volume_24h,
+                                     change_24h_pct)
+        SELECT a.asset_id, latest.timestamp, latest.close, previous.close, day.high, day.low, day.volume,
+               CAST((latest.close - previous.close) / NULLIF(previous.close, 0) * 100 AS float)
+        FROM crypto_assets a
+        CROSS JOIN (SELECT min(timeframe_id) AS base_id FROM timeframes WHERE code = '1h') tf
+        CROSS JOIN LATERAL (
+            SELECT timestamp, close FROM candle_ohlcv
+            WHERE asset_id = a.asset_id AND timeframe_id = tf.base_id
+            ORDER BY timestamp DESC LIMIT 1
+        ) latest
+        LEFT JOIN LATERAL (
+            SELECT close FROM candle_ohlcv
+            WHERE asset_id = a.asset_id AND timeframe_id = tf.base_id
+              AND timestamp <= latest.timestamp - interval '24 hours'
+            ORDER BY timestamp DESC LIMIT 1
+        ) previous ON true
+        CROSS JOIN LATERAL (
+            SELECT max(high) AS high, min(low) AS low, sum(volume) AS volume FROM candle_ohlcv
+            WHERE asset_id = a.asset_id AND timeframe_id = tf.base_id
+              AND timestamp > latest.timestamp - interval '24 hours' AND timestamp <= latest.timestamp
+        ) day
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('asset_snapshots')
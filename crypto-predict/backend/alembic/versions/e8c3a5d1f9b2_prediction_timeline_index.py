@@ -0,0 +1,30 @@
+"""shared prediction timeline index for keyset pagination
+
+Revision ID: e8c3a5d1f9b2
+Revises: d2b7f9a3c6e1
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8c3a5d1f9b2'
+down_revision: Union[str, Sequence[str], None] = 'd2b7f9a3c6e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_prediction_shared_timeline', 'prediction',
+                    ['asset_id', 'timeframe_id', 'timestamp', 'id_Prediction'],
+                    unique=False, postgresql_where=sa.text('user_id IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_prediction_shared_timeline', table_name='prediction')
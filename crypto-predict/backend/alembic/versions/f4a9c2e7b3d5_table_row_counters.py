@@ -0,0 +1,77 @@
+"""exact row counters maintained by statement-level triggers
+
+Revision ID: f4a9c2e7b3d5
+Revises: e8c3a5d1f9b2
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4a9c2e7b3d5'
+down_revision: Union[str, Sequence[str], None] = 'e8c3a5d1f9b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTED_TABLES = ['users', 'prediction', 'candle_ohlcv', 'sentiments']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('table_row_counts',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('table_name', sa.String(length=63), nullable=False),
+    sa.Column('delta', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_table_row_counts_table_name'), 'table_row_counts', ['table_name'], unique=False)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION count_rows_inserted() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO table_row_counts (table_name, delta)
+            SELECT TG_TABLE_NAME, count(*) FROM new_rows HAVING count(*) > 0;
+            RETURN NULL;
+        END $$;
+
+        CREATE OR REPLACE FUNCTION count_rows_deleted() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO table_row_counts (table_name, delta)
+            SELECT TG_TABLE_NAME, -count(*) FROM old_rows HAVING count(*) > 0;
+            RETURN NULL;
+        END $$;
+
+        CREATE OR REPLACE FUNCTION count_rows_truncated() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            DELETE FROM table_row_counts WHERE table_name = TG_TABLE_NAME;
+            INSERT INTO table_row_counts (table_name, delta) VALUES (TG_TABLE_NAME, 0);
+            RETURN NULL;
+        END $$;
+    """)
+
+    for table in COUNTED_TABLES:
+        # الكتابة متوقفة بين العدّ الأولي وتفعيل الـ triggers (القراءة مستمرة)
+        op.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+        op.execute(f"""
+            CREATE TRIGGER {table}_count_insert AFTER INSERT ON {table}
+                REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows_inserted();
+            CREATE TRIGGER {table}_count_delete AFTER DELETE ON {table}
+                REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows_deleted();
+            CREATE TRIGGER {table}_count_truncate AFTER TRUNCATE ON {table}
+                FOR EACH STATEMENT EXECUTE FUNCTION count_rows_truncated();
+            INSERT INTO table_row_counts (table_name, delta) SELECT '{table}', count(*) FROM {table};
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in COUNTED_TABLES:
+        for action in ('insert', 'delete', 'truncate'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_count_{action} ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS count_rows_inserted(), count_rows_deleted(), count_rows_truncated()")
+    op.drop_index(op.f('ix_table_row_counts_table_name'), table_name='table_row_counts')
+    op.drop_table('table_row_counts')
@@ -12,13 +12,64 @@ class Settings(BaseSettings):
     VERSION: str = "1.0.0"
     ENV: str = "development" # يمكن تغييرها لـ production لاحقاً
 
-    DATABASE_URL: str 
+    DATABASE_URL: str
+    # فارغ = نفس DATABASE_URL عبر postgresql+asyncpg
+    ASYNC_DATABASE_URL: str = ""
+    # لكل engine (المتزامن و async كلٌ على حدة): اتصالات دائمة + مؤقتة فوقها عند الضغط
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    # إعادة فتح الاتصال بعد N ثانية (قبل أن يقطعه PgBouncer أو الـ firewall)
+    DB_POOL_RECYCLE_SEC: int = 1800
+    # أقصى انتظار لاتصال متاح قبل الخطأ
+    DB_POOL_TIMEOUT_SEC: float = 30
     JWT_SECRET: str
     JWT_ALG: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 
 
     REDIS_URL: str = "redis://localhost:6379/0"
 
+    # كاش التوقعات: memory (LRU داخل العملية) | redis (مشترك عبر REDIS_URL) | none
+    PREDICTION_CACHE_BACKEND: str = "memory"
+    PREDICTION_CACHE_SIZE: int = 1024
+    PREDICTION_CACHE_TTL_SEC: int = 6 * 60 * 60
+
+    # تحميل الموديلات في الخلفية عند الإقلاع (بدلاً من عند الاستيراد)، راجع /api/health/ready
+    ENGINE_WARM_UP_ON_STARTUP: bool = True
+    # عمليات محرك التوقع المنفصلة (0 = داخل عملية الـ API في الـ threadpool)
+    INFERENCE_WORKERS: int = 1
+    # الطلبات المنتظرة + قيد التنفيذ؛ بعدها يُرجع الـ API خطأ 503 فوراً
+    INFERENCE_MAX_PENDING: int = 32
+    # مجلد الـ model registry (فارغ = app/ml_models/registry)
+    MODEL_REGISTRY_DIR: str = ""
+    # محرك الـ LSTM: torch | numpy (بدون torch إطلاقاً، يقرأ app/ml_models/lstm_model.npz)
+    LSTM_BACKEND: str = "torch"
+    # وضع تشغيل الـ LSTM مع torch: eager | script (TorchScript) | quantized (int8 ديناميكي + TorchScript)
+    LSTM_SERVING_MODE: str = "script"
+    # حفظ حالة الـ LSTM لكل عملة: كل شمعة جديدة = خطوة واحدة (على 48 مساراً) بدل 48 خطوة متتالية
+    LSTM_STREAMING: bool = False
+    # كل كم خطوة streaming نقارن النتيجة مع إعادة الحساب الكاملة (0 = بدون تحقق)
+    LSTM_STREAM_VERIFY_EVERY: int = 100
+    # خيوط torch لكل worker (0 = افتراضي torch أي كل الأنوية)
+    TORCH_NUM_THREADS: int = 1
+
+    # التوقعات المشتركة: الـ scheduler يفحص كل N ثانية هل أُغلقت شمعة جديدة ويحسب توقعها (0 = معطّل)
+    FORECAST_REFRESH_SEC: int = 60
+
+    # partitions شهرية للشموع والمشاعر: كم شهراً قادماً يُنشأ مسبقاً (مهمة يومية في الـ scheduler)
+    PARTITION_MONTHS_AHEAD: int = 3
+
+    # أعداد لوحة التحكم: exact (عدادات الـ triggers) | estimate (pg_class.reltuples)
+    STATS_COUNT_MODE: str = "exact"
+    STATS_CACHE_TTL_SEC: int = 30
+    # كل كم دقيقة تُدمج صفوف العدادات (صف لكل جملة INSERT/DELETE) في صف واحد لكل جدول
+    STATS_COMPACT_MINUTES: int = 10
+
+    # عدد الصفوف في كل دفعة عند رفع الملفات الكبيرة بوضع الـ streaming
+    INGEST_CHUNK_ROWS: int = 50_000
+    # عمال الرفع في الخلفية: عامل واحد افتراضياً حتى لا تتزاحم عمليات الرفع على قاعدة البيانات
+    INGEST_WORKERS: int = 1
+    INGEST_MAX_PENDING: int = 8
+
     model_config = ConfigDict(
         env_file=str(ENV_PATH),
         env_file_encoding='utf-8',
@@ -3,9 +3,11 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.core.config import get_settings
-from app.db.session import get_db
+from app.db.session import get_db, get_async_db
 from app.db.models import User
 
 # تحميل الإعدادات من ملف .env
@@ -45,24 +47,37 @@ def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
 # إعداد OAuth2 (استخراج التوكن من الطلب)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """👤 التحقق من المستخدم الحالي عبر التوكن"""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="❌ Invalid or expired token",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+def _email_from_token(token: str) -> str:
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALG])
         email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        email = None
+    if email is None:
+        raise _credentials_exception()
+    return email
 
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """👤 التحقق من المستخدم الحالي عبر التوكن"""
+    email = _email_from_token(token)
     user = db.query(User).filter(User.email == email).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+
+    return user
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """👤 نفس get_current_user عبر الجلسة غير المتزامنة (للمسارات التي تعمل على async_engine)"""
+    email = _email_from_token(token)
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
+    if user is None:
+        raise _credentials_exception()
 
     return user
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, DECIMAL, func
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Date, ForeignKey, DECIMAL, REAL, Index, func, text
 from sqlalchemy.orm import relationship
 from datetime import date
 from app.db.session import Base
+from app.db import row_counts
 
 # جدول   (CryptoAsset)
 class CryptoAsset(Base):
@@ -24,6 +25,7 @@ class Timeframe(Base):
 
     predictions = relationship("Prediction", back_populates="timeframe_ref")
     candles = relationship("Candle", back_populates="timeframe_ref")
+    sentiments = relationship("Sentiment", back_populates="timeframe_ref")
 
 # 3) جدول المستخدمين (User)
 class User(Base):
@@ -43,8 +45,17 @@ class User(Base):
 
 class Sentiment(Base):
     __tablename__ = "sentiments"
-    id = Column(Integer, primary_key=True)
-    timestamp = Column(DateTime(timezone=True), nullable=False)
+    # المفتاح الطبيعي: سجل واحد لكل (عملة، فترة، وقت) — يمنع التكرار عند إعادة الرفع.
+    # مقسّم شهرياً على timestamp (راجع partition_service)، والفهرس يغطي أعمدة الميزات
+    # فنافذة التوقع تُقرأ من الفهرس فقط (Index Only Scan) بدون زيارة الجدول.
+    __table_args__ = (
+        Index("uq_sentiments_asset_tf_ts", "asset_id", "timeframe_id", text("timestamp DESC"), unique=True,
+              postgresql_include=["avg_sentiment", "sent_count", "pos_count", "neg_count", "neu_count",
+                                  "pos_ratio", "neg_ratio", "neu_ratio", "has_news"]),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, nullable=False)
     avg_sentiment = Column(Float)
     sent_count = Column(Integer)
     pos_count = Column(Integer)
@@ -57,16 +68,26 @@ class Sentiment(Base):
     has_news = Column(Integer, default=0)
     
     asset_id = Column(Integer, ForeignKey("crypto_assets.asset_id"))
+    timeframe_id = Column(Integer, ForeignKey("timeframes.timeframe_id"), nullable=False)
+
     asset_ref = relationship("CryptoAsset", back_populates="sentiments")
+    timeframe_ref = relationship("Timeframe", back_populates="sentiments")
 
 
 # 5) جدول   (OHLCV_Candle)
 
 class Candle(Base):
     __tablename__ = "candle_ohlcv"
-    candle_id = Column(Integer, primary_key=True)
+    # المفتاح الطبيعي: شمعة واحدة لكل (عملة، فترة، وقت).
+    # مقسّم شهرياً على timestamp، والفهرس يغطي OHLCV (السجل والتوقع من الفهرس فقط)
+    __table_args__ = (
+        Index("uq_candle_asset_tf_ts", "asset_id", "timeframe_id", text("timestamp DESC"), unique=True,
+              postgresql_include=["open", "high", "low", "close", "volume"]),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+    candle_id = Column(Integer, primary_key=True, autoincrement=True)
     exchange = Column(String(20)) # من الرسمة
-    timestamp = Column(DateTime, nullable=False)
+    timestamp = Column(DateTime, primary_key=True, nullable=False)
     open = Column(DECIMAL(18, 8), nullable=False)
     high = Column(DECIMAL(18, 8), nullable=False)
     low = Column(DECIMAL(18, 8), nullable=False)
@@ -79,10 +100,62 @@ class Candle(Base):
     asset_ref = relationship("CryptoAsset", back_populates="candles")
     timeframe_ref = relationship("Timeframe", back_populates="candles")
 
+# ملخص آخر سعر لكل عملة (يُحدَّث عند إدخال الشموع، راجع snapshot_service)
+class AssetSnapshot(Base):
+    __tablename__ = "asset_snapshots"
+    asset_id = Column(Integer, ForeignKey("crypto_assets.asset_id"), primary_key=True)
+    last_ts = Column(DateTime, nullable=False)
+    last_close = Column(DECIMAL(18, 8), nullable=False)
+    # إغلاق آخر شمعة قبل last_ts بـ 24 ساعة أو أكثر (NULL إذا لم يوجد تاريخ كافٍ)
+    close_24h_ago = Column(DECIMAL(18, 8))
+    high_24h = Column(DECIMAL(18, 8))
+    low_24h = Column(DECIMAL(18, 8))
+    volume_24h = Column(DECIMAL(28, 8))
+    change_24h_pct = Column(Float)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# مخزن الميزات: صف لكل (عملة، فترة، وقت) فيه ميزات الموديل الـ 14 (features.json) جاهزة كـ float32،
+# الشمعة مع مشاعرها بعد قواعد التعبئة (راجع feature_store). التوقع والتدريب يقرآنه مباشرة بدون join.
+# مقسّم شهرياً مثل الشموع.
+class FeatureRow(Base):
+    __tablename__ = "feature_store"
+    __table_args__ = ({"postgresql_partition_by": "RANGE (timestamp)"},)
+    asset_id = Column(Integer, ForeignKey("crypto_assets.asset_id"), primary_key=True)
+    timeframe_id = Column(Integer, ForeignKey("timeframes.timeframe_id"), primary_key=True)
+    timestamp = Column(DateTime, primary_key=True)
+    open = Column(REAL, nullable=False)
+    high = Column(REAL, nullable=False)
+    low = Column(REAL, nullable=False)
+    close = Column(REAL, nullable=False)
+    volume = Column(REAL, nullable=False)
+    sent_count = Column(REAL, nullable=False)
+    avg_sentiment = Column(REAL, nullable=False)
+    pos_count = Column(REAL, nullable=False)
+    neg_count = Column(REAL, nullable=False)
+    neu_count = Column(REAL, nullable=False)
+    pos_ratio = Column(REAL, nullable=False)
+    neg_ratio = Column(REAL, nullable=False)
+    neu_ratio = Column(REAL, nullable=False)
+    has_news = Column(REAL, nullable=False)
+    # سعر الإغلاق بدقة كاملة (current_price للتوقع وهدف التدريب)؛ close بـ float32 يخسر السنتات في الأسعار الكبيرة
+    price = Column(Float, nullable=False)
+    # آخر تغيير فعلي في قيم الصف (UTC)؛ NULL للصفوف التي لم تتغير منذ التعبئة الأولى.
+    # يدخل في مفتاح كاش التوقع وفي تقادم التوقع المشترك: مشاعر متأخرة تغيّر النافذة بدون شمعة جديدة
+    updated_at = Column(DateTime, server_default=text("timezone('utc', now())"))
+
 # 6) جدول  (Prediction)
 
 class Prediction(Base):
     __tablename__ = "prediction"
+    # التوقع يُخزّن مرة واحدة لكل (عملة، فترة، شمعة المصدر، نسخة الموديل، ساعة) بدون user_id؛
+    # من طلبه يُسجَّل في prediction_access. الصفوف القديمة (لكل مستخدم) خارج الفهرس.
+    __table_args__ = (
+        Index("uq_prediction_forecast", "asset_id", "timeframe_id", "source_ts", "model_used", "step",
+              unique=True, postgresql_where=text("user_id IS NULL")),
+        # سجل التوقعات المشتركة لكل عملة بالتصفح (timestamp, id) من الأحدث
+        Index("ix_prediction_shared_timeline", "asset_id", "timeframe_id", "timestamp", "id_Prediction",
+              postgresql_where=text("user_id IS NULL")),
+    )
     id_Prediction = Column(Integer, primary_key=True) # الاسم حسب الرسمة
     asset = Column(String(20)) 
     timestamp = Column(DateTime(timezone=True))
@@ -90,6 +163,9 @@ class Prediction(Base):
     confidence = Column(Float)
     model_used = Column(String(20))
     created_at = Column(DateTime, server_default=func.now())
+    # الشمعة التي حُسب منها التوقع، ورقم الساعة القادمة (1..5)
+    source_ts = Column(DateTime)
+    step = Column(Integer)
     
     # الروابط الثلاثية حسب الرسمة
     user_id = Column(Integer, ForeignKey("users.user_id"))
@@ -100,6 +176,25 @@ class Prediction(Base):
     asset_ref = relationship("CryptoAsset", back_populates="predictions")
     timeframe_ref = relationship("Timeframe", back_populates="predictions")
 
+# سجل الوصول للتوقعات (append-only): من طلب أي توقع ومتى، بدون تكرار صفوف التوقع نفسها
+class PredictionAccess(Base):
+    __tablename__ = "prediction_access"
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"))
+    asset_id = Column(Integer, ForeignKey("crypto_assets.asset_id"))
+    timeframe_id = Column(Integer, ForeignKey("timeframes.timeframe_id"))
+    # مفتاح التوقع المطلوب (مع asset_id و timeframe_id)
+    source_ts = Column(DateTime)
+    model_used = Column(String(20))
+    accessed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# عدادات الصفوف الدقيقة (تكتبها triggers، راجع app/db/row_counts.py): العدد = sum(delta)
+class TableRowCount(Base):
+    __tablename__ = "table_row_counts"
+    id = Column(BigInteger, primary_key=True)
+    table_name = Column(String(63), nullable=False, index=True)
+    delta = Column(BigInteger, nullable=False)
+
 # 7) جدول   (Model_Log)
 class ModelLog(Base):
     __tablename__ = "model_logs"
@@ -108,6 +203,12 @@ class ModelLog(Base):
     records_count = Column(Integer)
     status = Column(String(20))
     error_message = Column(String(500))
+    # رقم النسخة المنشورة في الـ model registry (إن نجح التدريب)
+    model_version = Column(String(20))
     # ربط السجل بالمستخدم
     user_id = Column(Integer, ForeignKey("users.user_id"))
-    user_ref = relationship("User", back_populates="model_logs")
\ No newline at end of file
+    user_ref = relationship("User", back_populates="model_logs")
+
+
+# الـ triggers تُنشأ مع الجداول في create_all أيضاً (وليس فقط عبر Alembic)
+row_counts.register(Base.metadata)
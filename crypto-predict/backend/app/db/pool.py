@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import deque
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# ============================================================
+# 📊 مقاييس الـ connection pool: كم اتصالاً مستخدماً الآن، كم منها فوق pool_size (overflow)،
+# وكم انتظر كل طلب حتى حصل على اتصال (انتظار طويل = الـ pool أصغر من الضغط الفعلي)
+# ============================================================
+
+METRICS_WINDOW = 1000
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wait_ms = deque(maxlen=METRICS_WINDOW)
+        self._checkouts = 0
+        self._timeouts = 0
+
+    def record(self, wait_ms: float, timed_out: bool = False):
+        with self._lock:
+            self._wait_ms.append(wait_ms)
+            if timed_out:
+                self._timeouts += 1
+            else:
+                self._checkouts += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            values = sorted(self._wait_ms)
+            checkouts, timeouts = self._checkouts, self._timeouts
+        if not values:
+            wait = {"avg": None, "p95": None, "max": None}
+        else:
+            wait = {
+                "avg": round(sum(values) / len(values), 2),
+                "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+                "max": round(values[-1], 2),
+            }
+        return {"checkouts": checkouts, "timeouts": timeouts, "wait_ms": wait}
+
+
+sync_metrics = PoolMetrics()
+async_metrics = PoolMetrics()
+
+
+class _TimedPool:
+    """يقيس زمن _do_get: الانتظار في الطابور + فتح اتصال جديد عند الحاجة"""
+    metrics: PoolMetrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record((time.perf_counter() - start) * 1000, timed_out=True)
+            raise
+        self.metrics.record((time.perf_counter() - start) * 1000)
+        return connection
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    metrics = sync_metrics
+
+
+class TimedAsyncQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    metrics = async_metrics
+
+
+def pool_stats(pool) -> dict:
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "timeout_sec": pool._timeout,
+        "recycle_sec": pool._recycle,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # سالب قبل أن يمتلئ الـ pool لأول مرة (اتصالات لم تُفتح بعد)
+        "overflow": max(0, pool.overflow()),
+        **pool.metrics.summary(),
+    }
@@ -0,0 +1,105 @@
+from sqlalchemy import event, text
+
+# ============================================================
+# 🔢 عدادات صفوف دقيقة بدون COUNT(*): triggers على مستوى الجملة (FOR EACH STATEMENT)
+# تضيف صفاً في table_row_counts بعدد الصفوف المُدخلة أو المحذوفة (من transition tables)،
+# فدفعة COPY من مليون صف = صف واحد في العدادات. الإضافة بدل تحديث صف واحد: عمليات الإدخال
+# المتزامنة لا تنتظر قفل نفس الصف. العدد = sum(delta)، والصفوف تُدمج دورياً (stats_service).
+#
+# الجداول المقسّمة: triggers الجملة على الأب لا تعمل لجملة تستهدف partition مباشرة
+# (INSERT/DELETE/TRUNCATE على candle_ohlcv_y2024m03 مثلاً)، فلكل partition triggers خاصة به
+# تكتب باسم الأب (TG_ARGV[0]). الجملة على الأب تشغّل triggers الأب فقط فلا يُحسب الصف مرتين.
+# DETACH/DROP لـ partition لا يشغّل أي trigger: يتم عبر partition_service.detach_partition.
+# ============================================================
+
+COUNTED_TABLES = ["users", "prediction", "candle_ohlcv", "sentiments"]
+# اسم العداد: الأب لـ triggers الـ partitions، أو الجدول نفسه
+_COUNTER = "COALESCE(TG_ARGV[0], TG_TABLE_NAME)"
+
+FUNCTIONS_SQL = f"""
+    CREATE OR REPLACE FUNCTION count_rows_inserted() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO table_row_counts (table_name, delta)
+        SELECT {_COUNTER}, count(*) FROM new_rows HAVING count(*) > 0;
+        RETURN NULL;
+    END $$;
+
+    CREATE OR REPLACE FUNCTION count_rows_deleted() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO table_row_counts (table_name, delta)
+        SELECT {_COUNTER}, -count(*) FROM old_rows HAVING count(*) > 0;
+        RETURN NULL;
+    END $$;
+
+    CREATE OR REPLACE FUNCTION count_rows_truncated() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        DELETE FROM table_row_counts WHERE table_name = TG_TABLE_NAME;
+        INSERT INTO table_row_counts (table_name, delta) VALUES (TG_TABLE_NAME, 0);
+        RETURN NULL;
+    END $$;
+
+    -- TRUNCATE لـ partition واحد: الصفوف تُعدّ قبل الحذف (الجدول مقفل حصرياً، فالعدد دقيق).
+    -- TRUNCATE على الأب يشغّل هذا أيضاً لكل partition، ثم count_rows_truncated يصفّر العداد كله.
+    CREATE OR REPLACE FUNCTION count_partition_truncated() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        removed bigint;
+    BEGIN
+        EXECUTE format('SELECT count(*) FROM %I.%I', TG_TABLE_SCHEMA, TG_TABLE_NAME) INTO removed;
+        IF removed > 0 THEN
+            INSERT INTO table_row_counts (table_name, delta) VALUES (TG_ARGV[0], -removed);
+        END IF;
+        RETURN NULL;
+    END $$;
+"""
+
+
+def triggers_sql(table: str) -> str:
+    """
+    الـ triggers + صف البداية (العدد الحالي). وجود صف للجدول في table_row_counts يعني أن
+    العداد الدقيق متاح له. على الجداول المقسّمة تُعرّف على الجدول الأب وتشمل كل الجمل عليه
+    (بكل الـ partitions)؛ الجمل المباشرة على partition واحد: partition_triggers_sql.
+    """
+    return f"""
+        CREATE TRIGGER {table}_count_insert AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows_inserted();
+        CREATE TRIGGER {table}_count_delete AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows_deleted();
+        CREATE TRIGGER {table}_count_truncate AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION count_rows_truncated();
+        INSERT INTO table_row_counts (table_name, delta) SELECT '{table}', count(*) FROM {table};
+    """
+
+
+def partition_triggers_sql(table: str, partition: str) -> str:
+    """triggers partition لجدول معدود: الجمل المباشرة عليه تُحسب في عداد الأب (بدون صف بداية)"""
+    return f"""
+        CREATE TRIGGER {partition}_count_insert AFTER INSERT ON {partition}
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows_inserted('{table}');
+        CREATE TRIGGER {partition}_count_delete AFTER DELETE ON {partition}
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows_deleted('{table}');
+        CREATE TRIGGER {partition}_count_truncate BEFORE TRUNCATE ON {partition}
+            FOR EACH STATEMENT EXECUTE FUNCTION count_partition_truncated('{table}');
+    """
+
+
+def drop_partition_triggers_sql(partition: str) -> str:
+    """بعد DETACH: الجدول المفصول لم يعد جزءاً من الأب، فلا تُحسب جمله في عداده"""
+    return "; ".join(f"DROP TRIGGER IF EXISTS {partition}_count_{action} ON {partition}"
+                     for action in ("insert", "delete", "truncate"))
+
+
+def install_counters(metadata, connection, tables=None, **kw):
+    """بعد create_all (الاختبارات والتشغيل الأول بدون Alembic): نفس ما تنشئه الـ migration"""
+    if connection.dialect.name != "postgresql":
+        return
+    created = {table.name for table in tables} if tables is not None else set(metadata.tables)
+    counted = [table for table in COUNTED_TABLES if table in created]
+    if not counted or "table_row_counts" not in metadata.tables:
+        return
+    connection.execute(text(FUNCTIONS_SQL))
+    for table in counted:
+        connection.execute(text(triggers_sql(table)))
+
+
+def register(metadata):
+    event.listen(metadata, "after_create", install_counters)
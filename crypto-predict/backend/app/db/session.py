@@ -1,20 +1,56 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import get_settings
+from app.db.pool import TimedAsyncQueuePool, TimedQueuePool, pool_stats
 
 settings = get_settings()
 
-# ملاحظة: تأكد أن DATABASE_URL في ملف الـ .env ينتهي بـ @localhost:5432/crypto_db 
+
+def _pool_options() -> dict:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SEC,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SEC,
+    }
+
+
+def async_database_url(url: str) -> str:
+    """نفس قاعدة DATABASE_URL عبر asyncpg (إلا إذا حُدد ASYNC_DATABASE_URL صراحةً)"""
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+# ملاحظة: تأكد أن DATABASE_URL في ملف الـ .env ينتهي بـ @localhost:5432/crypto_db
 # وليس @postgres:5432/crypto_db
-engine = create_engine(settings.DATABASE_URL)
+# المتزامن: الإدخال، التوقع، الـ scheduler والتدريب
+engine = create_engine(settings.DATABASE_URL, poolclass=TimedQueuePool, **_pool_options())
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# غير المتزامن (asyncpg): مسارات القراءة تنتظر قاعدة البيانات داخل الـ event loop
+# بدلاً من حجز خيط من الـ threadpool لكل طلب
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL),
+    poolclass=TimedAsyncQueuePool, **_pool_options()
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def database_pool_stats() -> dict:
+    return {"sync": pool_stats(engine.pool), "async": pool_stats(async_engine.sync_engine.pool)}
@@ -1,5 +1,6 @@
 import os
 import pandas as pd
+from typing import Optional
 from fastapi import FastAPI, HTTPException, UploadFile, File, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
@@ -7,9 +8,11 @@ from sqlalchemy import func
 
 # استيراد إعدادات قاعدة البيانات والموديلات
 from app.db import models
-from app.db.session import engine, SessionLocal, get_db
+from app.db.session import engine, async_engine, SessionLocal, get_db
 from app.core.config import get_settings
 from app.routers import auth_router, prices, sentiment, predict, health, admin_reports
+from app.services import ingest_service, ingest_jobs, inference_executor, rollup_service
+from app.workers.scheduler import start_scheduler, stop_scheduler
 app = FastAPI(title="Crypto Prediction System - Data Porter")
 
 # --- إعدادات CORS ---
@@ -24,95 +27,94 @@ app.add_middleware(
 # --- تسجيل المسارات ---
 app.include_router(auth_router.router, prefix="/api")
 app.include_router(prices.router, prefix="/api")
+app.include_router(predict.router, prefix="/api")
+app.include_router(sentiment.router, prefix="/api")
 app.include_router(admin_reports.router, prefix="/api")
+app.include_router(health.router, prefix="/api")
+
+
+@app.on_event("startup")
+def warm_up_inference_engine():
+    # الإقلاع لا ينتظر الموديلات: التحميل والتمريرة الوهمية في الخلفية (أو داخل عمليات المحرك)
+    if get_settings().ENGINE_WARM_UP_ON_STARTUP:
+        inference_executor.start()
+    # مهام الخلفية: الأسعار، المشاعر، والتوقعات المشتركة بعد كل شمعة جديدة
+    start_scheduler()
+    # أرقام الفترات تُقرأ مرة هنا (جلسة متزامنة) حتى لا تحجز المسارات async الـ event loop عند أول طلب
+    try:
+        rollup_service.timeframe_ids()
+    except Exception as e:
+        print(f"❌ Error loading timeframes: {e}")
+
+
+@app.on_event("shutdown")
+def stop_inference_engine():
+    stop_scheduler()
+    inference_executor.shutdown()
+
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await async_engine.dispose()
 
 # ============================================================
 # 📥 الوظيفة الكبرى: رفع بيانات الأسعار والمشاعر معاً
 # ============================================================
 
-@app.post("/api/admin/upload-dataset", tags=["Data Import Tool"])
-async def upload_full_dataset(file: UploadFile = File(...), db: Session = Depends(get_db)):
+@app.post("/api/admin/upload-dataset", tags=["Data Import Tool"], status_code=202)
+def upload_full_dataset(
+    file: UploadFile = File(...),
+    method: str = "copy",
+    stream: bool = True,
+    chunk_rows: Optional[int] = None,
+    on_conflict: str = "update",
+):
     """
-    ارفع ملف CSV (dataset_ohlcv_with_market_sentiment)
+    ارفع ملف CSV أو Parquet أو Arrow IPC (dataset_ohlcv_with_market_sentiment)
     سيقوم الكود بتوزيعه على جدولي Candles و Sentiments تلقائياً
+
+    الرفع لا ينتظر المعالجة: يُرجع رقم مهمة (job_id) فوراً، ويقوم عمال الخلفية
+    بالتحميل بالترتيب. تابع الحالة عبر /api/admin/ingest-jobs/{job_id}
+
+    - method=copy: المحرك العمودي (COPY FROM STDIN) — الافتراضي
+    - method=orm: المسار القديم عبر bulk_insert_mappings (للمقارنة فقط)
+    - stream=true: قراءة الملف على دفعات (chunk_rows) مع commit لكل دفعة
+    - on_conflict: update (upsert، الافتراضي) | ignore | error — إعادة رفع نفس
+      الملف لا تُنشئ صفوفاً مكررة بفضل المفتاح (asset_id, timeframe_id, timestamp)
     """
+    if method not in ("copy", "orm"):
+        raise HTTPException(status_code=400, detail="method must be 'copy' or 'orm'")
+    if on_conflict not in ingest_service.CONFLICT_MODES:
+        raise HTTPException(status_code=400, detail=f"on_conflict must be one of {ingest_service.CONFLICT_MODES}")
+    if stream and method != "copy":
+        raise HTTPException(status_code=400, detail="stream mode only supports method=copy")
+
     try:
-        # 1. قراءة الملف باستخدام pandas
-        df = pd.read_csv(file.file)
-        
-        # التأكد من وجود الأعمدة المطلوبة
-        required_cols = ['open_time', 'symbol', 'open', 'close', 'avg_sentiment']
-        if not all(col in df.columns for col in required_cols):
-            raise HTTPException(status_code=400, detail="الملف ينقصه أعمدة أساسية!")
-
-        # 2. تجهيز العملات والفترات (Lookups)
-        # سنجلب ID الـ Timeframe الخاص بالساعة '1h'
-        tf = db.query(models.Timeframe).filter(models.Timeframe.code == "1h").first()
-        if not tf:
-            tf = models.Timeframe(code="1h", description="Hourly")
-            db.add(tf)
-            db.commit()
-            db.refresh(tf)
-
-        # 3. معالجة البيانات وتحويلها لتنسيق قاعدة البيانات
-        candles_to_add = []
-        sentiments_to_add = []
-
-        # تحويل الرموز (Symbols) لـ IDs
-        symbol_map = {s.symbol.lower(): s.asset_id for s in db.query(models.CryptoAsset).all()}
-
-        for _, row in df.iterrows():
-            sym = str(row['symbol']).lower()
-            
-            # إذا العملة مش موجودة بجدول CryptoAsset، بنضيفها
-            if sym not in symbol_map:
-                new_asset = models.CryptoAsset(symbol=sym.upper(), name=sym.upper())
-                db.add(new_asset)
-                db.commit()
-                db.refresh(new_asset)
-                symbol_map[sym] = new_asset.asset_id
-
-            asset_id = symbol_map[sym]
-
-            # تجهيز بيانات الشموع (Candles)
-            candles_to_add.append({
-                "asset_id": asset_id,
-                "timeframe_id": tf.timeframe_id,
-                "timestamp": row['open_time'],
-                "open": row['open'],
-                "high": row['high'],
-                "low": row['low'],
-                "close": row['close'],
-                "volume": row['volume'],
-                "exchange": "Binance" # افتراضي
-            })
-
-            # تجهيز بيانات المشاعر (Sentiments)
-            if row['sent_count'] > 0: # بنضيف مشاعر فقط إذا كان في داتا
-                sentiments_to_add.append({
-                    "asset_id": asset_id,
-                    "timestamp": row['open_time'],
-                    "avg_sentiment": row['avg_sentiment'],
-                    "sent_count": row['sent_count'],
-                    "pos_count": row['pos_count'],
-                    "neg_count": row['neg_count'],
-                    "source": "Market Data"
-                })
-
-        # 4. الحفظ الجماعي (Bulk Insert) للسرعة
-        db.bulk_insert_mappings(models.Candle, candles_to_add)
-        db.bulk_insert_mappings(models.Sentiment, sentiments_to_add)
-        
-        db.commit()
-        return {
-            "status": "Success",
-            "message": f"تم رفع {len(candles_to_add)} سجل أسعار و {len(sentiments_to_add)} سجل مشاعر بنجاح!"
-        }
+        job = ingest_jobs.submit_upload(
+            file.file, file.filename,
+            method=method, stream=stream, chunk_rows=chunk_rows, on_conflict=on_conflict,
+        )
+    except ingest_jobs.IngestQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
 
-    except Exception as e:
-        db.rollback()
-        print(f"Error: {e}")
-        raise HTTPException(status_code=500, detail=f"حدث خطأ أثناء المعالجة: {str(e)}")
+    return {
+        "status": "Queued",
+        "job_id": job.job_id,
+        "status_url": f"/api/admin/ingest-jobs/{job.job_id}",
+    }
+
+
+@app.get("/api/admin/ingest-jobs", tags=["Data Import Tool"])
+def list_ingest_jobs():
+    return {"queued": ingest_jobs.queue_depth(), "jobs": ingest_jobs.list_jobs()}
+
+
+@app.get("/api/admin/ingest-jobs/{job_id}", tags=["Data Import Tool"])
+def get_ingest_job(job_id: str):
+    job = ingest_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job.as_dict()
 
 # --- باقي كود الـ Startup والـ Root كما هو ---
 @app.get("/")
@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.db.session import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_db, get_async_db, database_pool_stats
 from app.db import models
-from app.core.security import get_current_user
+from app.core.security import get_current_user_async
+from app.services.prediction_cache import prediction_cache
+from app.services import inference_executor, model_registry, forecast_service, rollup_service, stats_service
+from app.services.snapshot_service import update_snapshots
+from app.services.feature_store import update_features
 from datetime import datetime, timezone
 
 router = APIRouter(prefix="/admin", tags=["Admin Reports"])
@@ -12,20 +16,30 @@ router = APIRouter(prefix="/admin", tags=["Admin Reports"])
 # 1. إحصائيات لوحة التحكم (Dashboard Stats)
 # المسار: /api/admin/stats
 # ============================================================
+# الجدول → المفتاح في الرد
+_DASHBOARD_COUNTS = {
+    "users": "total_users",
+    "prediction": "total_predictions",
+    "candle_ohlcv": "total_candles",
+    "sentiments": "total_sentiments",
+}
+
 @router.get("/stats")
-def get_admin_stats(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_admin_stats(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     # التأكد أن المستخدم "Admin" فقط
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
+    # بدون COUNT(*): عدادات دقيقة أو تقدير، مع طريقة حساب كل رقم في modes
+    result = await stats_service.cached_table_counts(db, list(_DASHBOARD_COUNTS))
+    counts = result["counts"]
     return {
-        "total_users": db.query(models.User).count(),
-        "total_predictions": db.query(models.Prediction).count(),
-        "total_candles": db.query(models.Candle).count(),
-        "total_sentiments": db.query(models.Sentiment).count(),
+        **{key: counts[table]["value"] for table, key in _DASHBOARD_COUNTS.items()},
+        "modes": {key: counts[table]["mode"] for table, key in _DASHBOARD_COUNTS.items()},
+        "cache": result["cache"],
     }
 
 # ============================================================
@@ -33,18 +47,19 @@ def get_admin_stats(
 # المسار: /api/admin/retrain
 # ============================================================
 @router.post("/retrain")
-def retrain_model(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def retrain_model(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
     try:
         # 1. تسجيل عملية التدريب في جدول ModelLog (حسب الـ ERD)
+        # العمود بدون timezone: asyncpg لا يحوّل datetime فيه tzinfo ضمنياً كما يفعل psycopg2
         new_log = models.ModelLog(
-            trained_at=datetime.now(timezone.utc),
-            records_count=db.query(models.Candle).count(),
+            trained_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            records_count=(await stats_service.table_counts(db, ["candle_ohlcv"]))["candle_ohlcv"]["value"],
             status="Success",
             user_id=current_user.user_id
         )
@@ -53,11 +68,144 @@ def retrain_model(
         # 2. في المشاريع الحقيقية، هنا يتم استدعاء سكريبت التدريب
         # لغايات مشروع التخرج، سنقوم بعمل محاكاة ناجحة
         
-        db.commit()
+        await db.commit()
         return {
             "status": "success",
             "message": "Model retraining triggered successfully! High accuracy achieved."
         }
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ============================================================
+# 3. إحصائيات كاش التوقعات (Prediction Cache)
+# المسار: /api/admin/prediction-cache
+# ============================================================
+@router.get("/prediction-cache")
+def get_prediction_cache_stats(current_user: models.User = Depends(get_current_user_async)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return prediction_cache.stats()
+
+# ============================================================
+# 4. مقاييس محرك التوقع (عمق الطابور وزمن الانتظار)
+# المسار: /api/admin/inference-executor
+# ============================================================
+@router.get("/inference-executor")
+def get_inference_executor_stats(current_user: models.User = Depends(get_current_user_async)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return inference_executor.stats()
+
+# ============================================================
+# 5. نسخ الموديل (Model Registry): العرض، التفعيل، والرجوع
+# المسار: /api/admin/models
+# ============================================================
+@router.get("/models")
+def list_model_versions(current_user: models.User = Depends(get_current_user_async)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return {"active": model_registry.get_active_version(), "versions": model_registry.list_versions()}
+
+
+@router.post("/models/{version_id}/activate")
+def activate_model_version(version_id: str, current_user: models.User = Depends(get_current_user_async)):
+    """
+    تبديل النسخة الفعالة. عمليات المحرك تحمّلها في الخلفية وتنتقل إليها بين الطلبات
+    بدون إعادة تشغيل (تابع /api/health/ready).
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    try:
+        manifest = model_registry.set_active(version_id)
+    except model_registry.ModelRegistryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "active": version_id, "created_at": manifest["created_at"]}
+
+
+@router.post("/models/rollback")
+def rollback_model_version(current_user: models.User = Depends(get_current_user_async)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    try:
+        version_id = model_registry.rollback()
+    except model_registry.ModelRegistryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "active": version_id}
+
+# ============================================================
+# 6. التوقعات المشتركة: حداثتها وتحديثها يدوياً
+# المسار: /api/admin/forecasts
+# ============================================================
+@router.get("/forecasts")
+async def get_forecast_freshness(db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user_async)):
+    """لكل عملة وفترة: آخر شمعة مقابل شمعة مصدر آخر توقع، مع ملخص آخر تشغيل للـ scheduler"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    status = await db.run_sync(forecast_service.forecast_status)
+    return {
+        "last_refresh": forecast_service.refresh_stats(),
+        "stale": sum(1 for item in status if item["stale"]),
+        "forecasts": [{
+            "symbol": item["asset"].symbol,
+            "timeframe": item["timeframe"].code,
+            "latest_candle": item["latest_candle"],
+            "forecast_source": item["forecast_source"],
+            "stale": item["stale"],
+        } for item in status],
+    }
+
+
+@router.post("/forecasts/refresh")
+def refresh_forecasts_now(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user_async)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    try:
+        return forecast_service.refresh_forecasts(db)
+    except inference_executor.InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+# ============================================================
+# 7. الفترات المجمّعة (4h, 1d, 1w): إعادة البناء الكاملة من البيانات الساعية
+# المسار: /api/admin/rollups/rebuild
+# ============================================================
+@router.post("/rollups/rebuild")
+def rebuild_rollups(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user_async)):
+    """
+    للتشغيل الأول على بيانات موجودة مسبقاً أو بعد تصحيح بيانات قديمة؛ الإدخال العادي
+    يحدّث الـ buckets المتأثرة تلقائياً.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    try:
+        # الميزات والملخص في نفس المعاملة: الـ buckets المُعاد بناؤها تصل إلى التوقع مباشرة
+        bounds = rollup_service.hourly_bounds(db)
+        rollups = rollup_service.update_rollups(db, bounds)
+        snapshots = update_snapshots(db, bounds)
+        features = update_features(db, bounds)
+        db.commit()
+        prediction_cache.invalidate([int(a) for a in bounds["asset_id"].unique()])
+        return {"status": "success", "rollups": rollups, "snapshots": snapshots, "features": features}
     except Exception as e:
         db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================================
+# 8. الـ connection pools (المتزامن و async): الاتصالات المستخدمة، الـ overflow، وزمن الانتظار
+# المسار: /api/admin/db-pool
+# ============================================================
+@router.get("/db-pool")
+def get_db_pool_stats(current_user: models.User = Depends(get_current_user_async)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return database_pool_stats()
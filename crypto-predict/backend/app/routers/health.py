@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from app.db.session import get_db
+from app.db.session import get_async_db
+from app.services import inference_executor
 
 # تعريف المسار مع الوسوم المناسبة
 router = APIRouter(prefix="/health", tags=["System Health"])
 
 @router.get("/")
-def check_system_health(db: Session = Depends(get_db)):
+async def check_system_health(db: AsyncSession = Depends(get_async_db)):
     """
     فحص شامل لحالة النظام (السيرفر وقاعدة البيانات)
     """
@@ -15,7 +17,7 @@ def check_system_health(db: Session = Depends(get_db)):
     try:
         # تنفيذ استعلام بسيط للتأكد من اتصال قاعدة البيانات
         
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         db_status = "Connected"
     except Exception as e:
         # في حال فشل الاتصال بالقاعدة
@@ -27,4 +29,16 @@ def check_system_health(db: Session = Depends(get_db)):
         "message": "Backend is pulsing!",
         "database": db_status,
         "version": "1.0.0"
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/ready")
+def check_readiness():
+    """
+    فحص الجاهزية (readiness): منفصل عن فحص الحياة أعلاه.
+    يُرجع 200 فقط بعد تحميل الموديلات وتنفيذ تمريرة وهمية واحدة، وإلا 503
+    حتى لا يُرسل الـ load balancer طلبات التوقع لـ worker لم يجهز بعد.
+    """
+    # إذا لم يبدأ التحميل بعد (مثلاً ENGINE_WARM_UP_ON_STARTUP=false) يبدأ الآن
+    status = inference_executor.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
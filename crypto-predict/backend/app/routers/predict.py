@@ -1,21 +1,81 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response, BackgroundTasks, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 
-from app.db.session import get_db
-from app.schemas.prediction_schema import PredictionResponse
+from app.db.session import get_db, get_async_db
+from app.schemas.prediction_schema import PredictionResponse, PredictionPage, BatchPredictionRequest, BatchPredictionItem
 from app.db import models
-from app.services.prediction_service import generate_predictions
-from app.core.security import get_current_user
+from app.services.prediction_service import generate_batch_predictions_async
+from app.services.inference_executor import InferenceQueueFull
+from app.services.forecast_service import ensure_forecast_async, freshness_headers, record_access
+from app.services import pagination
+from app.services.rollup_service import resolve_timeframe_id
+from app.core.security import get_current_user, get_current_user_async
 
 router = APIRouter(
     prefix="/predict",
     tags=["Prediction"],
 )
 
+def queue_full_error(e: InferenceQueueFull) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+
+def get_timeframe(db: Session, code: str):
+    return db.query(models.Timeframe).filter(models.Timeframe.code == code).first()
+
+
+def get_assets(db: Session, symbols: list):
+    return db.query(models.CryptoAsset).filter(models.CryptoAsset.symbol.in_(symbols)).all()
+
+
+@router.post("/batch", response_model=List[BatchPredictionItem])
+async def get_batch_predictions(
+    request: BatchPredictionRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    🔮 توقع عدة عملات في طلب واحد: تمريرة واحدة عبر الـ scaler و XGBoost و LSTM
+    بدلاً من تكرار الطلب لكل عملة.
+    """
+    tf = await run_in_threadpool(get_timeframe, db, request.timeframe)
+
+    if not tf:
+        raise HTTPException(status_code=404, detail=f"Timeframe '{request.timeframe}' not supported.")
+
+    symbols = list(dict.fromkeys(s.upper() for s in request.symbols))
+    assets = await run_in_threadpool(get_assets, db, symbols)
+
+    try:
+        results = await generate_batch_predictions_async(
+            db=db,
+            assets=assets,
+            timeframe_id=tf.timeframe_id,
+            user_id=current_user.user_id
+        )
+    except InferenceQueueFull as e:
+        raise queue_full_error(e)
+
+    items = []
+    for symbol in symbols:
+        if symbol not in results:
+            items.append(BatchPredictionItem(symbol=symbol, error="Asset not supported."))
+        elif results[symbol] is None:
+            items.append(BatchPredictionItem(symbol=symbol, error="Failed to generate predictions."))
+        else:
+            items.append(BatchPredictionItem(symbol=symbol, predictions=results[symbol]))
+    return items
+
+
 @router.get("/{symbol}", response_model=List[PredictionResponse])
-def get_prediction(
+async def get_prediction(
     symbol: str,
+    response: Response,
+    background_tasks: BackgroundTasks,
     timeframe: str = "1h",  # الإطار الزمني المطلوب (مثل 1h, 4h, 1d)
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
@@ -23,34 +83,69 @@ def get_prediction(
     """
     🔮 التنبؤ بأسعار عملة رقمية معينة بناءً على الهيكلية الجديدة (ERD)
     - يتم التحقق من وجود العملة والإطار الزمني في قاعدة البيانات أولاً.
+    - التوقع محسوب مسبقاً من الـ scheduler لآخر شمعة (قراءة واحدة من الفهرس)،
+      وعمره في الهيدر X-Forecast-Age-Sec.
     """
     
     # 1. التحقق من وجود العملة وجلب الـ asset_id (حسب الرسمة)
-    asset = db.query(models.CryptoAsset).filter(
-        models.CryptoAsset.symbol == symbol.upper()
-    ).first()
+    assets = await run_in_threadpool(get_assets, db, [symbol.upper()])
+    asset = assets[0] if assets else None
     
     if not asset:
         raise HTTPException(status_code=404, detail=f"Asset '{symbol}' not supported.")
 
     # 2. التحقق من وجود الإطار الزمني وجلب الـ timeframe_id (حسب الرسمة)
-    tf = db.query(models.Timeframe).filter(
-        models.Timeframe.code == timeframe
-    ).first()
+    tf = await run_in_threadpool(get_timeframe, db, timeframe)
     
     if not tf:
         raise HTTPException(status_code=404, detail=f"Timeframe '{timeframe}' not supported.")
 
-    # 3. استدعاء الخدمة لتوليد التوقعات (تمرير الـ IDs والـ User)
-    # ملاحظة: استبدلنا Mock بـ generate_predictions ليعكس الواقع
-    predictions = generate_predictions(
-        db=db, 
-        asset_id=asset.asset_id, 
-        timeframe_id=tf.timeframe_id, 
-        user_id=current_user.user_id
-    )
+    # 3. قراءة التوقع المشترك (يُحسب هنا مرة واحدة فقط إذا لم يسبقنا الـ scheduler)
+    try:
+        predictions, latest_ts, features_at = await ensure_forecast_async(db, asset, tf.timeframe_id)
+    except InferenceQueueFull as e:
+        raise queue_full_error(e)
     
     if not predictions:
         raise HTTPException(status_code=500, detail="Failed to generate predictions.")
 
-    return predictions
\ No newline at end of file
+    response.headers.update(freshness_headers(predictions, latest_ts, features_at))
+    # سجل الوصول يُكتب بعد إرسال الرد
+    background_tasks.add_task(record_access, current_user.user_id, predictions)
+    return predictions
+
+
+@router.get("/{symbol}/history", response_model=PredictionPage)
+async def get_prediction_history(
+    symbol: str,
+    timeframe: str = "1h",
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async),
+):
+    """
+    📜 التوقعات المشتركة السابقة للعملة من الأحدث للأقدم، صفحة بعد صفحة
+    (cursor=next_cursor من الرد السابق).
+    """
+    timeframe_id = resolve_timeframe_id(timeframe)
+    if timeframe_id is None:
+        raise HTTPException(status_code=404, detail=f"Timeframe '{timeframe}' not supported.")
+    asset = (await db.execute(
+        select(models.CryptoAsset).where(models.CryptoAsset.symbol == symbol.upper())
+    )).scalars().first()
+    if not asset:
+        raise HTTPException(status_code=404, detail=f"Asset '{symbol}' not supported.")
+
+    stmt = select(models.Prediction).where(
+        models.Prediction.asset_id == asset.asset_id,
+        models.Prediction.timeframe_id == timeframe_id,
+        models.Prediction.user_id.is_(None),
+    )
+    try:
+        # عدة توقعات قد تشترك في نفس الوقت (نسختا موديل مثلاً): id يكسر التعادل
+        stmt = pagination.keyset(stmt, [models.Prediction.timestamp, models.Prediction.id_Prediction], cursor, limit)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = (await db.execute(stmt)).scalars().all()
+    return pagination.page(rows, limit, key_of=lambda p: [p.timestamp, p.id_Prediction], to_item=lambda p: p)
@@ -1,14 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Response, BackgroundTasks, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session 
-from sqlalchemy import func
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 import pandas as pd
 import io
 from datetime import datetime, timezone
 from typing import List, Optional
-from app.db.session import get_db
+from app.db.session import get_db, get_async_db
 from app.db import models
-from app.services.prediction_service import generate_predictions    
+from app.services.forecast_service import ensure_forecast_async, freshness_headers, record_access, timeframe_delta
+from app.services import history_service, pagination
+from app.services.inference_executor import InferenceQueueFull
+from starlette.concurrency import run_in_threadpool
+from app.services.prediction_cache import prediction_cache
+from app.services.rollup_service import resolve_timeframe_id, update_rollups
+from app.services.snapshot_service import update_snapshots
+from app.services.feature_store import update_features
+from app.services.partition_service import ensure_partitions
 from app.core.security import get_current_user
 from app.schemas.prediction_schema import PredictionResponse
 
@@ -26,53 +36,147 @@ class ManualDataInput(BaseModel):
 
 #     (Top Assets)
 @router.get("/top-assets")
-def get_top_assets(db: Session = Depends(get_db)):
-    subquery = db.query(
-        models.Candle.asset_id,
-        func.max(models.Candle.timestamp).label("max_ts")
-    ).group_by(models.Candle.asset_id).subquery()
-
-    latest_prices = db.query(models.Candle, models.CryptoAsset.symbol).join(
-        subquery, (models.Candle.asset_id == subquery.c.asset_id) & 
-                  (models.Candle.timestamp == subquery.c.max_ts)
-    ).join(models.CryptoAsset, models.Candle.asset_id == models.CryptoAsset.asset_id).all()
+async def get_top_assets(db: AsyncSession = Depends(get_async_db)):
+    # قراءة واحدة من asset_snapshots (صف لكل عملة) بدلاً من GROUP BY على جدول الشموع كاملاً
+    snapshots = (await db.execute(
+        select(models.AssetSnapshot, models.CryptoAsset.symbol)
+        .join(models.CryptoAsset, models.AssetSnapshot.asset_id == models.CryptoAsset.asset_id)
+        .order_by(models.AssetSnapshot.asset_id)
+    )).all()
 
     return [
         {
-            "id": r.Candle.asset_id, 
+            "id": r.AssetSnapshot.asset_id, 
             "name": r.symbol.upper(), 
-            "price": float(r.Candle.close), 
-            "change": 0.5
-        } for r in latest_prices
+            "price": float(r.AssetSnapshot.last_close), 
+            # نسبة التغير خلال 24 ساعة (None إذا لم يوجد تاريخ كافٍ للعملة)
+            "change": round(r.AssetSnapshot.change_24h_pct, 2) if r.AssetSnapshot.change_24h_pct is not None else None,
+            # قيم الـ 24 ساعة nullable في asset_snapshots، فـ None تبقى None بدلاً من TypeError
+            "high_24h": float(r.AssetSnapshot.high_24h) if r.AssetSnapshot.high_24h is not None else None,
+            "low_24h": float(r.AssetSnapshot.low_24h) if r.AssetSnapshot.low_24h is not None else None,
+            "volume_24h": float(r.AssetSnapshot.volume_24h) if r.AssetSnapshot.volume_24h is not None else None,
+            "last_update": r.AssetSnapshot.last_ts,
+        } for r in snapshots
     ]
 
-@router.get("/{symbol}")
-def get_historical_ohlcv(symbol: str, db: Session = Depends(get_db)):
-    asset = db.query(models.CryptoAsset).filter(func.lower(models.CryptoAsset.symbol) == symbol.lower()).first()
-    if not asset: 
+def _timeframe_or_400(timeframe: str) -> int:
+    timeframe_id = resolve_timeframe_id(timeframe)
+    if timeframe_id is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported timeframe: {timeframe}")
+    return timeframe_id
+
+async def _asset_or_404(db: AsyncSession, symbol: str):
+    asset = (await db.execute(
+        select(models.CryptoAsset).where(func.lower(models.CryptoAsset.symbol) == symbol.lower())
+    )).scalars().first()
+    if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
-    
-    data = db.query(models.Candle).filter(models.Candle.asset_id == asset.asset_id).order_by(models.Candle.timestamp.desc()).limit(150).all()
-    return sorted([{"x": c.timestamp, "y": [float(c.open), float(c.high), float(c.low), float(c.close)]} for c in data], key=lambda x: x['x'])
+    return asset
+
+@router.get("/{symbol}")
+async def get_historical_ohlcv(
+    symbol: str,
+    response: Response,
+    timeframe: str = "1h",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    max_points: int = Query(history_service.DEFAULT_POINTS, ge=2, le=history_service.MAX_POINTS),
+    db: AsyncSession = Depends(get_async_db),
+):
+    timeframe_id = _timeframe_or_400(timeframe)
+    asset = await _asset_or_404(db, symbol)
+
+    # 4h / 1d / 1w تُقرأ من الـ rollups المخزّنة مباشرة؛ الأعمدة كلها في الفهرس (Index Only Scan)
+    # المدى الأطول من max_points يُضغط داخل الاستعلام إلى buckets (عرضها في X-Bucket-Seconds)
+    try:
+        stmt, width = history_service.history_query(
+            asset.asset_id, timeframe_id, timeframe_delta(timeframe.lower()), start, end, max_points
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if width is not None:
+        response.headers["X-Bucket-Seconds"] = str(int(width.total_seconds()))
+
+    return [{"x": ts, "y": [o, h, l, c]} for ts, o, h, l, c in (await db.execute(stmt)).all()]
+
+
+def _candle_columns():
+    # نفس أعمدة الفهرس المغطّي، والأسعار float من قاعدة البيانات
+    return [
+        models.Candle.timestamp,
+        cast(models.Candle.open, Float).label("open"), cast(models.Candle.high, Float).label("high"),
+        cast(models.Candle.low, Float).label("low"), cast(models.Candle.close, Float).label("close"),
+        cast(models.Candle.volume, Float).label("volume"),
+    ]
+
+@router.get("/{symbol}/candles")
+async def list_candles(
+    symbol: str,
+    timeframe: str = "1h",
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """الشموع كاملة من الأحدث للأقدم، صفحة بعد صفحة (cursor=next_cursor من الرد السابق)"""
+    timeframe_id = _timeframe_or_400(timeframe)
+    asset = await _asset_or_404(db, symbol)
+
+    stmt = select(*_candle_columns()).where(
+        models.Candle.asset_id == asset.asset_id, models.Candle.timeframe_id == timeframe_id
+    )
+    try:
+        # timestamp فريد لكل (عملة، فترة) فيكفي وحده مفتاحاً للمؤشر
+        stmt = pagination.keyset(stmt, [models.Candle.timestamp], cursor, limit)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = (await db.execute(stmt)).all()
+    return pagination.page(rows, limit, key_of=lambda row: [row.timestamp], to_item=lambda row: row._asdict())
+
+@router.get("/{symbol}/export")
+async def export_candles(
+    symbol: str,
+    timeframe: str = "1h",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """📤 الشموع (NDJSON، من الأقدم للأحدث) بتدفق مستمر مهما كان المدى"""
+    timeframe_id = _timeframe_or_400(timeframe)
+    asset = await _asset_or_404(db, symbol)
+
+    stmt = select(*_candle_columns()).where(
+        models.Candle.asset_id == asset.asset_id, models.Candle.timeframe_id == timeframe_id
+    )
+    if start is not None:
+        stmt = stmt.where(models.Candle.timestamp >= history_service.naive_utc(start))
+    if end is not None:
+        stmt = stmt.where(models.Candle.timestamp <= history_service.naive_utc(end))
+    return StreamingResponse(pagination.stream_ndjson(stmt.order_by(models.Candle.timestamp), lambda row: row._asdict()),
+                             media_type="application/x-ndjson")
 
 
 # 3. محرك التوقع الذكي (استدعاء الخدمة الحقيقية)
 @router.get("/predict/{symbol}", response_model=List[PredictionResponse])
-def get_ai_prediction(
+async def get_ai_prediction(
     symbol: str, 
+    response: Response,
+    background_tasks: BackgroundTasks,
+    timeframe: str = "1h",
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    asset = db.query(models.CryptoAsset).filter(func.lower(models.CryptoAsset.symbol) == symbol.lower()).first()
+    timeframe_id = _timeframe_or_400(timeframe)
+    asset = await run_in_threadpool(
+        lambda: db.query(models.CryptoAsset).filter(func.lower(models.CryptoAsset.symbol) == symbol.lower()).first()
+    )
     if not asset: 
         raise HTTPException(status_code=404, detail="Asset not found")
 
-    predictions = generate_predictions(
-        db=db,
-        asset_id=asset.asset_id,
-        timeframe_id=1,
-        user_id=current_user.user_id
-    )
+    try:
+        # التوقع المشترك المحسوب مسبقاً لآخر شمعة
+        predictions, latest_ts, features_at = await ensure_forecast_async(db, asset, timeframe_id=timeframe_id)
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
     if not predictions:
         raise HTTPException(
@@ -80,6 +184,9 @@ def get_ai_prediction(
             detail="Insufficient data for AI prediction. Please upload more historical data (48h required)."
         )
 
+    response.headers.update(freshness_headers(predictions, latest_ts, features_at))
+    # سجل الوصول يُكتب بعد إرسال الرد
+    background_tasks.add_task(record_access, current_user.user_id, predictions)
     return predictions
 
 @router.post("/add-data")
@@ -92,14 +199,21 @@ def add_manual_data(data: ManualDataInput, db: Session = Depends(get_db)):
         if not asset: raise HTTPException(status_code=404, detail="Asset not found")
 
         current_time = datetime.now(timezone.utc)
+        ensure_partitions(current_time, current_time)
 
         new_candle = models.Candle(asset_id=asset.asset_id, timeframe_id=1, timestamp=current_time, open=data.open, high=data.high, low=data.low, close=data.close, volume=data.volume, exchange="Manual_Input")
         db.add(new_candle)
 
-        new_sentiment = models.Sentiment(asset_id=asset.asset_id, timestamp=current_time, avg_sentiment=data.avg_sentiment, sent_count=1, source="Manual", pos_count=1, neg_count=0, neu_count=0, pos_ratio=1.0, neg_ratio=0.0, neu_ratio=0.0, has_news=0)
+        new_sentiment = models.Sentiment(asset_id=asset.asset_id, timeframe_id=1, timestamp=current_time, avg_sentiment=data.avg_sentiment, sent_count=1, pos_count=1, neg_count=0, neu_count=0, pos_ratio=1.0, neg_ratio=0.0, neu_ratio=0.0, has_news=0)
         db.add(new_sentiment)
+        db.flush()
+        new_rows = pd.DataFrame([{"asset_id": asset.asset_id, "timeframe_id": 1, "timestamp": current_time}])
+        update_rollups(db, new_rows)
+        update_snapshots(db, new_rows)
+        update_features(db, new_rows)
         
         db.commit()
+        prediction_cache.invalidate([asset.asset_id])
         return {"status": "success", "message": "Signal injected!"}
     except Exception as e:
         db.rollback()
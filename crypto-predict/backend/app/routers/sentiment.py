@@ -1,40 +1,85 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 
-from app.db.session import get_db
-from app.schemas.sentiment_schema import SentimentResponse
+from app.db.session import get_async_db
+from app.schemas.sentiment_schema import SentimentPage
 from app.db import models
-from app.core.dependencies import get_current_user
+from app.core.security import get_current_user_async
+from app.services import pagination
+from app.services.rollup_service import resolve_timeframe_id
 
 router = APIRouter(prefix="/sentiment", tags=["Sentiment"])
 
-@router.get("/{symbol}", response_model=List[SentimentResponse])
-def get_sentiment_data(
+# أعمدة الفهرس المغطّي فقط (Index Only Scan)
+_COLUMNS = [
+    models.Sentiment.timestamp, models.Sentiment.avg_sentiment, models.Sentiment.sent_count,
+    models.Sentiment.pos_count, models.Sentiment.neg_count, models.Sentiment.neu_count,
+    models.Sentiment.pos_ratio, models.Sentiment.neg_ratio, models.Sentiment.neu_ratio, models.Sentiment.has_news,
+]
+
+
+async def _asset_and_timeframe(db: AsyncSession, symbol: str, timeframe: str):
+    timeframe_id = resolve_timeframe_id(timeframe)
+    if timeframe_id is None:
+        raise HTTPException(status_code=400, detail=f"الفترة {timeframe} غير مدعومة.")
+
+    # البحث عن العملة في جدول الأصول (حسب الرسمة المحدثة)
+    asset = (await db.execute(select(models.CryptoAsset).where(
+        models.CryptoAsset.symbol == symbol.upper()
+    ))).scalars().first()
+    if not asset:
+        raise HTTPException(status_code=404, detail=f"العملة {symbol} غير مدعومة حالياً.")
+    return asset, timeframe_id
+
+
+def _sentiment_query(asset_id: int, timeframe_id: int):
+    return select(*_COLUMNS).where(
+        models.Sentiment.asset_id == asset_id,
+        models.Sentiment.timeframe_id == timeframe_id
+    )
+
+
+@router.get("/{symbol}", response_model=SentimentPage)
+async def get_sentiment_data(
     symbol: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    timeframe: str = "1h",
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """
-    📊 جلب بيانات تحليل المشاعر التفصيلية للعملة المطلوبة.
-    يتم الربط بين اسم العملة (Symbol) ورقمها (Asset_ID) لضمان دقة البيانات.
+    📊 جلب بيانات تحليل المشاعر التفصيلية للعملة المطلوبة، من الأحدث للأقدم.
+    الصفحة التالية: نفس الطلب مع cursor=next_cursor من الرد السابق.
     """
-    
-    # 1. البحث عن العملة في جدول الأصول (حسب الرسمة المحدثة)
-    asset = db.query(models.CryptoAsset).filter(
-        models.CryptoAsset.symbol == symbol.upper()
-    ).first()
-    
-    if not asset:
-        raise HTTPException(status_code=404, detail=f"العملة {symbol} غير مدعومة حالياً.")
+    asset, timeframe_id = await _asset_and_timeframe(db, symbol, timeframe)
 
-    # 2. جلب سجلات المشاعر المرتبطة بهذا الـ asset_id
-    # نأخذ آخر 100 سجل لعرض التطور الزمني للمشاعر
-    sentiment_records = db.query(models.Sentiment).filter(
-        models.Sentiment.asset_id == asset.asset_id
-    ).order_by(models.Sentiment.timestamp.desc()).limit(100).all()
+    # timestamp فريد لكل (عملة، فترة) فيكفي وحده مفتاحاً للمؤشر
+    try:
+        stmt = pagination.keyset(_sentiment_query(asset.asset_id, timeframe_id),
+                                 [models.Sentiment.timestamp], cursor, limit)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = (await db.execute(stmt)).all()
 
-    if not sentiment_records:
+    if not rows and not cursor:
         raise HTTPException(status_code=404, detail="لا توجد بيانات مشاعر متوفرة لهذه العملة.")
 
-    return sentiment_records
\ No newline at end of file
+    return pagination.page(rows, limit, key_of=lambda row: [row.timestamp], to_item=lambda row: row._asdict())
+
+
+@router.get("/{symbol}/export")
+async def export_sentiment_data(
+    symbol: str,
+    timeframe: str = "1h",
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    """📤 كل سجل المشاعر للعملة (NDJSON، من الأقدم للأحدث) بتدفق مستمر بدون تحميله في الذاكرة"""
+    asset, timeframe_id = await _asset_and_timeframe(db, symbol, timeframe)
+    stmt = _sentiment_query(asset.asset_id, timeframe_id).order_by(models.Sentiment.timestamp)
+    return StreamingResponse(pagination.stream_ndjson(stmt, lambda row: row._asdict()),
+                             media_type="application/x-ndjson")
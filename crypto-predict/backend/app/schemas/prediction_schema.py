@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class PredictionBase(BaseModel):
     asset_id: int 
@@ -14,8 +14,26 @@ class PredictionBase(BaseModel):
 # المخطط   (Response)
 class PredictionResponse(PredictionBase):
     id_Prediction: int     
-    user_id: int
+    # التوقعات المشتركة (من الـ scheduler) بدون user_id
+    user_id: Optional[int] = None
     created_at: datetime
+    source_ts: Optional[datetime] = None
+    step: Optional[int] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# صفحة من سجل التوقعات المشتركة (next_cursor = None في آخر صفحة)
+class PredictionPage(BaseModel):
+    items: List[PredictionResponse]
+    next_cursor: Optional[str] = None
+
+# طلب التوقع الجماعي لعدة عملات (POST /predict/batch)
+class BatchPredictionRequest(BaseModel):
+    symbols: List[str] = Field(..., min_length=1, max_length=100)
+    timeframe: str = "1h"
+
+class BatchPredictionItem(BaseModel):
+    symbol: str
+    predictions: Optional[List[PredictionResponse]] = None
+    error: Optional[str] = None
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class SentimentBase(BaseModel):
     timestamp: datetime
@@ -17,4 +17,22 @@ class SentimentBase(BaseModel):
 class SentimentResponse(SentimentBase):
     id: int  
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# صف مشاعر واحد كما يُقرأ من الفهرس (بدون أعمدة الجدول الأخرى)
+class SentimentPoint(BaseModel):
+    timestamp: datetime
+    avg_sentiment: Optional[float] = None
+    sent_count: Optional[int] = None
+    pos_count: Optional[int] = None
+    neg_count: Optional[int] = None
+    neu_count: Optional[int] = None
+    pos_ratio: Optional[float] = None
+    neg_ratio: Optional[float] = None
+    neu_ratio: Optional[float] = None
+    has_news: Optional[int] = None
+
+# صفحة من السجل: next_cursor يُمرر كما هو لطلب الصفحة التالية (None = آخر صفحة)
+class SentimentPage(BaseModel):
+    items: List[SentimentPoint]
+    next_cursor: Optional[str] = None
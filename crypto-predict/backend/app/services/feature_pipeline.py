@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+from typing import Optional
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.db import models
+
+# ============================================================
+# ⚡ مسار الميزات المُجمّع: من قاعدة البيانات إلى مصفوفة float32 متصلة مباشرة
+# (بدون كائنات ORM، بدون قوائم dicts، بدون DataFrame)
+# ============================================================
+
+# نفس ترتيب features.json و scaler.feature_names_in_ — المحرك يعيد الترتيب إذا اختلفت نسخة ما
+FEATURES = [
+    "open", "high", "low", "close", "volume",
+    "sent_count", "avg_sentiment", "pos_count", "neg_count", "neu_count",
+    "pos_ratio", "neg_ratio", "neu_ratio", "has_news",
+]
+
+# أعمدة الميزات في feature_store (float32 جاهزة، المشاعر الناقصة معبّأة مسبقاً)، وقبلها السعر بدقة كاملة
+_WINDOW_COLUMNS = [models.FeatureRow.price] + [getattr(models.FeatureRow, name) for name in FEATURES]
+
+
+# عند معرفة وقت آخر شمعة نبحث في ضعف طول النافذة فقط (يتحمّل فجوات صغيرة في البيانات)
+WINDOW_SPAN_FACTOR = 2
+
+
+def fetch_window_array(db: Session, asset_id: int, timeframe_id: int, seq_len: int,
+                       latest_ts: Optional[datetime] = None, step: Optional[timedelta] = None):
+    """
+    آخر seq_len صف من مخزن الميزات كمصفوفة float32 [seq_len, 14] متصلة وبترتيب زمني تصاعدي.
+    يُرجع (window, current_price) أو None إذا كانت البيانات غير كافية.
+    current_price من عمود price (float8) وليس من close المخزّن بـ float32.
+    latest_ts و step (وقت آخر شمعة وطول الفترة) اختياريان: حدود زمنية صريحة تجعل PostgreSQL
+    يستبعد الأشهر الأخرى وقت التخطيط (partition pruning) بدلاً من تخطيط كل الـ partitions.
+    """
+    stmt = select(*_WINDOW_COLUMNS).where(
+        models.FeatureRow.asset_id == asset_id,
+        models.FeatureRow.timeframe_id == timeframe_id
+    ).order_by(models.FeatureRow.timestamp.desc()).limit(seq_len)
+
+    rows = []
+    if latest_ts is not None and step is not None:
+        latest_ts = latest_ts.astimezone(timezone.utc).replace(tzinfo=None) if latest_ts.tzinfo else latest_ts
+        lower_ts = latest_ts - step * seq_len * WINDOW_SPAN_FACTOR
+        rows = db.execute(stmt.where(models.FeatureRow.timestamp > lower_ts,
+                                     models.FeatureRow.timestamp <= latest_ts)).all()
+    if len(rows) < seq_len:
+        # بدون حدود أو فجوة أطول من الهامش: البحث في كل التاريخ
+        rows = db.execute(stmt).all()
+    if len(rows) < seq_len:
+        return None
+
+    current_price = rows[0][0]
+    # الصفوف تنازلية من الاستعلام؛ نقرأها معكوسة (بدون عمود السعر) مباشرة إلى مصفوفة واحدة
+    # (fromiter أسرع بكثير من np.array على كائنات Row)
+    values = chain.from_iterable(row[1:] for row in reversed(rows))
+    window = np.fromiter(values, dtype=np.float32, count=seq_len * len(FEATURES))
+    return window.reshape(seq_len, len(FEATURES)), current_price
+
+
+# ============================================================
+# 📐 الـ scaler كتحويل خطي x * scale + offset محسوب مسبقاً
+# ============================================================
+
+def affine_from_scaler(scaler, dtype=np.float32):
+    """
+    StandardScaler و RobustScaler: (x - center) / scale، و MinMaxScaler: x * scale + min.
+    يُرجع (scale, offset) بحيث scaler.transform(x) == x * scale + offset.
+    """
+    n_features = scaler.n_features_in_
+    if hasattr(scaler, "min_"):
+        scale, offset = scaler.scale_, scaler.min_
+    else:
+        divisor = scaler.scale_ if scaler.scale_ is not None else np.ones(n_features)
+        center = getattr(scaler, "mean_", None)
+        if center is None:
+            center = getattr(scaler, "center_", None)
+        if center is None or getattr(scaler, "with_mean", True) is False or getattr(scaler, "with_centering", True) is False:
+            center = np.zeros(n_features)
+        scale = 1.0 / divisor
+        offset = -center / divisor
+    return np.asarray(scale, dtype=dtype), np.asarray(offset, dtype=dtype)
+
+
+def apply_affine(X: np.ndarray, scale: np.ndarray, offset: np.ndarray) -> np.ndarray:
+    """تطبيق الـ scaler داخل نفس المصفوفة (in place) على المحور الأخير"""
+    np.multiply(X, scale, out=X)
+    np.add(X, offset, out=X)
+    return X
@@ -0,0 +1,109 @@
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.services.feature_pipeline import FEATURES
+from app.services.rollup_service import BASE_TIMEFRAME, BUCKET_ORIGIN, ROLLUP_TIMEFRAMES, timeframe_ids
+
+# ============================================================
+# 🧮 مخزن الميزات (feature_store): الشمعة ومشاعرها في صف واحد بميزات الموديل كـ float32
+# يُحدَّث في نفس معاملة الإدخال بعد الـ rollups، للشموع الجديدة وللـ buckets المجمّعة التي لمستها،
+# فيقرأ التوقع والتدريب نطاقاً واحداً من الفهرس بدلاً من join الشموع بالمشاعر ومعالجة NULL في Python.
+# ============================================================
+
+# المشاعر تُخزّن فقط للساعات التي فيها أخبار (sent_count > 0)، فغياب الصف = ساعة بدون أخبار.
+# نفس القاعدة للأعمدة الفارغة في صف موجود. كانت هذه الساعات تسقط من الـ join سابقاً
+# فتظهر النافذة متصلة وهي تقفز فوق ساعات كاملة.
+SENTIMENT_FILL = {
+    "sent_count": 0, "avg_sentiment": 0, "pos_count": 0, "neg_count": 0, "neu_count": 0,
+    "pos_ratio": 0, "neg_ratio": 0, "neu_ratio": 0, "has_news": 0,
+}
+_CANDLE_FEATURES = {"open", "high", "low", "close", "volume"}
+
+_ORIGIN = pd.Timestamp(BUCKET_ORIGIN)
+
+
+def _feature_expression(name: str) -> str:
+    # DECIMAL → float8 → float4: نفس التقريب الذي كان يحدث في numpy عند بناء النافذة
+    if name in _CANDLE_FEATURES:
+        return f"CAST(CAST(c.{name} AS float8) AS real)"
+    return f"CAST(COALESCE(s.{name}, {SENTIMENT_FILL[name]}) AS real)"
+
+
+_COLUMNS = FEATURES + ["price"]
+
+# updated_at يتغير فقط مع تغيّر القيم (شرط IS DISTINCT FROM)، فإعادة حساب نطاق بلا تغيير لا تُبطل الكاش.
+# لكل (عملة، فترة): من بداية النطاق الجديد، أو من آخر صف في المخزن إن كان أقدم (bucket لم يكن
+# مغلقاً في الإدخال السابق)، أو من أول التاريخ إذا لم يكن للعملة صفوف بعد.
+FILL_SQL = """
+    WITH ranges AS MATERIALIZED (
+        SELECT r.asset_id, r.timeframe_id, r.end_ts,
+               LEAST(r.start_ts, COALESCE(
+                   (SELECT max(timestamp) FROM feature_store
+                    WHERE asset_id = r.asset_id AND timeframe_id = r.timeframe_id),
+                   '-infinity')) AS range_start
+        FROM unnest(CAST(:asset_ids AS integer[]), CAST(:timeframe_ids AS integer[]),
+                    CAST(:starts AS timestamp[]), CAST(:ends AS timestamp[]))
+             AS r(asset_id, timeframe_id, start_ts, end_ts)
+    )
+    INSERT INTO feature_store (asset_id, timeframe_id, timestamp, {columns}, updated_at)
+    SELECT c.asset_id, c.timeframe_id, c.timestamp, {values}, CAST(c.close AS float8),
+           timezone('utc', clock_timestamp())
+    FROM ranges r
+    JOIN candle_ohlcv c ON c.asset_id = r.asset_id AND c.timeframe_id = r.timeframe_id
+     AND c.timestamp >= r.range_start AND c.timestamp <= r.end_ts
+    LEFT JOIN sentiments s ON s.asset_id = c.asset_id AND s.timeframe_id = c.timeframe_id
+     AND s.timestamp = c.timestamp AT TIME ZONE 'UTC'
+    ON CONFLICT (asset_id, timeframe_id, timestamp) DO UPDATE SET {updates}, updated_at = EXCLUDED.updated_at
+    WHERE ({current}) IS DISTINCT FROM ({excluded})
+""".format(
+    columns=", ".join(_COLUMNS),
+    values=", ".join(_feature_expression(name) for name in FEATURES),
+    updates=", ".join(f"{name} = EXCLUDED.{name}" for name in _COLUMNS),
+    current=", ".join(f"feature_store.{name}" for name in _COLUMNS),
+    excluded=", ".join(f"EXCLUDED.{name}" for name in _COLUMNS),
+)
+
+
+def bucket_start(ts: pd.Timestamp, step: str) -> pd.Timestamp:
+    """بداية الـ bucket الذي يقع فيه ts (نفس date_bin في rollup_service)"""
+    width = pd.Timedelta(step)
+    return _ORIGIN + (ts - _ORIGIN) // width * width
+
+
+def update_features(db: Session, candles) -> int:
+    """
+    🔁 تحديث مخزن الميزات بعد إدخال شموع (بدون commit — بعد update_rollups في نفس المعاملة).
+    candles: DataFrame فيه asset_id و timeframe_id و timestamp. الشموع الساعية تُحدّث أيضاً
+    صفوف الفترات المجمّعة للـ buckets التي تقع فيها. يُرجع عدد الصفوف المكتوبة.
+    """
+    if candles is None or len(candles) == 0:
+        return 0
+    ids = timeframe_ids()
+    base_id = ids[BASE_TIMEFRAME[0]]
+
+    timestamps = pd.to_datetime(candles["timestamp"])
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_convert("UTC").dt.tz_localize(None)
+    bounds = pd.DataFrame({
+        "asset_id": candles["asset_id"], "timeframe_id": candles["timeframe_id"], "timestamp": timestamps,
+    }).groupby(["asset_id", "timeframe_id"])["timestamp"].agg(["min", "max"])
+
+    ranges = []
+    for (asset_id, timeframe_id), start, end in zip(bounds.index, bounds["min"], bounds["max"]):
+        ranges.append((int(asset_id), int(timeframe_id), start, end))
+        if timeframe_id == base_id:
+            for code, step, _ in ROLLUP_TIMEFRAMES:
+                ranges.append((int(asset_id), ids[code], bucket_start(start, step), end))
+    return refresh_features(db, ranges)
+
+
+def refresh_features(db: Session, ranges: list) -> int:
+    """ranges: [(asset_id, timeframe_id, start, end)] — الشموع في [start, end] تُكتب في المخزن"""
+    if not ranges:
+        return 0
+    return db.execute(text(FILL_SQL), {
+        "asset_ids": [r[0] for r in ranges],
+        "timeframe_ids": [r[1] for r in ranges],
+        "starts": [r[2].to_pydatetime() for r in ranges],
+        "ends": [r[3].to_pydatetime() for r in ranges],
+    }).rowcount
@@ -0,0 +1,282 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, and_, true
+from starlette.concurrency import run_in_threadpool
+from app.db import models
+from app.db.session import SessionLocal
+from app.services import inference_executor
+from app.services.inference_service import SEQ_LEN
+from app.services.prediction_service import (
+    fetch_feature_window, forecast_rows, save_forecasts, log_access, commit_keep_loaded, latest_candle_timestamp,
+    features_updated_at, FORECAST_STEPS,
+)
+
+# ============================================================
+# 🗓️ التوقعات المشتركة (canonical forecasts)
+# الـ scheduler يحسب توقعاً واحداً لكل (عملة، فترة، شمعة) فور إغلاق الشمعة،
+# والـ endpoints تقرأه فقط: زمن القراءة لا يعتمد على كلفة الموديل.
+# ============================================================
+
+_refresh_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_last_refresh = {}
+_last_checked_at = None
+
+
+def timeframe_delta(code: str) -> Optional[timedelta]:
+    """'1h' → ساعة، '4h'، '1d'، '1w' ... (None إذا كان الرمز غير معروف)"""
+    units = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+    try:
+        return timedelta(**{units[code[-1]]: int(code[:-1])})
+    except (KeyError, ValueError, IndexError):
+        return None
+
+
+def _utcnow() -> datetime:
+    # أعمدة timestamp في جدول الشموع بدون timezone (UTC)
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _shared_forecast():
+    return and_(models.Prediction.user_id.is_(None), models.Prediction.source_ts.isnot(None))
+
+
+def _same_market(model):
+    # ربط استعلام فرعي بالعملة والفترة في الاستعلام الخارجي (CryptoAsset × Timeframe)
+    return and_(model.asset_id == models.CryptoAsset.asset_id, model.timeframe_id == models.Timeframe.timeframe_id)
+
+
+def is_stale(source_ts, created_at, latest_candle=None, features_at=None) -> bool:
+    """
+    التوقع قديم إذا حُسب من شمعة أقدم من آخر شمعة، أو قبل آخر تعديل في نافذة ميزاته
+    (مشاعر متأخرة لنفس الشموع: شمعة المصدر لم تتغير لكن مدخلات الموديل تغيرت).
+    """
+    if source_ts is None:
+        return True
+    if latest_candle is not None and source_ts < latest_candle:
+        return True
+    return features_at is not None and created_at is not None and created_at.replace(tzinfo=None) < features_at
+
+
+def forecast_status(db: Session, timeframe_id: Optional[int] = None) -> list:
+    """
+    لكل (عملة، فترة): آخر شمعة، وشمعة مصدر آخر توقع مشترك، ووقت إنشائه، وآخر تعديل في نافذة الميزات.
+    كل قيمة هي قراءة قصيرة من الفهرس (asset_id و timeframe_id ثابتان)، بدون GROUP BY
+    على جدول الشموع كاملاً.
+    """
+    latest_candle = select(func.max(models.Candle.timestamp)).where(_same_market(models.Candle)).scalar_subquery()
+    latest_forecast = select(models.Prediction.source_ts, models.Prediction.created_at).where(
+        _same_market(models.Prediction), _shared_forecast(),
+    ).order_by(models.Prediction.source_ts.desc(), models.Prediction.id_Prediction.desc()).limit(1)
+    window = select(models.FeatureRow.updated_at).where(_same_market(models.FeatureRow)).order_by(
+        models.FeatureRow.timestamp.desc()
+    ).limit(SEQ_LEN).correlate(models.CryptoAsset, models.Timeframe).subquery()
+
+    stmt = select(
+        models.CryptoAsset, models.Timeframe,
+        latest_candle.label("latest_candle"),
+        latest_forecast.with_only_columns(models.Prediction.source_ts).scalar_subquery().label("forecast_source"),
+        latest_forecast.with_only_columns(models.Prediction.created_at).scalar_subquery().label("forecast_created"),
+        select(func.max(window.c.updated_at)).scalar_subquery().label("features_at"),
+    ).join(models.Timeframe, true())
+    if timeframe_id is not None:
+        stmt = stmt.where(models.Timeframe.timeframe_id == timeframe_id)
+
+    status = []
+    for asset, tf, candle_ts, source_ts, created_at, features_at in db.execute(stmt).all():
+        if candle_ts is None:
+            continue
+        status.append({
+            "asset": asset, "timeframe": tf,
+            "latest_candle": candle_ts, "forecast_source": source_ts, "features_at": features_at,
+            "stale": is_stale(source_ts, created_at, candle_ts, features_at),
+        })
+    return status
+
+
+def latest_forecast(db: Session, asset_id: int, timeframe_id: int) -> list:
+    """
+    📖 آخر توقع مشترك (5 صفوف) بقراءة واحدة من الفهرس uq_prediction_forecast.
+    إذا وُجدت نسختان للشمعة نفسها (تبديل الموديل) نأخذ آخر ما حُفظ: id_Prediction يزداد
+    مع كل INSERT، أما رقم النسخة فلا يصلح للترتيب ("XGB-LSTM_Hybrid" أكبر أبجدياً من أي تاريخ).
+    """
+    rows = db.query(models.Prediction).filter(
+        models.Prediction.asset_id == asset_id,
+        models.Prediction.timeframe_id == timeframe_id,
+        _shared_forecast(),
+    ).order_by(
+        models.Prediction.source_ts.desc(), models.Prediction.id_Prediction.desc()
+    ).limit(FORECAST_STEPS).all()
+    # الساعات تصاعدياً، ومن نفس النسخة فقط (احتياطاً لتوقع محفوظ بأقل من 5 خطوات)
+    return sorted((p for p in rows if (p.source_ts, p.model_used) == (rows[0].source_ts, rows[0].model_used)),
+                  key=lambda p: p.step)
+
+
+def freshness_headers(forecast: list, latest_candle: Optional[datetime] = None,
+                      features_at: Optional[datetime] = None) -> dict:
+    """
+    عمر التوقع المُقدَّم: للمراقبة من جهة العميل أو الـ load balancer.
+    مع latest_candle: X-Forecast-Stale = true إذا كان التوقع محسوباً من شمعة أقدم من آخر شمعة،
+    أو قبل آخر تعديل في نافذة ميزاته (features_at).
+    """
+    created_at = forecast[0].created_at
+    age = (_utcnow() - created_at.replace(tzinfo=None)).total_seconds() if created_at else None
+    headers = {
+        "X-Forecast-Source-Ts": forecast[0].source_ts.isoformat(),
+        "X-Forecast-Age-Sec": f"{max(age, 0):.1f}" if age is not None else "",
+    }
+    if latest_candle is not None:
+        stale = is_stale(forecast[0].source_ts, forecast[0].created_at, latest_candle, features_at)
+        headers["X-Forecast-Stale"] = "true" if stale else "false"
+    return headers
+
+
+def record_access(user_id, forecast: list):
+    """
+    يُستدعى كـ BackgroundTask بعد إرسال الرد: قراءة التوقع لا تنتظر كتابة سجل الوصول.
+    جلسة مستقلة لأن جلسة الطلب تُغلق مع انتهائه.
+    """
+    db = SessionLocal()
+    try:
+        log_access(db, user_id, forecast)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Access log error: {e}")
+    finally:
+        db.close()
+
+
+def _collect_inputs(db: Session, due: list):
+    pending = []
+    for item in due:
+        # وقت آخر شمعة معروف من forecast_status: البحث في الأشهر الأخيرة فقط
+        window = fetch_feature_window(db, item["asset"].asset_id, item["timeframe"].timeframe_id,
+                                      item["latest_candle"], timeframe_delta(item["timeframe"].code))
+        if window is None:
+            continue
+        pending.append((item, *window))
+    windows = [window for _, window, _ in pending]
+    keys = [(item["asset"].asset_id, item["timeframe"].timeframe_id) for item, _, _ in pending]
+    return pending, windows, keys
+
+
+def _forecast_rows(pending: list, ai_outputs: list):
+    rows, lags, failed = [], [], 0
+    now = _utcnow()
+    for (item, _, current_price), ai_output in zip(pending, ai_outputs):
+        if "error" in ai_output:
+            print(f"AI Engine Error: {ai_output['error']}")
+            failed += 1
+            continue
+        asset, tf = item["asset"], item["timeframe"]
+        rows.extend(forecast_rows(ai_output, current_price, asset.asset_id, asset.symbol,
+                                  tf.timeframe_id, source_ts=item["latest_candle"]))
+        # تأخر التوقع عن إغلاق الشمعة (للبيانات الحية فقط؛ البيانات التاريخية تعطي أرقاماً كبيرة)
+        delta = timeframe_delta(tf.code)
+        if delta is not None:
+            lags.append((now - (item["latest_candle"] + delta)).total_seconds())
+    return rows, lags, failed
+
+
+def refresh_forecasts(db: Session, timeframe_id: Optional[int] = None) -> dict:
+    """
+    🔄 مهمة الـ scheduler: حساب التوقع المشترك لكل (عملة، فترة) أُغلقت لها شمعة جديدة
+    منذ آخر توقع — دفعة واحدة لكل فترة عبر محرك التوقع.
+    """
+    global _last_checked_at
+    if not _refresh_lock.acquire(blocking=False):
+        return {"skipped": "refresh already running"}
+    started = time.perf_counter()
+    try:
+        status = forecast_status(db, timeframe_id)
+        due = [item for item in status if item["stale"]]
+        written, failed, lags = 0, 0, []
+
+        for tf_id in sorted({item["timeframe"].timeframe_id for item in due}):
+            pending, windows, keys = _collect_inputs(db, [i for i in due if i["timeframe"].timeframe_id == tf_id])
+            if not pending:
+                continue
+            ai_outputs = inference_executor.predict_batch_sync(windows, keys)
+            rows, tf_lags, tf_failed = _forecast_rows(pending, ai_outputs)
+            # replace: توقع لنفس الشمعة قديم إذا تغيرت نافذة ميزاته بعده
+            save_forecasts(db, rows, replace=True)
+            db.commit()
+            written += len(rows) // FORECAST_STEPS
+            failed += tf_failed
+            lags.extend(tf_lags)
+
+        summary = {
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "checked": len(status),
+            "due": len(due),
+            "refreshed": written,
+            "failed": failed,
+            "close_to_forecast_lag_sec": {
+                "max": round(max(lags), 1) if lags else None,
+                "avg": round(sum(lags) / len(lags), 1) if lags else None,
+            },
+        }
+        with _stats_lock:
+            _last_checked_at = summary["finished_at"]
+            # نحتفظ بآخر تشغيل فعلي (فيه شموع جديدة)، لا بالفحوصات الفارغة كل دقيقة
+            if due:
+                _last_refresh.clear()
+                _last_refresh.update(summary)
+        return summary
+    finally:
+        _refresh_lock.release()
+
+
+async def ensure_forecast_async(db: Session, asset, timeframe_id: int) -> tuple:
+    """
+    قراءة التوقع المشترك مع وقت آخر شمعة وآخر تعديل في نافذة الميزات: (التوقع، latest_candle، features_at).
+    إذا لم يحسبه الـ scheduler بعد (أول تشغيل، عملة جديدة)، أو كان قديماً (شمعة أحدث أو مشاعر
+    متأخرة بعد حسابه، و FORECAST_REFRESH_SEC=0 أو الـ scheduler متأخر)، نحسبه هنا مرة واحدة
+    ونخزّنه كتوقع مشترك، فالطلبات التالية قراءة فقط. إذا تعذّر الحساب نُرجع التوقع القديم كما هو
+    (freshness_headers يعلّمه بـ X-Forecast-Stale).
+    """
+    def read():
+        latest_ts = latest_candle_timestamp(db, asset.asset_id, timeframe_id)
+        features_at = features_updated_at(db, asset.asset_id, timeframe_id, latest_ts) if latest_ts else None
+        return latest_forecast(db, asset.asset_id, timeframe_id), latest_ts, features_at
+
+    forecast, latest_ts, features_at = await run_in_threadpool(read)
+    if latest_ts is None or (forecast and not is_stale(forecast[0].source_ts, forecast[0].created_at,
+                                                       latest_ts, features_at)):
+        return forecast, latest_ts, features_at
+
+    def prepare():
+        tf = db.get(models.Timeframe, timeframe_id)
+        item = {"asset": asset, "timeframe": tf, "latest_candle": latest_ts}
+        return _collect_inputs(db, [item])
+
+    pending, windows, keys = await run_in_threadpool(prepare)
+    if not pending:
+        return forecast, latest_ts, features_at
+    try:
+        ai_outputs = await inference_executor.predict_batch(windows, keys)
+    except inference_executor.InferenceQueueFull:
+        # المحرك مشغول: التوقع القديم أفضل من 503 إن وُجد
+        if forecast:
+            return forecast, latest_ts, features_at
+        raise
+    rows, _, _ = _forecast_rows(pending, ai_outputs)
+    if not rows:
+        return forecast, latest_ts, features_at
+
+    def save():
+        saved = save_forecasts(db, rows, replace=True)
+        commit_keep_loaded(db)
+        return saved
+
+    return await run_in_threadpool(save), latest_ts, features_at
+
+
+def refresh_stats() -> dict:
+    with _stats_lock:
+        return {"last_checked_at": _last_checked_at, **_last_refresh}
@@ -0,0 +1,80 @@
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import Float, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
+from app.db import models
+from app.services.rollup_service import BUCKET_ORIGIN
+
+# ============================================================
+# 📈 سجل الأسعار للرسم البياني: آخر N شمعة، أو مدى زمني (from/to) مضغوط إلى
+# max_points نقطة كحد أقصى مهما طال المدى.
+# الضغط يتم داخل الاستعلام بتجميع OHLC في buckets متساوية (أول open، أعلى high، أدنى low،
+# آخر close) على نفس حدود الـ rollups، فيبقى الرد شموعاً صحيحة بحجم ثابت.
+# ============================================================
+
+DEFAULT_POINTS = 150
+MAX_POINTS = 5000
+
+_ORIGIN = datetime.fromisoformat(BUCKET_ORIGIN)
+
+
+def naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    # أعمدة timestamp في جدول الشموع بدون timezone (UTC)
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def bucket_width(start: datetime, end: datetime, step: timedelta, max_points: int) -> Optional[timedelta]:
+    """
+    عرض الـ bucket (مضاعف لطول الشمعة) بحيث لا يتجاوز عدد الـ buckets في [start, end] القيمة max_points،
+    أو None إذا كان المدى يتسع لـ max_points شمعة بدون ضغط.
+    """
+    candles = (end - start) // step + 1
+    if candles <= max_points:
+        return None
+    # المدى أقصر من (max_points - 1) bucket، فيلمس max_points bucket على الأكثر أينما بدأت حدودها
+    return step * math.ceil(candles / (max_points - 1))
+
+
+def history_query(asset_id: int, timeframe_id: int, step: timedelta, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None, max_points: int = DEFAULT_POINTS):
+    """
+    (الاستعلام، عرض الـ bucket أو None). الصفوف مرتبة تصاعدياً وأعمدتها float من قاعدة البيانات:
+    (timestamp, open, high, low, close).
+    بدون start: آخر max_points شمعة (حتى end إن وُجد).
+    """
+    Candle = models.Candle
+    start, end = naive_utc(start), naive_utc(end)
+    filters = [Candle.asset_id == asset_id, Candle.timeframe_id == timeframe_id]
+    if end is not None:
+        filters.append(Candle.timestamp <= end)
+
+    if start is None:
+        latest = select(
+            Candle.timestamp, cast(Candle.open, Float).label("open"), cast(Candle.high, Float).label("high"),
+            cast(Candle.low, Float).label("low"), cast(Candle.close, Float).label("close"),
+        ).where(*filters).order_by(Candle.timestamp.desc()).limit(max_points).subquery()
+        return select(latest).order_by(latest.c.timestamp), None
+
+    end = end or datetime.now(timezone.utc).replace(tzinfo=None)
+    if start >= end:
+        raise ValueError("'from' must be earlier than 'to'")
+    filters.append(Candle.timestamp >= start)
+
+    width = bucket_width(start, end, step, max_points)
+    if width is None:
+        return select(
+            Candle.timestamp, cast(Candle.open, Float), cast(Candle.high, Float),
+            cast(Candle.low, Float), cast(Candle.close, Float),
+        ).where(*filters).order_by(Candle.timestamp), None
+
+    bucket = func.date_bin(width, Candle.timestamp, literal(_ORIGIN)).label("timestamp")
+    return select(
+        bucket,
+        cast(array_agg(aggregate_order_by(Candle.open, Candle.timestamp.asc()))[1], Float),
+        cast(func.max(Candle.high), Float),
+        cast(func.min(Candle.low), Float),
+        cast(array_agg(aggregate_order_by(Candle.close, Candle.timestamp.desc()))[1], Float),
+    ).where(*filters).group_by(bucket).order_by(bucket), width
@@ -0,0 +1,200 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from app.core.config import get_settings
+from app.services import inference_service
+
+settings = get_settings()
+
+# عدد الطلبات الأخيرة التي نحسب عليها متوسط و p95 لزمن الانتظار والتنفيذ
+METRICS_WINDOW = 1000
+
+
+class InferenceQueueFull(Exception):
+    """كل خانات محرك التوقع مشغولة — يجب على العميل إعادة المحاولة لاحقاً"""
+
+
+# ============================================================
+# 🧠 داخل عمليات الـ pool: الموديلات تُحمّل مرة واحدة لكل عملية
+# ============================================================
+
+def _init_worker():
+    inference_service.warm_up()
+
+
+def _worker_predict(windows: list, keys: Optional[list], submitted_at: float):
+    started_at = time.time()
+    results = inference_service.get_inference_engine().predict_batch(windows, keys=keys)
+    return results, started_at, time.time()
+
+
+def _worker_status() -> dict:
+    return inference_service.engine_status()
+
+
+# ============================================================
+# 🚦 داخل عملية الـ API: طابور محدود + مقاييس
+# ============================================================
+
+# الطلبات المنتظرة + قيد التنفيذ لا تتجاوز INFERENCE_MAX_PENDING (بعدها 503 فوراً)
+_slots = threading.BoundedSemaphore(settings.INFERENCE_MAX_PENDING)
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_warm_up_future = None
+_status_future = None
+_last_status = None
+
+_metrics_lock = threading.Lock()
+_in_flight = 0
+_counters = {"submitted": 0, "completed": 0, "rejected": 0, "failed": 0}
+_wait_ms = deque(maxlen=METRICS_WINDOW)
+_run_ms = deque(maxlen=METRICS_WINDOW)
+
+
+def enabled() -> bool:
+    """INFERENCE_WORKERS=0 يعني التنفيذ داخل عملية الـ API نفسها (threadpool)"""
+    return settings.INFERENCE_WORKERS > 0
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _warm_up_future
+    with _pool_lock:
+        if _pool is None:
+            # spawn بدلاً من fork: عملية الـ API فيها threads (uvicorn، الـ scheduler، الرفع)
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.INFERENCE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+            _warm_up_future = _pool.submit(_worker_status)
+        return _pool
+
+
+def _reset_pool():
+    """عند موت إحدى العمليات يصبح الـ pool غير صالح، ننشئ واحداً جديداً عند الطلب التالي"""
+    global _pool, _warm_up_future, _status_future, _last_status
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _warm_up_future = None
+        _status_future = None
+        _last_status = None
+
+
+def start():
+    """يُستدعى عند الإقلاع: تشغيل العمليات وتحميل الموديلات فيها مسبقاً"""
+    if enabled():
+        _get_pool()
+    else:
+        inference_service.start_warm_up()
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _track(field: str, delta: int):
+    global _in_flight
+    with _metrics_lock:
+        if field == "in_flight":
+            _in_flight += delta
+        else:
+            _counters[field] += delta
+
+
+async def predict_batch(windows: list, keys: Optional[list] = None) -> list:
+    """
+    ⚡ إرسال دفعة نوافذ للمحرك بدون حجز الـ event loop أو عامل الطلب.
+    يرفع InferenceQueueFull فوراً إذا كانت كل الخانات مشغولة (backpressure).
+    """
+    if not _slots.acquire(blocking=False):
+        _track("rejected", 1)
+        raise InferenceQueueFull(f"Inference queue is full ({settings.INFERENCE_MAX_PENDING} pending requests)")
+
+    _track("submitted", 1)
+    _track("in_flight", 1)
+    submitted_at = time.time()
+    try:
+        if enabled():
+            future = _get_pool().submit(_worker_predict, windows, keys, submitted_at)
+            results, started_at, finished_at = await asyncio.wrap_future(future)
+        else:
+            results, started_at, finished_at = await run_in_threadpool(_worker_predict, windows, keys, submitted_at)
+    except BrokenProcessPool as e:
+        print(f"❌ Inference pool crashed: {e}")
+        _reset_pool()
+        _track("failed", 1)
+        return [{"error": "Inference worker crashed"} for _ in windows]
+    finally:
+        _track("in_flight", -1)
+        _slots.release()
+
+    with _metrics_lock:
+        _counters["completed"] += 1
+        _wait_ms.append((started_at - submitted_at) * 1000)
+        _run_ms.append((finished_at - started_at) * 1000)
+    return results
+
+
+def predict_batch_sync(windows: list, keys: Optional[list] = None) -> list:
+    """نفس predict_batch (نفس الطابور والمقاييس) للمهام المتزامنة مثل الـ scheduler"""
+    return asyncio.run(predict_batch(windows, keys))
+
+
+def _summary(values) -> dict:
+    if not values:
+        return {"avg": None, "p95": None, "max": None}
+    ordered = sorted(values)
+    return {
+        "avg": round(sum(ordered) / len(ordered), 2),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def stats() -> dict:
+    with _metrics_lock:
+        return {
+            "mode": "process_pool" if enabled() else "in_process",
+            "workers": settings.INFERENCE_WORKERS,
+            "max_pending": settings.INFERENCE_MAX_PENDING,
+            "queue_depth": _in_flight,
+            **_counters,
+            "wait_ms": _summary(_wait_ms),
+            "run_ms": _summary(_run_ms),
+        }
+
+
+def status() -> dict:
+    """
+    حالة الجاهزية: في وضع الـ pool نسأل عملية عاملة عن حالة محركها. لا ننتظر الرد:
+    نُرجع آخر حالة معروفة ونرسل سؤالاً جديداً إذا انتهى السابق (الحالة متأخرة طلباً واحداً).
+    """
+    global _status_future, _last_status
+    if not enabled():
+        inference_service.start_warm_up()
+        return inference_service.engine_status()
+
+    pool = _get_pool()
+    future = _status_future or _warm_up_future
+    if future is not None and future.done():
+        try:
+            _last_status = future.result()
+        except Exception as e:
+            _last_status = {"ready": False, "state": "failed", "error": str(e)}
+        _status_future = pool.submit(_worker_status)
+
+    if _last_status is None:
+        return {"ready": False, "state": "loading", "workers": settings.INFERENCE_WORKERS}
+    return {**_last_status, "workers": settings.INFERENCE_WORKERS}
@@ -1,83 +1,318 @@
-import torch
-import torch.nn as nn
-import xgboost as xgb
-import joblib
 import json
+import threading
+import time
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
 import os
+from app.core.config import get_settings
+from app.services import model_registry
+from app.services.feature_pipeline import FEATURES, affine_from_scaler, apply_affine
+
+# ملاحظة: torch و xgboost و joblib تُستورد داخل load() فقط، حتى لا يدفع
+# أي process يستورد app.main (الرفع، الـ scheduler، الـ CLI) ثمن تحميلها
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# الملفات الأصلية (أول نسخة في الـ registry تُنسخ منها)؛ المحرك يقرأ من مجلد النسخة الفعالة
 MODEL_DIR = os.path.join(BASE_DIR, "ml_models")
 
+# طول النافذة الزمنية التي تدرّب عليها الـ LSTM (lstm_config.json -> seq_len)
+SEQ_LEN = 48
+
+# حالات الـ streaming المحفوظة (عملة × فترة) والحد الأقصى للشموع التي نلحق بها خطوة بخطوة
+MAX_STREAM_STATES = 1024
+MAX_STREAM_CATCH_UP = 12
+
+
 class InferenceService:
-    def __init__(self):
+    def __init__(self, version_id=None):
+        self.lstm_model = None
+        self.model_version = version_id
+        self.model_dir = None
+        self.load_error = None
+        self.load_seconds = None
+        self.ready = False
+        self.serving_mode = None
+        self.lstm_backend = None
+        self.streaming = False
+        self.stream_states = OrderedDict()
+        self.stream_stats = {"steps": 0, "reuses": 0, "recomputes": 0, "verifications": 0, "mismatches": 0}
+        self._stream_lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        start = time.perf_counter()
         try:
-            with open(os.path.join(MODEL_DIR, "features.json"), "r") as f:
+            import joblib
+            import xgboost as xgb
+
+            # 1. التحقق من النسخة (manifest + checksums) قبل قراءة أي ملف منها
+            if self.model_version is None:
+                raise model_registry.ModelRegistryError("No active model version in the registry")
+            model_registry.verify_version(self.model_version)
+            self.model_dir = model_registry.version_dir(self.model_version)
+
+            with open(os.path.join(self.model_dir, "features.json"), "r") as f:
                 self.features = json.load(f)
-            with open(os.path.join(MODEL_DIR, "thresholds.json"), "r") as f:
+            with open(os.path.join(self.model_dir, "thresholds.json"), "r") as f:
                 self.thresholds = json.load(f)
 
-            # 2. تحميل الـ Scaler
-            self.scaler = joblib.load(os.path.join(MODEL_DIR, "scaler.pkl"))
+            # النوافذ تصل بترتيب FEATURES؛ إذا رتّبت نسخة ما أعمدتها بشكل مختلف نعيد الترتيب
+            self.feature_index = None
+            if self.features != FEATURES:
+                self.feature_index = [FEATURES.index(name) for name in self.features]
+
+            # 2. تحميل الـ Scaler وتحويله لمعاملين (scale, offset) يُطبقان داخل المصفوفة مباشرة
+            self.scaler = joblib.load(os.path.join(self.model_dir, "scaler.pkl"))
+            self.scale, self.offset = affine_from_scaler(self.scaler)
 
             # 3. تحميل نموذج XGBoost
             self.xgb_model = xgb.Booster()
-            self.xgb_model.load_model(os.path.join(MODEL_DIR, "xgb_model.json"))
+            self.xgb_model.load_model(os.path.join(self.model_dir, "xgb_model.json"))
+            if self.xgb_model.feature_names and list(self.xgb_model.feature_names) != self.features:
+                raise ValueError("xgb_model.json feature order does not match features.json")
 
             # 4. تحميل نموذج LSTM
-            self.device = torch.device("cpu") 
-            self.lstm_model = self.load_lstm()
-            print("✅ AI Engine: All models loaded successfully!")
+            settings = get_settings()
+            self.lstm_backend = settings.LSTM_BACKEND
+            if self.lstm_backend == "numpy":
+                self.load_numpy_lstm()
+            elif self.lstm_backend == "torch":
+                self.load_torch_lstm(settings)
+            else:
+                raise ValueError("LSTM_BACKEND must be 'torch' or 'numpy'")
+            self.load_seconds = round(time.perf_counter() - start, 3)
+            print(f"✅ AI Engine: All models loaded successfully! "
+                  f"(version {self.model_version}, lstm={self.lstm_backend}/{self.serving_mode})")
         except Exception as e:
             print(f"❌ AI Engine Error: {str(e)}")
-            self.lstm_model = None 
-
-    def load_lstm(self):
-        # الهيكل المصحح ليتطابق مع أوزان الملف المحفوظ (head.3.weight)
-        class LSTMClassifier(nn.Module):
-            def __init__(self, n_features):
-                super().__init__()
-                self.lstm = nn.LSTM(input_size=n_features, hidden_size=64, num_layers=2, batch_first=True)
-                self.head = nn.Sequential(
-                    nn.Linear(64, 64),  
-                    nn.ReLU(),          
-                    nn.Dropout(0.2),    
-                    nn.Linear(64, 1)    
-                )
-            def forward(self, x):
-                out, _ = self.lstm(x)
-                return self.head(out[:, -1, :]).squeeze(-1)
-
-        model = LSTMClassifier(n_features=len(self.features))
-        model.load_state_dict(torch.load(os.path.join(MODEL_DIR, "lstm_model.pt"), map_location=self.device))
-        model.to(self.device)
-        model.eval()
-        return model
-
-    def predict(self, df_input: pd.DataFrame):
+            self.load_error = str(e)
+            self.lstm_model = None
+
+    def load_torch_lstm(self, settings):
+        import torch
+        from app.services.lstm_service import load_lstm, configure_threads, optimize_for_serving
+
+        self.device = torch.device("cpu")
+        configure_threads(settings.TORCH_NUM_THREADS)
+        self.serving_mode = settings.LSTM_SERVING_MODE
+        self.streaming = settings.LSTM_STREAMING
+        self.stream_verify_every = settings.LSTM_STREAM_VERIFY_EVERY
+        # النسخة الـ eager تبقى للـ streaming (نحتاج الوصول لطبقة lstm و head كلٍّ على حدة)
+        self.lstm_base = load_lstm(os.path.join(self.model_dir, "lstm_model.pt"), len(self.features), self.device)
+        self.lstm_model = optimize_for_serving(self.lstm_base, self.serving_mode)
+
+    def load_numpy_lstm(self):
+        """بدون torch: الأوزان من lstm_model.npz (أو من .pt إذا لم يُصدَّر الملف بعد)"""
+        from app.services.numpy_lstm_service import load_numpy_lstm
+
+        npz_path = os.path.join(self.model_dir, "lstm_model.npz")
+        path = npz_path if os.path.exists(npz_path) else os.path.join(self.model_dir, "lstm_model.pt")
+        self.serving_mode = "numpy"
+        self.lstm_model = load_numpy_lstm(path)
+
+    def warm_up(self) -> bool:
+        """
+        🔥 تمريرة وهمية واحدة عبر الـ scaler و XGBoost و LSTM، حتى لا يدفع أول
+        طلب حقيقي ثمن التهيئة الأولى (lazy init داخل torch و xgboost).
+        """
         if self.lstm_model is None:
-            return {"error": "Model not loaded"}
-            
-        X_scaled = self.scaler.transform(df_input[self.features])
-        
-        # توقع XGBoost
-        dmatrix = xgb.DMatrix(pd.DataFrame(X_scaled, columns=self.features).tail(1))
-        xgb_return = self.xgb_model.predict(dmatrix)[0]
-
-        # توقع LSTM
-        X_seq = torch.tensor(X_scaled[-48:], dtype=torch.float32).unsqueeze(0).to(self.device)
-        with torch.no_grad():
-            lstm_logits = self.lstm_model(X_seq)
-            lstm_prob = torch.sigmoid(lstm_logits).item()
+            return False
+        result = self.predict(np.zeros((SEQ_LEN, len(FEATURES)), dtype=np.float32))
+        if "error" in result:
+            self.load_error = result["error"]
+            return False
+        self.ready = True
+        return True
+
+    def predict(self, window, key=None):
+        return self.predict_batch([window], keys=[key] if key is not None else None)[0]
+
+    def to_array(self, window) -> np.ndarray:
+        """نافذة واحدة → مصفوفة [SEQ_LEN, n_features] بترتيب self.features"""
+        if isinstance(window, pd.DataFrame):
+            return window[self.features].to_numpy(dtype=np.float32)[-SEQ_LEN:]
+        window = window[-SEQ_LEN:]
+        return window[:, self.feature_index] if self.feature_index is not None else window
+
+    def predict_batch(self, windows: list, keys: list = None):
+        """
+        توقع دفعة واحدة لعدة عملات: كل عنصر في windows مصفوفة float32 [SEQ_LEN, 14] بترتيب
+        FEATURES (من feature_pipeline.fetch_window_array) أو DataFrame فيه أعمدة الميزات.
+        نسخة واحدة فقط (np.stack)، ثم الـ scaler داخلها، و XGBoost و LSTM يقرآن منها مباشرة.
+
+        keys (اختياري): مفتاح لكل نافذة مثل (asset_id, timeframe_id). مع LSTM_STREAMING
+        تُستخدم حالة الـ LSTM المحفوظة لكل مفتاح فتكلّف الشمعة الجديدة خطوة واحدة فقط.
+        """
+        if self.lstm_model is None:
+            return [{"error": "Model not loaded"} for _ in windows]
+        if not windows:
+            return []
+
+        X = np.stack([self.to_array(w) for w in windows]).astype(np.float32, copy=False)
+        streaming = keys is not None and self.streaming and self.lstm_backend == "torch"
+        # الـ streaming يقارن النافذة الخام بالسابقة، فنحتفظ بنسخة قبل الـ scaler
+        X_raw = X.copy() if streaming else None
+
+        # 1. الـ scaler: x * scale + offset داخل نفس المصفوفة
+        apply_affine(X, self.scale, self.offset)
+
+        # 2. توقع XGBoost على آخر صف من كل نافذة (بدون DMatrix)
+        xgb_returns = self.xgb_model.inplace_predict(X[:, -1, :])
+
+        # 3. توقع LSTM: streaming لكل عملة، أو تمريرة واحدة كاملة على كل النوافذ
+        if self.lstm_backend == "numpy":
+            lstm_probs = 1.0 / (1.0 + np.exp(-self.lstm_model(X).astype(np.float64)))
+        else:
+            import torch
+
+            X_seq = torch.from_numpy(X).to(self.device)
+            if streaming:
+                logits = torch.tensor([self.stream_logit(k, raw, seq) for k, raw, seq in zip(keys, X_raw, X_seq)])
+                lstm_probs = torch.sigmoid(logits).numpy()
+            else:
+                with torch.no_grad():
+                    lstm_probs = torch.sigmoid(self.lstm_model(X_seq)).cpu().numpy()
 
         p_thr = self.thresholds.get("p_thr", 0.55)
-        trend = "Up" if lstm_prob >= p_thr else "Steady/Down"
-        
-        return {
-            "predicted_return": round(float(xgb_return), 6),
-            "trend": trend,
-            "confidence": f"{round(lstm_prob * 100)}%"
-        }
-
-inference_engine = InferenceService()
\ No newline at end of file
+        results = []
+        for xgb_return, lstm_prob in zip(xgb_returns, lstm_probs):
+            trend = "Up" if lstm_prob >= p_thr else "Steady/Down"
+            results.append({
+                "predicted_return": round(float(xgb_return), 6),
+                "trend": trend,
+                "confidence": f"{round(float(lstm_prob) * 100)}%",
+                "model_version": self.model_version
+            })
+        return results
+
+    def stream_logit(self, key, raw_window: np.ndarray, x_window) -> float:
+        """
+        مخرج الـ LSTM لنافذة واحدة عبر حالة الـ streaming المحفوظة للمفتاح:
+        - نفس النافذة: نعيد آخر مخرج بدون حساب
+        - شمعة (أو بضع شموع) جديدة فقط: خطوة واحدة لكل شمعة
+        - تغيّر صف قديم داخل النافذة (backfill / تصحيح) أو فجوة كبيرة: إعادة حساب كاملة
+        """
+        from app.services.lstm_service import stream_init, stream_step, find_shift
+
+        with self._stream_lock:
+            state = self.stream_states.get(key)
+            shift = find_shift(state.window, raw_window, MAX_STREAM_CATCH_UP) if state else None
+
+            if shift is None:
+                state = stream_init(self.lstm_base, x_window)
+                self.stream_stats["recomputes"] += 1
+            elif shift == 0:
+                self.stream_stats["reuses"] += 1
+            else:
+                stream_step(self.lstm_base, state, x_window[-shift:])
+                self.stream_stats["steps"] += shift
+                state.since_verify += shift
+
+            # تحقق دوري: مقارنة مخرج الـ streaming مع إعادة الحساب الكاملة
+            if self.stream_verify_every and state.since_verify >= self.stream_verify_every:
+                if not self.verify_stream(key, state, x_window):
+                    state = stream_init(self.lstm_base, x_window)
+
+            state.window = raw_window.copy()
+            self.stream_states[key] = state
+            self.stream_states.move_to_end(key)
+            while len(self.stream_states) > MAX_STREAM_STATES:
+                self.stream_states.popitem(last=False)
+            return float(state.logit[0])
+
+    def verify_stream(self, key, state, x_window) -> bool:
+        import torch
+
+        with torch.no_grad():
+            expected = float(self.lstm_base(x_window.unsqueeze(0))[0])
+        state.since_verify = 0
+        self.stream_stats["verifications"] += 1
+        if abs(expected - float(state.logit[0])) > 1e-4:
+            print(f"⚠️ LSTM stream mismatch for {key}: {float(state.logit[0])} != {expected}, recomputing")
+            self.stream_stats["mismatches"] += 1
+            return False
+        return True
+
+# ============================================================
+# ⏳ تحميل كسول: المحرك لا يُبنى عند الاستيراد، بل عند أول طلب أو عبر warm-up
+# 🔀 تبديل النسخة بدون توقف: النسخة الجديدة تُحمّل وتُسخّن في الخلفية، ثم يُستبدل
+# المرجع _engine بعملية إسناد واحدة. الطلبات الجارية تكمل بالمحرك الذي أخذته.
+# ============================================================
+_engine = None
+_engine_lock = threading.Lock()
+_warm_up_thread = None
+_swap_thread = None
+_failed_versions = set()
+
+
+def get_inference_engine() -> InferenceService:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = InferenceService(model_registry.get_active_version())
+    else:
+        check_for_new_version()
+    return _engine
+
+
+def check_for_new_version():
+    """إذا تغيّر مؤشر ACTIVE في الـ registry نبدأ تحميل النسخة الجديدة في الخلفية"""
+    global _swap_thread
+    try:
+        active = model_registry.get_active_version()
+    except Exception as e:
+        print(f"❌ Model registry error: {e}")
+        return
+    if active is None or active == _engine.model_version or active in _failed_versions:
+        return
+    with _engine_lock:
+        if _swap_thread is None or not _swap_thread.is_alive():
+            _swap_thread = threading.Thread(target=_load_and_swap, args=(active,),
+                                            name="inference-swap", daemon=True)
+            _swap_thread.start()
+
+
+def _load_and_swap(version_id: str):
+    global _engine
+    candidate = InferenceService(version_id)
+    if not candidate.warm_up():
+        # لا نعيد المحاولة مع نفس النسخة في كل طلب؛ المحرك القديم يستمر بالعمل
+        print(f"❌ Model version {version_id} failed to load, keeping {_engine.model_version}")
+        _failed_versions.add(version_id)
+        return
+    with _engine_lock:
+        previous = _engine.model_version if _engine else None
+        _engine = candidate
+    print(f"🔀 AI Engine switched from {previous} to {version_id}")
+
+
+def warm_up() -> bool:
+    """تحميل الموديلات (إن لم تكن محمّلة) ثم تمريرة وهمية — يُستدعى عند بدء التشغيل"""
+    engine = get_inference_engine()
+    return engine.ready or engine.warm_up()
+
+
+def start_warm_up():
+    """تشغيل warm_up في الخلفية مرة واحدة فقط، حتى لا يتأخر إقلاع الـ worker"""
+    global _warm_up_thread
+    with _engine_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=warm_up, name="inference-warm-up", daemon=True)
+            _warm_up_thread.start()
+
+
+def engine_status() -> dict:
+    """حالة المحرك لفحص الجاهزية (readiness) — لا يبني المحرك بنفسه"""
+    if _engine is None:
+        state = "loading" if _warm_up_thread is not None else "not_loaded"
+        return {"ready": False, "state": state}
+    swapping = _swap_thread is not None and _swap_thread.is_alive()
+    if _engine.ready:
+        return {"ready": True, "state": "ready", "model_version": _engine.model_version, "swapping": swapping,
+                "lstm_backend": _engine.lstm_backend, "lstm_serving_mode": _engine.serving_mode, "load_seconds": _engine.load_seconds,
+                "lstm_streaming": _engine.streaming, "stream_stats": dict(_engine.stream_stats)}
+    if _engine.load_error:
+        return {"ready": False, "state": "failed", "error": _engine.load_error, "swapping": swapping}
+    return {"ready": False, "state": "warming_up", "model_version": _engine.model_version}
@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from app.core.config import get_settings
+from app.db.session import SessionLocal
+from app.services import ingest_service
+from app.services.ingest_service import IngestProgress
+
+settings = get_settings()
+
+# عدد المهام المنتهية التي نحتفظ بحالتها للاستعلام (الأقدم يُحذف أولاً)
+MAX_TRACKED_JOBS = 100
+
+
+class IngestQueueFull(Exception):
+    """الطابور ممتلئ — يجب على العميل إعادة المحاولة لاحقاً"""
+
+
+_jobs: "OrderedDict[str, IngestProgress]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+# المهام المنتظرة + قيد التنفيذ لا تتجاوز INGEST_MAX_PENDING
+_slots = threading.BoundedSemaphore(settings.INGEST_MAX_PENDING)
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.INGEST_WORKERS, thread_name_prefix="ingest")
+        return _executor
+
+
+def _register(job: IngestProgress):
+    with _jobs_lock:
+        _jobs[job.job_id] = job
+        # نحذف أقدم المهام المنتهية فقط، المهام النشطة تبقى دائماً
+        finished = [k for k, j in _jobs.items() if j.state in ("completed", "failed")]
+        for key in finished[:max(0, len(_jobs) - MAX_TRACKED_JOBS)]:
+            del _jobs[key]
+
+
+def get_job(job_id: str) -> Optional[IngestProgress]:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def list_jobs() -> list:
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    return [job.as_dict() for job in reversed(jobs)]
+
+
+def queue_depth() -> int:
+    with _jobs_lock:
+        return sum(1 for j in _jobs.values() if j.state == "queued")
+
+
+def submit_upload(fileobj, filename: str, method: str = "copy", stream: bool = True,
+                  chunk_rows: Optional[int] = None, on_conflict: str = "update") -> IngestProgress:
+    """
+    📥 حفظ الملف المرفوع في ملف مؤقت ثم إرساله لطابور العمال في الخلفية.
+    يُرجع كائن التقدّم فوراً (رقم المهمة) بدون انتظار المعالجة.
+    """
+    if not _slots.acquire(blocking=False):
+        raise IngestQueueFull(f"Ingest queue is full ({settings.INGEST_MAX_PENDING} pending jobs)")
+
+    try:
+        # الـ UploadFile يُغلق بعد انتهاء الطلب، لذلك ننسخه لملف مؤقت يملكه العامل
+        suffix = os.path.splitext(filename or "")[1]
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, prefix="ingest_") as tmp:
+            shutil.copyfileobj(fileobj, tmp, length=1024 * 1024)
+            path = tmp.name
+
+        job = IngestProgress(uuid.uuid4().hex, total_bytes=os.path.getsize(path), filename=filename)
+        _register(job)
+        _get_executor().submit(_run_job, job, path, method, stream,
+                               chunk_rows or settings.INGEST_CHUNK_ROWS, on_conflict)
+        return job
+    except Exception:
+        _slots.release()
+        raise
+
+
+def _run_job(job: IngestProgress, path: str, method: str, stream: bool, chunk_rows: int, on_conflict: str):
+    db = SessionLocal()
+    job.start()
+    try:
+        tf = ingest_service.get_or_create_timeframe(db, "1h", "Hourly")
+
+        reader = ingest_service.DatasetReader(path)
+        if stream:
+            ingest_service.ingest_stream(db, reader, tf.timeframe_id, chunk_rows,
+                                         progress=job, on_conflict=on_conflict)
+            return
+
+        df = reader.read_all()
+        missing = [col for col in ingest_service.REQUIRED_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"Missing required columns: {missing}")
+
+        if method == "copy":
+            stats = ingest_service.ingest_dataframe(db, df, tf.timeframe_id, on_conflict)
+        else:
+            stats = ingest_service.ingest_dataframe_orm(db, df, tf.timeframe_id)
+        job.add_chunk(len(df), stats["candles"], stats["sentiments"], job.total_bytes)
+        job.finish()
+
+    except Exception as e:
+        db.rollback()
+        if job.state != "failed":
+            job.finish(error=str(e))
+        print(f"❌ Ingest job {job.job_id} failed: {e}")
+    finally:
+        db.close()
+        os.remove(path)
+        _slots.release()
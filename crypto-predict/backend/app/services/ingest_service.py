@@ -0,0 +1,508 @@
+import csv
+import io
+import time
+import threading
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.db import models
+from app.services.prediction_cache import prediction_cache
+from app.services.rollup_service import update_rollups
+from app.services.snapshot_service import update_snapshots
+from app.services.feature_store import update_features
+from app.services.partition_service import ensure_partitions_for
+
+# الأعمدة الأساسية في ملف dataset_ohlcv_with_market_sentiment
+REQUIRED_COLUMNS = ["open_time", "symbol", "open", "close", "avg_sentiment"]
+
+CANDLE_COLUMNS = ["asset_id", "timeframe_id", "timestamp", "open", "high", "low", "close", "volume", "exchange"]
+SENTIMENT_COLUMNS = [
+    "asset_id", "timeframe_id", "timestamp", "avg_sentiment", "sent_count", "pos_count", "neg_count",
+    "neu_count", "pos_ratio", "neg_ratio", "neu_ratio", "has_news",
+]
+INTEGER_SENTIMENT_COLUMNS = ["sent_count", "pos_count", "neg_count", "neu_count", "has_news"]
+
+# الأعمدة التي نقرؤها من الملف (column projection) — أي عمود آخر لا يتم فك ترميزه
+DATASET_COLUMNS = ["open_time", "symbol", "open", "high", "low", "close", "volume"] + SENTIMENT_COLUMNS[3:]
+
+# المفتاح الطبيعي المشترك لجدولي الشموع والمشاعر
+NATURAL_KEY = ["asset_id", "timeframe_id", "timestamp"]
+
+# سياسات التعامل مع الصفوف المكررة:
+# - error: COPY مباشر (الأسرع، يفشل إذا كان المفتاح موجوداً)
+# - ignore: ON CONFLICT DO NOTHING
+# - update: ON CONFLICT DO UPDATE (upsert) — لا يُعاد كتابة الصف إلا إذا تغيّرت قيمه
+CONFLICT_MODES = ("error", "ignore", "update")
+
+
+def get_or_create_timeframe(db: Session, code: str = "1h", description: str = "Hourly") -> models.Timeframe:
+    tf = db.query(models.Timeframe).filter(models.Timeframe.code == code).first()
+    if not tf:
+        tf = models.Timeframe(code=code, description=description)
+        db.add(tf)
+        db.commit()
+        db.refresh(tf)
+    return tf
+
+
+def resolve_asset_ids(db: Session, symbols: pd.Series) -> pd.Series:
+    """
+    تحويل عمود الرموز (Symbols) إلى asset_id عبر join على مستوى الأعمدة.
+    العملات غير الموجودة تُضاف دفعة واحدة بدلاً من commit لكل صف.
+    """
+    keys = symbols.astype(str).str.lower()
+
+    assets = pd.DataFrame(
+        db.query(models.CryptoAsset.symbol, models.CryptoAsset.asset_id).all(),
+        columns=["symbol", "asset_id"],
+    )
+    assets["key"] = assets["symbol"].str.lower()
+    assets = assets.drop_duplicates("key")
+
+    missing = sorted(set(keys.unique()) - set(assets["key"]))
+    if missing:
+        new_assets = [models.CryptoAsset(symbol=sym.upper(), name=sym.upper()) for sym in missing]
+        db.add_all(new_assets)
+        db.commit()
+        assets = pd.concat([
+            assets,
+            pd.DataFrame({"symbol": [a.symbol for a in new_assets],
+                          "asset_id": [a.asset_id for a in new_assets],
+                          "key": missing}),
+        ], ignore_index=True)
+
+    mapped = keys.to_frame("key").merge(assets[["key", "asset_id"]], on="key", how="left")
+    return pd.Series(mapped["asset_id"].to_numpy(), index=symbols.index, name="asset_id")
+
+
+def to_utc(open_time: pd.Series) -> pd.Series:
+    """أوقات الملف كـ UTC: القيم بدون timezone تُعتبر UTC، والقيم بإزاحة (+02:00) تُحوَّل إليه"""
+    return pd.to_datetime(open_time, utc=True)
+
+
+def build_candle_frame(df: pd.DataFrame, asset_ids: pd.Series, timeframe_id: int) -> pd.DataFrame:
+    candles = pd.DataFrame({
+        "asset_id": asset_ids,
+        "timeframe_id": timeframe_id,
+        "timestamp": to_utc(df["open_time"]),
+        "open": df["open"],
+        "high": df["high"],
+        "low": df["low"],
+        "close": df["close"],
+        "volume": df["volume"],
+        "exchange": "Binance",  # افتراضي
+    })
+    return candles[CANDLE_COLUMNS]
+
+
+def build_sentiment_frame(df: pd.DataFrame, asset_ids: pd.Series, timeframe_id: int) -> pd.DataFrame:
+    # بنضيف مشاعر فقط إذا كان في داتا (sent_count > 0)
+    mask = df["sent_count"].fillna(0) > 0
+    rows = df.loc[mask]
+    sentiments = pd.DataFrame({
+        "asset_id": asset_ids[mask],
+        "timeframe_id": timeframe_id,
+        "timestamp": to_utc(rows["open_time"]),
+    })
+    for col in SENTIMENT_COLUMNS[3:]:
+        # الأعمدة الاختيارية (neu_count, ratios, has_news) قد لا تكون موجودة بالملف
+        sentiments[col] = rows[col] if col in rows.columns else None
+    # COPY يرفض "5.0" في أعمدة integer، لذلك نحوّلها لـ Int64 (يدعم القيم الفارغة)
+    for col in INTEGER_SENTIMENT_COLUMNS:
+        sentiments[col] = pd.to_numeric(sentiments[col]).round().astype("Int64")
+    return sentiments[SENTIMENT_COLUMNS]
+
+
+def copy_frame(db: Session, frame: pd.DataFrame, table: str, columns: list) -> int:
+    """📤 تحميل DataFrame إلى جدول PostgreSQL عبر COPY FROM STDIN بصيغة CSV"""
+    if frame.empty:
+        return 0
+
+    buf = io.StringIO()
+    # الإزاحة (+0000) تُكتب صراحة: أعمدة timestamptz لا تعتمد على timezone الجلسة، وأعمدة timestamp تتجاهلها
+    frame.to_csv(buf, columns=columns, index=False, header=False, date_format="%Y-%m-%d %H:%M:%S%z")
+    buf.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cursor.close()
+    return len(frame)
+
+
+def merge_frame(db: Session, frame: pd.DataFrame, table: str, columns: list, on_conflict: str = "update") -> int:
+    """
+    🔁 تحميل DataFrame مع احترام المفتاح الطبيعي (asset_id, timeframe_id, timestamp).
+    يتم الـ COPY إلى جدول مؤقت ثم INSERT ... ON CONFLICT إلى الجدول الأصلي،
+    فتكون التكلفة متناسبة مع حجم البيانات الجديدة وليس حجم الجدول.
+    يُرجع عدد الصفوف التي أُضيفت أو تغيّرت فعلاً.
+    """
+    if on_conflict not in CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {CONFLICT_MODES}")
+    if on_conflict == "error":
+        return copy_frame(db, frame, table, columns)
+    if frame.empty:
+        return 0
+
+    staging = f"_stage_{table}"
+    col_list = ", ".join(columns)
+    key_list = ", ".join(NATURAL_KEY)
+
+    db.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+    db.execute(text(f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {col_list} FROM {table} WITH NO DATA"))
+    copy_frame(db, frame, staging, columns)
+
+    # DISTINCT ON: نفس المفتاح قد يتكرر داخل الملف نفسه، ونعتمد آخر ظهور له
+    insert_sql = (
+        f"INSERT INTO {table} ({col_list}) "
+        f"SELECT DISTINCT ON ({key_list}) {col_list} FROM {staging} "
+        f"ORDER BY {key_list}, ctid DESC "
+    )
+    if on_conflict == "ignore":
+        insert_sql += f"ON CONFLICT ({key_list}) DO NOTHING"
+    else:
+        updates = [c for c in columns if c not in NATURAL_KEY]
+        set_list = ", ".join(f"{c} = EXCLUDED.{c}" for c in updates)
+        current = ", ".join(f"{table}.{c}" for c in updates)
+        excluded = ", ".join(f"EXCLUDED.{c}" for c in updates)
+        insert_sql += (
+            f"ON CONFLICT ({key_list}) DO UPDATE SET {set_list} "
+            f"WHERE ({current}) IS DISTINCT FROM ({excluded})"
+        )
+
+    result = db.execute(text(insert_sql))
+    db.execute(text(f"DROP TABLE {staging}"))
+    return result.rowcount
+
+
+def invalidate_predictions(asset_ids: pd.Series):
+    """
+    الشمعة الأحدث تغيّر مفتاح الكاش تلقائياً، لكن التعديلات على صفوف قديمة
+    (backfill أو upsert) لا تغيّره، لذلك نمسح توقعات العملات المتأثرة بعد كل commit.
+    """
+    ids = pd.unique(asset_ids.dropna())
+    if len(ids):
+        prediction_cache.invalidate(int(a) for a in ids)
+
+
+def ingest_dataframe(db: Session, df: pd.DataFrame, timeframe_id: int, on_conflict: str = "update") -> dict:
+    """
+    محرك الإدخال العمودي: يبني إطارات الشموع والمشاعر بعمليات على الأعمدة
+    ثم يحمّلها عبر COPY في معاملة واحدة.
+    """
+    start = time.perf_counter()
+
+    asset_ids = resolve_asset_ids(db, df["symbol"])
+    candles = build_candle_frame(df, asset_ids, timeframe_id)
+    sentiments = build_sentiment_frame(df, asset_ids, timeframe_id)
+    # partitions الأشهر الجديدة تُنشأ قبل معاملة الإدخال (في معاملة مستقلة)
+    ensure_partitions_for(candles)
+
+    candles_count = merge_frame(db, candles, models.Candle.__tablename__, CANDLE_COLUMNS, on_conflict)
+    sentiments_count = merge_frame(db, sentiments, models.Sentiment.__tablename__, SENTIMENT_COLUMNS, on_conflict)
+    # الفترات الأعلى (4h, 1d, 1w) للـ buckets المتأثرة فقط، وملخص آخر سعر، ومخزن الميزات، في نفس المعاملة
+    update_rollups(db, candles)
+    update_snapshots(db, candles)
+    update_features(db, candles)
+    db.commit()
+    invalidate_predictions(asset_ids)
+
+    # السرعة تُحسب على صفوف الملف المُعالجة، لأن الـ upsert قد لا يكتب الصفوف غير المتغيرة
+    elapsed = time.perf_counter() - start
+    processed = len(df)
+    return {
+        "candles": candles_count,
+        "sentiments": sentiments_count,
+        "rows_processed": processed,
+        "elapsed_sec": round(elapsed, 3),
+        "rows_per_sec": round(processed / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def ingest_sentiments(db: Session, sentiments: pd.DataFrame, on_conflict: str = "update") -> int:
+    """
+    إدخال مشاعر فقط (import_sentiment.py) لشموع موجودة مسبقاً، بدون commit.
+    الـ rollups ومخزن الميزات تُحدَّث من إطار المشاعر نفسه: لا توجد شموع جديدة تقودها كما في
+    ingest_dataframe، وبدونها تبقى أصفار SENTIMENT_FILL في المخزن للساعات التي وصلتها مشاعر متأخرة.
+    """
+    # لا يوجد partition افتراضي: شهر بدون شموع بعد يحتاج partition قبل معاملة الإدخال
+    ensure_partitions_for(sentiments)
+    written = merge_frame(db, sentiments, models.Sentiment.__tablename__, SENTIMENT_COLUMNS, on_conflict)
+    update_rollups(db, sentiments)
+    update_features(db, sentiments)
+    return written
+
+
+def ingest_dataframe_orm(db: Session, df: pd.DataFrame, timeframe_id: int) -> dict:
+    """
+    المسار القديم (صف بصف عبر الـ ORM) — نبقيه فقط للمقارنة مع محرك COPY.
+    """
+    start = time.perf_counter()
+
+    asset_ids = resolve_asset_ids(db, df["symbol"])
+    candles = build_candle_frame(df, asset_ids, timeframe_id)
+    sentiments = build_sentiment_frame(df, asset_ids, timeframe_id)
+    ensure_partitions_for(candles)
+
+    candles_to_add = [row._asdict() for row in candles.itertuples(index=False)]
+    sentiments_to_add = [row._asdict() for row in sentiments.astype(object).where(sentiments.notna(), None).itertuples(index=False)]
+    db.bulk_insert_mappings(models.Candle, candles_to_add)
+    db.bulk_insert_mappings(models.Sentiment, sentiments_to_add)
+    update_rollups(db, candles)
+    update_snapshots(db, candles)
+    update_features(db, candles)
+    db.commit()
+    invalidate_predictions(asset_ids)
+
+    elapsed = time.perf_counter() - start
+    total = len(candles_to_add) + len(sentiments_to_add)
+    return {
+        "candles": len(candles_to_add),
+        "sentiments": len(sentiments_to_add),
+        "elapsed_sec": round(elapsed, 3),
+        "rows_per_sec": round(total / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+# ============================================================
+# 🌊 وضع الـ Streaming: دفعات بحجم ثابت مع commit لكل دفعة
+# ============================================================
+
+class IngestProgress:
+    """عدّاد تقدّم عملية رفع واحدة، يمكن الاستعلام عنه أثناء التنفيذ"""
+
+    def __init__(self, job_id: str, total_bytes: Optional[int] = None, filename: Optional[str] = None):
+        self.job_id = job_id
+        self.filename = filename
+        self.state = "queued"
+        self.total_bytes = total_bytes
+        self.total_rows = None
+        self.bytes_read = 0
+        self.chunks = 0
+        self.rows_read = 0
+        self.candles = 0
+        self.sentiments = 0
+        self.error = None
+        self.queued_at = datetime.now(timezone.utc)
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.state = "running"
+            self.started_at = datetime.now(timezone.utc)
+
+    def add_chunk(self, rows: int, candles: int, sentiments: int, bytes_read: Optional[int]):
+        with self._lock:
+            self.chunks += 1
+            self.rows_read += rows
+            self.candles += candles
+            self.sentiments += sentiments
+            if bytes_read is not None:
+                self.bytes_read = bytes_read
+
+    def finish(self, error: Optional[str] = None):
+        with self._lock:
+            self.state = "failed" if error else "completed"
+            self.error = error
+            self.finished_at = datetime.now(timezone.utc)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            now = datetime.now(timezone.utc)
+            elapsed = ((self.finished_at or now) - self.started_at).total_seconds() if self.started_at else 0.0
+            waited = ((self.started_at or now) - self.queued_at).total_seconds()
+            percent = None
+            if self.total_rows:
+                percent = round(min(self.rows_read / self.total_rows, 1.0) * 100, 1)
+            elif self.total_bytes:
+                percent = round(min(self.bytes_read / self.total_bytes, 1.0) * 100, 1)
+            return {
+                "job_id": self.job_id,
+                "filename": self.filename,
+                "state": self.state,
+                "chunks": self.chunks,
+                "rows_read": self.rows_read,
+                "candles": self.candles,
+                "sentiments": self.sentiments,
+                "bytes_read": self.bytes_read,
+                "total_bytes": self.total_bytes,
+                "total_rows": self.total_rows,
+                "percent": percent,
+                "queued_at": self.queued_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "wait_sec": round(waited, 3),
+                "elapsed_sec": round(elapsed, 3),
+                "rows_per_sec": round(self.rows_read / elapsed, 1) if elapsed > 0 else None,
+                "error": self.error,
+            }
+
+
+# ============================================================
+# 📂 صيغ الملفات: Parquet و Arrow IPC و CSV
+# ============================================================
+
+def detect_format(path: str) -> str:
+    """تحديد صيغة الملف من الـ magic bytes بدلاً من الامتداد"""
+    with open(path, "rb") as f:
+        head = f.read(8)
+    if head[:4] == b"PAR1":
+        return "parquet"
+    if head[:6] == b"ARROW1":
+        return "arrow"
+    if head[:4] == b"\xff\xff\xff\xff":
+        return "arrow_stream"
+    return "csv"
+
+
+class DatasetReader:
+    """
+    قارئ موحّد لملفات الرفع. يفك ترميز أعمدة DATASET_COLUMNS فقط،
+    ويقرأ CSV عبر محلل pyarrow متعدد الخيوط.
+    """
+
+    CSV_BLOCK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, path: str, columns: Optional[list] = None):
+        self.path = path
+        self.format = detect_format(path)
+        self.total_rows = None
+        self._file = None
+
+        if self.format == "parquet":
+            meta = pq.ParquetFile(path)
+            names = meta.schema_arrow.names
+            self.total_rows = meta.metadata.num_rows
+        elif self.format == "arrow":
+            reader = pa.ipc.open_file(pa.memory_map(path))
+            names = reader.schema.names
+            self.total_rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        elif self.format == "arrow_stream":
+            names = pa.ipc.open_stream(pa.memory_map(path)).schema.names
+        else:
+            # csv.reader وليس split(","): ملفات الجداول تضع أسماء الأعمدة بين علامات تنصيص
+            with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                names = [c.strip() for c in next(csv.reader(f), [])]
+
+        self.columns = [c for c in (columns or DATASET_COLUMNS) if c in names]
+
+    def bytes_read(self) -> Optional[int]:
+        try:
+            return self._file.tell() if self._file else None
+        except (ValueError, OSError):
+            return None
+
+    def _csv_options(self):
+        read_options = pacsv.ReadOptions(use_threads=True, block_size=self.CSV_BLOCK_SIZE)
+        convert_options = pacsv.ConvertOptions(include_columns=self.columns)
+        return read_options, convert_options
+
+    def _record_batches(self) -> Iterator[pa.RecordBatch]:
+        if self.format == "parquet":
+            yield from pq.ParquetFile(self.path).iter_batches(columns=self.columns)
+        elif self.format == "arrow":
+            reader = pa.ipc.open_file(pa.memory_map(self.path))
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i).select(self.columns)
+        elif self.format == "arrow_stream":
+            for batch in pa.ipc.open_stream(pa.memory_map(self.path)):
+                yield batch.select(self.columns)
+        else:
+            read_options, convert_options = self._csv_options()
+            with open(self.path, "rb") as f:
+                self._file = f
+                yield from pacsv.open_csv(f, read_options=read_options, convert_options=convert_options)
+            self._file = None
+
+    def iter_batches(self, chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """إرجاع الملف على دفعات بحجم chunk_rows بغض النظر عن حجم الـ record batches"""
+        pending, pending_rows = [], 0
+        for batch in self._record_batches():
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows < chunk_rows:
+                continue
+            table = pa.Table.from_batches(pending)
+            offset = 0
+            while pending_rows - offset >= chunk_rows:
+                yield table.slice(offset, chunk_rows).to_pandas()
+                offset += chunk_rows
+            rest = table.slice(offset)
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+        if pending_rows:
+            yield pa.Table.from_batches(pending).to_pandas()
+
+    def read_all(self) -> pd.DataFrame:
+        if self.format == "parquet":
+            table = pq.read_table(self.path, columns=self.columns)
+        elif self.format == "arrow":
+            table = pa.ipc.open_file(pa.memory_map(self.path)).read_all().select(self.columns)
+        elif self.format == "arrow_stream":
+            table = pa.ipc.open_stream(pa.memory_map(self.path)).read_all().select(self.columns)
+        else:
+            read_options, convert_options = self._csv_options()
+            table = pacsv.read_csv(self.path, read_options=read_options, convert_options=convert_options)
+        return table.to_pandas()
+
+
+def ingest_stream(db: Session, reader: DatasetReader, timeframe_id: int, chunk_rows: int,
+                  progress: Optional[IngestProgress] = None, on_conflict: str = "update") -> dict:
+    """
+    قراءة الملف على دفعات بحجم ثابت (chunk_rows) وتحميل كل دفعة عبر COPY
+    مع commit مستقل، فتبقى الذاكرة ثابتة مهما كان حجم الملف.
+    """
+    if progress:
+        progress.total_rows = reader.total_rows
+    start = time.perf_counter()
+    candles_total = 0
+    sentiments_total = 0
+    processed = 0
+
+    try:
+        for chunk in reader.iter_batches(chunk_rows):
+            missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+            if missing:
+                raise ValueError(f"Missing required columns: {missing}")
+
+            asset_ids = resolve_asset_ids(db, chunk["symbol"])
+            candle_frame = build_candle_frame(chunk, asset_ids, timeframe_id)
+            ensure_partitions_for(candle_frame)
+            candles = merge_frame(db, candle_frame, models.Candle.__tablename__, CANDLE_COLUMNS, on_conflict)
+            sentiments = merge_frame(db, build_sentiment_frame(chunk, asset_ids, timeframe_id),
+                                     models.Sentiment.__tablename__, SENTIMENT_COLUMNS, on_conflict)
+            update_rollups(db, candle_frame)
+            update_snapshots(db, candle_frame)
+            update_features(db, candle_frame)
+            db.commit()
+            invalidate_predictions(asset_ids)
+
+            candles_total += candles
+            sentiments_total += sentiments
+            processed += len(chunk)
+            if progress:
+                progress.add_chunk(len(chunk), candles, sentiments, reader.bytes_read())
+    except Exception as e:
+        db.rollback()
+        if progress:
+            progress.finish(error=str(e))
+        raise
+
+    if progress:
+        progress.finish()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "candles": candles_total,
+        "sentiments": sentiments_total,
+        "rows_processed": processed,
+        "elapsed_sec": round(elapsed, 3),
+        "rows_per_sec": round(processed / elapsed, 1) if elapsed > 0 else None,
+    }
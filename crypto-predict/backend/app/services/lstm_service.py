@@ -0,0 +1,120 @@
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+class LSTMClassifier(nn.Module):
+    """الهيكل المصحح ليتطابق مع أوزان الملف المحفوظ (head.3.weight)"""
+
+    def __init__(self, n_features, hidden_size=64, num_layers=2):
+        super().__init__()
+        self.lstm = nn.LSTM(input_size=n_features, hidden_size=hidden_size, num_layers=num_layers, batch_first=True)
+        self.head = nn.Sequential(
+            nn.Linear(hidden_size, 64),
+            nn.ReLU(),
+            nn.Dropout(0.2),
+            nn.Linear(64, 1)
+        )
+
+    def forward(self, x):
+        out, _ = self.lstm(x)
+        return self.head(out[:, -1, :]).squeeze(-1)
+
+
+def load_lstm(path: str, n_features: int, device=None) -> LSTMClassifier:
+    device = device or torch.device("cpu")
+    model = LSTMClassifier(n_features=n_features)
+    model.load_state_dict(torch.load(path, map_location=device))
+    model.to(device)
+    model.eval()
+    return model
+
+
+# ============================================================
+# ⚡ وضع التقديم (Serving) المحسّن على الـ CPU
+# ============================================================
+SERVING_MODES = ("eager", "script", "quantized")
+
+
+def configure_threads(num_threads: int):
+    """
+    تثبيت عدد خيوط intra-op لكل worker. الافتراضي في torch = عدد الأنوية، ومع عدة
+    workers أو طلبات متزامنة تتزاحم الخيوط على نفس الأنوية (oversubscription).
+    0 = ترك إعداد torch الافتراضي.
+    """
+    if num_threads and num_threads > 0:
+        torch.set_num_threads(num_threads)
+
+
+def optimize_for_serving(model: LSTMClassifier, mode: str = "script"):
+    """
+    - eager: الموديل كما هو
+    - script: TorchScript + freeze (نفس الأوزان fp32، نتائج مطابقة)
+    - quantized: تكميم ديناميكي int8 لطبقات LSTM و Linear ثم TorchScript
+      (أصغر حجماً لكن بدقة أقل قليلاً — راجع tests/test_lstm_serving.py)
+    """
+    if mode not in SERVING_MODES:
+        raise ValueError(f"LSTM serving mode must be one of {SERVING_MODES}")
+    if mode == "eager":
+        return model
+    if mode == "quantized":
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+    return torch.jit.freeze(torch.jit.script(model.eval()))
+
+
+# ============================================================
+# 🌊 وضع الـ Streaming: كل شمعة جديدة = خطوة LSTM واحدة
+# ============================================================
+# الموديل تدرّب على نوافذ من SEQ_LEN خطوة تبدأ كل منها من حالة صفرية، فلا يكفي
+# حمل (h, c) واحدة عبر التاريخ كله. بدلاً من ذلك نحتفظ بـ SEQ_LEN مساراً (lanes)
+# متدرّجة داخل نفس الـ tensor: المسار (t % SEQ_LEN) يُصفَّر قبل الخطوة t، وبعدها
+# يكون المسار ((t + 1) % SEQ_LEN) قد استهلك آخر SEQ_LEN صف بالضبط، فنقرأ مخرجه.
+# كل شمعة = تمريرة واحدة بطول 1 على دفعة من SEQ_LEN مسار، بدلاً من 48 خطوة متتالية.
+
+class LSTMStreamState:
+    def __init__(self, model: LSTMClassifier, seq_len: int):
+        lstm = model.lstm
+        shape = (lstm.num_layers, seq_len, lstm.hidden_size)
+        self.seq_len = seq_len
+        self.h = torch.zeros(shape)
+        self.c = torch.zeros(shape)
+        self.steps = 0
+        self.logit = None
+        # نقطة تحقق صغيرة: آخر نافذة خام استُهلكت (SEQ_LEN × n_features)
+        self.window = None
+        self.since_verify = 0
+
+
+def stream_step(model: LSTMClassifier, state: LSTMStreamState, x_rows: torch.Tensor) -> float:
+    """تقديم الحالة بعدد الصفوف الجديدة فقط (x_rows: [k, n_features] بعد الـ scaler)"""
+    with torch.no_grad():
+        for x in x_rows:
+            lane = state.steps % state.seq_len
+            state.h[:, lane].zero_()
+            state.c[:, lane].zero_()
+            out, (state.h, state.c) = model.lstm(x.expand(state.seq_len, 1, -1), (state.h, state.c))
+            state.steps += 1
+            ready_lane = state.steps % state.seq_len
+            state.logit = model.head(out[ready_lane:ready_lane + 1, -1, :]).squeeze(-1)
+    return float(state.logit[0])
+
+
+def stream_init(model: LSTMClassifier, x_window: torch.Tensor) -> LSTMStreamState:
+    """إعادة الحساب الكاملة: بناء المسارات من نافذة كاملة (SEQ_LEN خطوة)"""
+    state = LSTMStreamState(model, x_window.shape[0])
+    stream_step(model, state, x_window)
+    return state
+
+
+def find_shift(old_window, new_window, max_shift: int):
+    """
+    كم صفاً جديداً أُضيف منذ نقطة التحقق؟ None إذا تغيّرت صفوف قديمة داخل النافذة
+    (backfill أو تصحيح) أو إذا كانت الفجوة أكبر من max_shift — عندها نعيد الحساب كاملاً.
+    """
+    if old_window is None or old_window.shape != new_window.shape:
+        return None
+    seq_len = len(new_window)
+    for shift in range(min(max_shift, seq_len - 1) + 1):
+        if np.array_equal(old_window[shift:], new_window[:seq_len - shift]):
+            return shift
+    return None
@@ -0,0 +1,228 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+from app.core.config import get_settings
+
+settings = get_settings()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEGACY_MODEL_DIR = os.path.join(BASE_DIR, "ml_models")
+REGISTRY_DIR = settings.MODEL_REGISTRY_DIR or os.path.join(LEGACY_MODEL_DIR, "registry")
+VERSIONS_DIR = os.path.join(REGISTRY_DIR, "versions")
+ACTIVE_FILE = os.path.join(REGISTRY_DIR, "ACTIVE")
+HISTORY_FILE = os.path.join(REGISTRY_DIR, "activations.log")
+
+# الملفات المطلوبة في كل نسخة، والاختيارية (تُنسخ إن وجدت)
+REQUIRED_ARTIFACTS = ["features.json", "thresholds.json", "scaler.pkl", "xgb_model.json", "lstm_model.pt"]
+OPTIONAL_ARTIFACTS = ["lstm_model.npz", "lstm_config.json"]
+MANIFEST = "manifest.json"
+
+
+class ModelRegistryError(Exception):
+    """نسخة غير موجودة، ناقصة، أو لا تطابق الـ checksums في الـ manifest"""
+
+
+_lock = threading.Lock()
+_active_cache = {}
+
+
+@contextmanager
+def _registry_lock():
+    """قفل على مستوى الملفات: عمليات المحرك وعمليات الـ API قد تعدّل الـ registry معاً"""
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    with _lock, open(os.path.join(REGISTRY_DIR, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: str, content: str):
+    """كتابة ملف صغير ثم os.replace: القارئ يرى النسخة القديمة أو الجديدة كاملة، لا شيء بينهما"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def version_dir(version_id: str) -> str:
+    return os.path.join(VERSIONS_DIR, version_id)
+
+
+def read_manifest(version_id: str) -> dict:
+    path = os.path.join(version_dir(version_id), MANIFEST)
+    if not os.path.exists(path):
+        raise ModelRegistryError(f"Model version '{version_id}' not found")
+    with open(path) as f:
+        return json.load(f)
+
+
+def verify_version(version_id: str) -> dict:
+    """التحقق من وجود كل ملفات النسخة ومطابقة الـ sha256 قبل تحميلها"""
+    manifest = read_manifest(version_id)
+    for name, meta in manifest["files"].items():
+        path = os.path.join(version_dir(version_id), name)
+        if not os.path.exists(path):
+            raise ModelRegistryError(f"Model version '{version_id}' is missing {name}")
+        if _sha256(path) != meta["sha256"]:
+            raise ModelRegistryError(f"Checksum mismatch for {name} in model version '{version_id}'")
+    return manifest
+
+
+# ============================================================
+# 📦 نشر نسخة جديدة (immutable)
+# ============================================================
+
+def publish_version(files: dict, source: str, parent: Optional[str] = None,
+                    metrics: Optional[dict] = None, activate: bool = False) -> str:
+    """
+    نسخ ملفات الموديل إلى مجلد نسخة جديد مع manifest و checksums.
+    files: {اسم الملف: المسار الحالي}. النسخة تُبنى في مجلد مؤقت ثم تُنقل بـ rename
+    واحد، فلا تظهر نسخة ناقصة أبداً. الملفات تصبح للقراءة فقط بعد النشر.
+    """
+    missing = [name for name in REQUIRED_ARTIFACTS if name not in files]
+    if missing:
+        raise ModelRegistryError(f"Cannot publish model version, missing artifacts: {missing}")
+
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=VERSIONS_DIR, prefix=".staging-")
+    try:
+        checksums = {}
+        for name, src in files.items():
+            dst = os.path.join(staging, name)
+            shutil.copyfile(src, dst)
+            checksums[name] = {"sha256": _sha256(dst), "size": os.path.getsize(dst)}
+
+        created_at = datetime.now(timezone.utc)
+        combined = hashlib.sha256("".join(checksums[n]["sha256"] for n in sorted(checksums)).encode()).hexdigest()
+        # الطول ≤ 20 حرفاً ليتسع في prediction.model_used
+        version_id = f"{created_at:%Y%m%d%H%M%S}-{combined[:5]}"
+
+        manifest = {
+            "version": version_id,
+            "created_at": created_at.isoformat(),
+            "source": source,
+            "parent": parent,
+            "metrics": metrics or {},
+            "files": checksums,
+        }
+        with open(os.path.join(staging, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        for name in os.listdir(staging):
+            os.chmod(os.path.join(staging, name), 0o444)
+        os.rename(staging, version_dir(version_id))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    print(f"📦 Model version {version_id} published ({source})")
+    if activate:
+        _activate(version_id)
+    return version_id
+
+
+def bootstrap_from_legacy() -> Optional[str]:
+    """أول تشغيل: تحويل الملفات الثابتة في app/ml_models إلى أول نسخة في الـ registry"""
+    files = {name: os.path.join(LEGACY_MODEL_DIR, name)
+             for name in REQUIRED_ARTIFACTS + OPTIONAL_ARTIFACTS
+             if os.path.exists(os.path.join(LEGACY_MODEL_DIR, name))}
+    if any(name not in files for name in REQUIRED_ARTIFACTS):
+        return None
+    return publish_version(files, source="bootstrap", activate=True)
+
+
+# ============================================================
+# 🔀 النسخة الفعالة + الـ rollback
+# ============================================================
+
+def get_active_version() -> Optional[str]:
+    """
+    قراءة مؤشر ACTIVE (مع كاش حسب وقت التعديل، فالاستدعاء لكل طلب رخيص).
+    إذا كان الـ registry فارغاً نحاول إنشاءه من الملفات القديمة.
+    """
+    try:
+        mtime = os.stat(ACTIVE_FILE).st_mtime_ns
+    except FileNotFoundError:
+        with _registry_lock():
+            if not os.path.exists(ACTIVE_FILE) and bootstrap_from_legacy() is None:
+                return None
+        mtime = os.stat(ACTIVE_FILE).st_mtime_ns
+
+    if _active_cache.get("mtime") != mtime:
+        with open(ACTIVE_FILE) as f:
+            _active_cache.update(mtime=mtime, version=f.read().strip())
+    return _active_cache["version"]
+
+
+def _activate(version_id: str):
+    _write_atomic(ACTIVE_FILE, version_id + "\n")
+    with open(HISTORY_FILE, "a") as f:
+        f.write(f"{datetime.now(timezone.utc).isoformat()} {version_id}\n")
+    print(f"🔀 Active model version is now {version_id}")
+
+
+def set_active(version_id: str) -> dict:
+    """تبديل ذري للنسخة الفعالة (بعد التحقق من الـ checksums). عمليات المحرك تلتقطها تلقائياً"""
+    manifest = verify_version(version_id)
+    with _registry_lock():
+        _activate(version_id)
+    return manifest
+
+
+def activation_history() -> list:
+    if not os.path.exists(HISTORY_FILE):
+        return []
+    with open(HISTORY_FILE) as f:
+        return [line.split()[1] for line in f if line.strip()]
+
+
+def rollback() -> str:
+    """الرجوع للنسخة التي كانت فعالة قبل الحالية"""
+    current = get_active_version()
+    for version_id in reversed(activation_history()):
+        if version_id != current and os.path.isdir(version_dir(version_id)):
+            set_active(version_id)
+            return version_id
+    raise ModelRegistryError("No previous model version to roll back to")
+
+
+def list_versions() -> list:
+    if not os.path.isdir(VERSIONS_DIR):
+        return []
+    active = get_active_version()
+    versions = []
+    for name in sorted(os.listdir(VERSIONS_DIR), reverse=True):
+        if name.startswith("."):
+            continue
+        try:
+            manifest = read_manifest(name)
+        except (ModelRegistryError, ValueError):
+            continue
+        versions.append({
+            "version": manifest["version"],
+            "created_at": manifest["created_at"],
+            "source": manifest["source"],
+            "parent": manifest.get("parent"),
+            "metrics": manifest.get("metrics", {}),
+            "active": manifest["version"] == active,
+        })
+    return versions
@@ -0,0 +1,75 @@
+import numpy as np
+
+# ============================================================
+# 🧮 LSTM + MLP head بـ NumPy فقط (بدون torch)
+# نفس معادلات nn.LSTM: ترتيب البوابات في الأوزان هو (i, f, g, o)
+# ============================================================
+
+
+def _sigmoid(x):
+    # صيغة tanh مستقرة عددياً (لا overflow في exp مع float32)
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+class NumpyLSTMClassifier:
+    def __init__(self, weights: dict, dtype=np.float32):
+        self.dtype = dtype
+        self.num_layers = sum(1 for k in weights if k.startswith("lstm.weight_ih_l"))
+        self.hidden_size = weights["lstm.weight_hh_l0"].shape[1]
+        self.layers = []
+        for layer in range(self.num_layers):
+            # نحفظ المصفوفات مُدوّرة مسبقاً حتى يكون كل ضرب x @ W مباشرة
+            self.layers.append((
+                np.ascontiguousarray(weights[f"lstm.weight_ih_l{layer}"].T, dtype=dtype),
+                np.ascontiguousarray(weights[f"lstm.weight_hh_l{layer}"].T, dtype=dtype),
+                (weights[f"lstm.bias_ih_l{layer}"] + weights[f"lstm.bias_hh_l{layer}"]).astype(dtype),
+            ))
+        self.head_w1 = np.ascontiguousarray(weights["head.0.weight"].T, dtype=dtype)
+        self.head_b1 = weights["head.0.bias"].astype(dtype)
+        self.head_w2 = np.ascontiguousarray(weights["head.3.weight"].T, dtype=dtype)
+        self.head_b2 = weights["head.3.bias"].astype(dtype)
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        """x: [batch, seq_len, n_features] → logits: [batch]"""
+        seq = np.asarray(x, dtype=self.dtype)
+        batch, seq_len, _ = seq.shape
+        H = self.hidden_size
+
+        for W_ih, W_hh, bias in self.layers:
+            # إسقاط المدخلات لكل الخطوات دفعة واحدة، ويبقى في الحلقة ضرب h @ W_hh فقط
+            gates_x = seq @ W_ih + bias
+            h = np.zeros((batch, H), dtype=self.dtype)
+            c = np.zeros((batch, H), dtype=self.dtype)
+            outputs = np.empty((batch, seq_len, H), dtype=self.dtype)
+            for t in range(seq_len):
+                gates = gates_x[:, t] + h @ W_hh
+                i = _sigmoid(gates[:, :H])
+                f = _sigmoid(gates[:, H:2 * H])
+                g = np.tanh(gates[:, 2 * H:3 * H])
+                o = _sigmoid(gates[:, 3 * H:])
+                c = f * c + i * g
+                h = o * np.tanh(c)
+                outputs[:, t] = h
+            seq = outputs
+
+        # الـ head: Linear → ReLU → (Dropout لا يعمل في eval) → Linear
+        hidden = np.maximum(seq[:, -1] @ self.head_w1 + self.head_b1, 0)
+        return (hidden @ self.head_w2 + self.head_b2)[:, 0]
+
+
+def load_weights(path: str) -> dict:
+    """
+    قراءة الأوزان من ملف .npz (بدون torch) أو من lstm_model.pt مباشرة
+    (يحتاج torch، لذلك يُفضَّل تصديرها مرة واحدة عبر scripts/export_lstm_npz.py)
+    """
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+
+    import torch
+    state_dict = torch.load(path, map_location="cpu")
+    return {name: tensor.detach().cpu().numpy() for name, tensor in state_dict.items()}
+
+
+def load_numpy_lstm(path: str) -> NumpyLSTMClassifier:
+    return NumpyLSTMClassifier(load_weights(path))
@@ -0,0 +1,74 @@
+import base64
+import json
+from datetime import datetime
+from typing import Callable, Optional
+from sqlalchemy import tuple_
+from app.db.session import AsyncSessionLocal
+
+# ============================================================
+# 📑 التصفح بالمؤشر (keyset) والتصدير المتدفق
+# كل صفحة تبدأ من آخر مفتاح في الصفحة السابقة (WHERE key < cursor ORDER BY key DESC LIMIT n)،
+# فتكلفة الصفحة الألف مثل الأولى: قراءة n صف من الفهرس، بدون OFFSET يتخطى ما قبلها.
+# المؤشر نص معتم (base64) للعميل؛ محتواه قيم المفاتيح فقط.
+# ============================================================
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_BATCH_ROWS = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values) -> str:
+    payload = [{"ts": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values = [datetime.fromisoformat(v["ts"]) if isinstance(v, dict) else v for v in payload]
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if len(values) != size or not all(isinstance(v, (datetime, int)) for v in values):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def keyset(stmt, keys: list, cursor: Optional[str], limit: int):
+    """
+    الصفحة التالية من stmt مرتبة تنازلياً على keys (آخر مفتاح يكسر التعادل، مثل id).
+    يُطلب limit + 1 صف لمعرفة وجود صفحة بعدها بدون COUNT.
+    """
+    if cursor:
+        stmt = stmt.where(tuple_(*keys) < tuple_(*decode_cursor(cursor, len(keys))))
+    return stmt.order_by(*[key.desc() for key in keys]).limit(limit + 1)
+
+
+def page(rows: list, limit: int, key_of: Callable, to_item: Callable) -> dict:
+    """{"items": [...], "next_cursor": مؤشر الصفحة التالية أو None في آخر صفحة}"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": [to_item(row) for row in rows],
+        "next_cursor": encode_cursor(key_of(rows[-1])) if has_more else None,
+    }
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return float(value)
+
+
+async def stream_ndjson(stmt, to_item: Callable):
+    """
+    تصدير NDJSON (سطر JSON لكل صف) عبر server-side cursor: الذاكرة ثابتة مهما كان عدد الصفوف.
+    جلسة خاصة بالتدفق: الرد يستمر بعد انتهاء دالة المسار (وجلستها).
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_BATCH_ROWS))
+        async for rows in result.partitions():
+            yield "".join(json.dumps(to_item(row), default=_json_default) + "\n" for row in rows)
@@ -0,0 +1,121 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from app.core.config import get_settings
+from app.db.row_counts import COUNTED_TABLES, drop_partition_triggers_sql, partition_triggers_sql
+from app.db.session import engine
+
+# ============================================================
+# 🗂️ الـ partitions الشهرية للشموع والمشاعر ومخزن الميزات (PARTITION BY RANGE (timestamp))
+# كل شهر جدول مستقل بفهارسه: الاستعلامات المرتبة تنازلياً مع LIMIT تقرأ آخر شهر فقط،
+# والأشهر القديمة لا تتغير فيبقى الـ visibility map كاملاً (Index Only Scan بدون زيارة الجدول).
+# لا يوجد partition افتراضي (DEFAULT): وجوده يمنع PostgreSQL من قراءة الأشهر بالترتيب
+# (ordered Append) فيفتح كل الأشهر لكل استعلام. لذلك كل مسار كتابة يضمن شهره أولاً.
+# ============================================================
+
+settings = get_settings()
+
+PARTITIONED_TABLES = ["candle_ohlcv", "sentiments", "feature_store"]
+# الـ rollup الأسبوعي يبدأ يوم الاثنين: قد يقع في الشهر السابق لأول ساعة في البيانات
+ROLLUP_LOOKBACK = timedelta(days=7)
+
+_known = set()
+_lock = threading.Lock()
+
+
+def month_start(ts: datetime) -> datetime:
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def next_month(month: datetime) -> datetime:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_y{month:%Y}m{month:%m}"
+
+
+def _months(start: datetime, end: datetime) -> list:
+    months, month = [], month_start(start)
+    while month <= month_start(end):
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def _create_partition(conn, table: str, month: datetime) -> str:
+    """
+    الجدول يُنشأ مستقلاً ثم يُضاف بـ ATTACH PARTITION: يقفل الجدول الأب بـ SHARE UPDATE EXCLUSIVE
+    فقط، فالقراءة والكتابة على الأشهر الأخرى تستمر (CREATE TABLE ... PARTITION OF يحتاج ACCESS EXCLUSIVE).
+    """
+    name = partition_name(table, month)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(text(
+        f"ALTER TABLE {table} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{next_month(month):%Y-%m-%d} 00:00:00+00')"
+    ))
+    if table in COUNTED_TABLES:
+        # الجمل المباشرة على الشهر (TRUNCATE لشهر واحد مثلاً) تبقى في عداد الجدول الأب
+        conn.execute(text(partition_triggers_sql(table, name)))
+    return name
+
+
+def detach_partition(conn, table: str, month: datetime) -> int:
+    """
+    فصل partition شهر عن جدوله (بدون commit — في معاملة المستدعي). DETACH لا يشغّل أي trigger،
+    فصفوف الشهر تُطرح من عداد الأب هنا وتُزال triggers الـ partition. DETACH أو DROP مباشر
+    خارج هذه الدالة يترك العداد أكبر من العدد الفعلي. يُرجع عدد صفوف الشهر المفصول.
+    """
+    name = partition_name(table, month)
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+    # الجدول المفصول يبقى مقفلاً حصرياً حتى نهاية المعاملة، فالعدد لا يتغير بعد الفصل
+    rows = conn.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+    if table in COUNTED_TABLES:
+        conn.execute(text(drop_partition_triggers_sql(name)))
+        if rows:
+            conn.execute(text("INSERT INTO table_row_counts (table_name, delta) VALUES (:table, :delta)"),
+                         {"table": table, "delta": -rows})
+    return rows
+
+
+def ensure_partitions(start: datetime, end: datetime) -> list:
+    """
+    إنشاء partitions الأشهر من start إلى end إذا لم تكن موجودة. يُستدعى قبل معاملة
+    الإدخال وفي معاملة مستقلة (ATTACH ينتظر أي معاملة تمسك الجدول). يُرجع أسماء الـ partitions المُنشأة.
+    """
+    missing = [(table, month) for table in PARTITIONED_TABLES for month in _months(start, end)
+               if (table, month) not in _known]
+    if not missing:
+        return []
+
+    created = []
+    with _lock:
+        with engine.begin() as conn:
+            # عدة workers قد يحاولون إنشاء نفس الشهر في نفس اللحظة
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('partition_maintenance'))"))
+            for table, month in missing:
+                exists = conn.execute(text("SELECT to_regclass(:name)"),
+                                      {"name": partition_name(table, month)}).scalar()
+                if exists is None:
+                    created.append(_create_partition(conn, table, month))
+        _known.update(missing)
+    if created:
+        print(f"🗂️ Created partitions: {', '.join(created)}")
+    return created
+
+
+def ensure_partitions_for(frame) -> list:
+    """partitions كل الأشهر التي يغطيها DataFrame فيه عمود timestamp (مع هامش الـ rollup الأسبوعي)"""
+    if frame is None or len(frame) == 0:
+        return []
+    timestamps = frame["timestamp"]
+    return ensure_partitions(timestamps.min().to_pydatetime() - ROLLUP_LOOKBACK, timestamps.max().to_pydatetime())
+
+
+def ensure_future_partitions() -> list:
+    """مهمة يومية: الشهر الحالي و PARTITION_MONTHS_AHEAD شهراً قادمة جاهزة قبل وصول بياناتها"""
+    now = datetime.now(timezone.utc)
+    end = now
+    for _ in range(settings.PARTITION_MONTHS_AHEAD):
+        end = next_month(month_start(end))
+    return ensure_partitions(now, end)
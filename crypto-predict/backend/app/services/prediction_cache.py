@@ -0,0 +1,180 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+from app.core.config import get_settings
+
+settings = get_settings()
+
+KEY_PREFIX = "predcache"
+
+
+def _stamp(value) -> str:
+    if value is None:
+        return ""
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def make_key(asset_id: int, timeframe_id: int, latest_ts, model_version: str, features_at=None) -> str:
+    """
+    المفتاح: (العملة، الفترة، وقت آخر شمعة، آخر تعديل في نافذة الميزات، نسخة الموديل) — أي شمعة
+    جديدة أو مشاعر متأخرة تغيّر النافذة تعني مفتاحاً جديداً. features_at يُقرأ من قاعدة البيانات،
+    فالإبطال يصل لكل العمليات (import_sentiment.py مثلاً) حتى مع MemoryBackend.
+    """
+    return f"{KEY_PREFIX}:{asset_id}:{timeframe_id}:{_stamp(latest_ts)}:{_stamp(features_at)}:{model_version}"
+
+
+class MemoryBackend:
+    """LRU داخل الذاكرة بحجم أقصى ثابت"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict) -> int:
+        """يُرجع عدد العناصر التي تم طردها (evictions)"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def invalidate(self, asset_ids: Optional[Iterable[int]] = None) -> int:
+        with self._lock:
+            if asset_ids is None:
+                removed = len(self._data)
+                self._data.clear()
+                return removed
+            prefixes = tuple(f"{KEY_PREFIX}:{a}:" for a in asset_ids)
+            stale = [k for k in self._data if k.startswith(prefixes)]
+            for k in stale:
+                del self._data[k]
+            return len(stale)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class RedisBackend:
+    """
+    Redis مشترك بين كل الـ workers. الحجم محكوم بالـ TTL وبسياسة
+    maxmemory-policy (allkeys-lru) على خادم Redis نفسه.
+    """
+
+    def __init__(self, url: str, ttl_sec: int):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.ttl_sec = ttl_sec
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: dict) -> int:
+        self.client.set(key, json.dumps(value), ex=self.ttl_sec)
+        return 0
+
+    def invalidate(self, asset_ids: Optional[Iterable[int]] = None) -> int:
+        patterns = [f"{KEY_PREFIX}:*"] if asset_ids is None else [f"{KEY_PREFIX}:{a}:*" for a in asset_ids]
+        removed = 0
+        for pattern in patterns:
+            keys = list(self.client.scan_iter(match=pattern, count=500))
+            if keys:
+                removed += self.client.delete(*keys)
+        return removed
+
+    def size(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=f"{KEY_PREFIX}:*", count=500))
+
+
+class PredictionCache:
+    """
+    🗃️ كاش لنتائج محرك الذكاء الاصطناعي. أخطاء الـ backend (مثل انقطاع Redis)
+    لا تُسقط الطلب: تُحسب كـ miss ويُعاد الحساب.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, field: str, n: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def get(self, key: str) -> Optional[dict]:
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Prediction cache error: {e}")
+            self._count("errors")
+            value = None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: dict):
+        if self.backend is None:
+            return
+        try:
+            self._count("evictions", self.backend.set(key, value))
+        except Exception as e:
+            print(f"Prediction cache error: {e}")
+            self._count("errors")
+
+    def invalidate(self, asset_ids: Optional[Iterable[int]] = None):
+        """يُستدعى عند إدخال شموع جديدة (None = مسح الكاش بالكامل)"""
+        if self.backend is None:
+            return
+        try:
+            self._count("invalidations", self.backend.invalidate(asset_ids))
+        except Exception as e:
+            print(f"Prediction cache error: {e}")
+            self._count("errors")
+
+    def stats(self) -> dict:
+        try:
+            size = self.backend.size() if self.backend is not None else 0
+        except Exception:
+            size = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": settings.PREDICTION_CACHE_BACKEND,
+                "size": size,
+                "max_size": settings.PREDICTION_CACHE_SIZE,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "errors": self.errors,
+            }
+
+
+def _build_backend():
+    if settings.PREDICTION_CACHE_BACKEND == "redis":
+        return RedisBackend(settings.REDIS_URL, settings.PREDICTION_CACHE_TTL_SEC)
+    if settings.PREDICTION_CACHE_BACKEND == "memory":
+        return MemoryBackend(settings.PREDICTION_CACHE_SIZE)
+    return None
+
+
+prediction_cache = PredictionCache(_build_backend())
@@ -1,9 +1,14 @@
-import pandas as pd
 from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from starlette.concurrency import run_in_threadpool
 from app.db import models
-from app.services.inference_service import inference_engine
+from app.services import inference_executor
+from app.services import model_registry
+from app.services.feature_pipeline import fetch_window_array
+from app.services.inference_service import get_inference_engine, SEQ_LEN
+from app.services.prediction_cache import prediction_cache, make_key
 
 def clean_confidence_value(raw_value) -> float:
     try:
@@ -15,81 +20,247 @@ def clean_confidence_value(raw_value) -> float:
     except:
         return 0.50
 
-def generate_predictions(db: Session, asset_id: int, timeframe_id: int, user_id: int):
-    asset_info = db.query(models.CryptoAsset).filter(models.CryptoAsset.asset_id == asset_id).first()
-    symbol_name = asset_info.symbol if asset_info else "UNKNOWN"
-
-    query_results = db.query(models.Candle, models.Sentiment).join(
-        models.Sentiment, 
-        (models.Candle.asset_id == models.Sentiment.asset_id) & 
-        (models.Candle.timestamp == models.Sentiment.timestamp)
-    ).filter(
-        models.Candle.asset_id == asset_id
-    ).order_by(models.Candle.timestamp.desc()).limit(48).all()
-
-    if len(query_results) < 48:
-        print(f"Insufficient data for {symbol_name}. Available: {len(query_results)} records.")
-        return None
+def fetch_feature_window(db: Session, asset_id: int, timeframe_id: int, latest_ts=None, step=None):
+    """
+    جلب آخر 48 صف (شمعة + مشاعر) للعملة كمصفوفة float32 بترتيب زمني تصاعدي.
+    يُرجع (window, current_price) أو None إذا كانت البيانات غير كافية.
+    """
+    return fetch_window_array(db, asset_id, timeframe_id, SEQ_LEN, latest_ts=latest_ts, step=step)
 
-    query_results.reverse()
-
-    data_list = []
-    for candle, sentiment in query_results:
-        data_list.append({
-            "open": float(candle.open),
-            "high": float(candle.high),
-            "low": float(candle.low),
-            "close": float(candle.close),
-            "volume": float(candle.volume),
-            "avg_sentiment": sentiment.avg_sentiment if sentiment.avg_sentiment else 0.0,
-            "sent_count": sentiment.sent_count if sentiment.sent_count else 0,
-            "pos_count": sentiment.pos_count if sentiment.pos_count else 0,
-            "neg_count": sentiment.neg_count if sentiment.neg_count else 0,
-            "neu_count": sentiment.neu_count if sentiment.neu_count else 0,
-            "pos_ratio": sentiment.pos_ratio if sentiment.pos_ratio else 0.0,
-            "neg_ratio": sentiment.neg_ratio if sentiment.neg_ratio else 0.0,
-            "neu_ratio": sentiment.neu_ratio if sentiment.neu_ratio else 0.0,
-            "has_news": sentiment.has_news if sentiment.has_news else 0
-        })
-
-    df_input = pd.DataFrame(data_list)
-    ai_output = inference_engine.predict(df_input)
-
-    if "error" in ai_output:
-        print(f"AI Engine Error: {ai_output['error']}")
-        return None
 
-    current_price = float(query_results[-1][0].close)
+FORECAST_STEPS = 5
+
+
+def forecast_rows(ai_output: dict, current_price: float, asset_id: int, symbol_name: str,
+                  timeframe_id: int, source_ts=None) -> list:
+    """صفوف التوقع الخمسة (ساعة بساعة) كـ dicts جاهزة للإدخال — مشتركة لكل المستخدمين (بدون user_id)"""
     predicted_return = ai_output["predicted_return"]
     final_confidence = clean_confidence_value(ai_output["confidence"])
 
-    predictions_to_save = []
-
-    for i in range(1, 6):
+    rows = []
+    for i in range(1, FORECAST_STEPS + 1):
         target_ts = datetime.now(timezone.utc) + timedelta(hours=i)
-        hourly_return = (predicted_return * i) / 5 
+        hourly_return = (predicted_return * i) / FORECAST_STEPS
         predicted_val = current_price * (1 + hourly_return)
 
-        new_pred = models.Prediction(
+        rows.append(dict(
             asset_id=asset_id,
             asset=symbol_name,
             timeframe_id=timeframe_id,
-            user_id=user_id,
             timestamp=target_ts,
             predicted_price=round(predicted_val, 2),
             confidence=final_confidence,
-            model_used="XGB-LSTM_Hybrid",
-            created_at=datetime.now(timezone.utc)
-        )
-        db.add(new_pred)
-        predictions_to_save.append(new_pred)
+            # رقم نسخة الموديل الفعلية من الـ registry التي أنتجت التوقع
+            model_used=ai_output.get("model_version") or "XGB-LSTM_Hybrid",
+            created_at=datetime.now(timezone.utc),
+            source_ts=source_ts,
+            step=i
+        ))
+    return rows
+
+
+# مفتاح التوقع المشترك (الفهرس uq_prediction_forecast، بدون step)
+FORECAST_KEY = ("asset_id", "timeframe_id", "source_ts", "model_used")
+
+
+def forecast_key(row) -> tuple:
+    get = row.get if isinstance(row, dict) else lambda name: getattr(row, name)
+    return tuple(get(name) for name in FORECAST_KEY)
+
+
+# ما يتغير عند إعادة حساب توقع لنفس المفتاح (replace=True)
+FORECAST_VALUES = ("timestamp", "predicted_price", "confidence", "created_at")
 
+
+def save_forecasts(db: Session, rows: list, replace: bool = False) -> list:
+    """
+    💾 حفظ التوقعات بـ INSERT متعدد الصفوف واحد ... ON CONFLICT DO NOTHING RETURNING.
+    التوقع الموجود مسبقاً (نفس العملة والفترة والشمعة والنسخة) لا يُكتب مرة ثانية، بل يُقرأ
+    بـ SELECT واحد. يُرجع كائنات Prediction لكل الصفوف المطلوبة (بدون commit وبدون refresh).
+    replace=True لإعادة الحساب بعد تغيّر نافذة الميزات (مشاعر متأخرة): الصفوف الموجودة تُستبدل.
+    """
+    if not rows:
+        return []
+    stmt = insert(models.Prediction).values(rows)
+    conflict = dict(index_elements=[*FORECAST_KEY, "step"], index_where=models.Prediction.user_id.is_(None))
+    if replace:
+        stmt = stmt.on_conflict_do_update(**conflict, set_={name: stmt.excluded[name] for name in FORECAST_VALUES})
+    else:
+        stmt = stmt.on_conflict_do_nothing(**conflict)
+    # populate_existing: الكائنات المحمّلة مسبقاً في الجلسة تأخذ القيم المستبدلة
+    stmt = stmt.returning(models.Prediction).execution_options(populate_existing=True)
+    saved = list(db.scalars(stmt))
+
+    if len(saved) < len(rows):
+        inserted = {forecast_key(p) for p in saved}
+        existing = {forecast_key(r) for r in rows} - inserted
+        saved += db.query(models.Prediction).filter(
+            tuple_(*(getattr(models.Prediction, name) for name in FORECAST_KEY)).in_(existing),
+            models.Prediction.user_id.is_(None),
+        ).all()
+    return sorted(saved, key=lambda p: (p.asset_id, p.step))
+
+
+def commit_keep_loaded(db: Session):
+    """
+    commit بدون expire للكائنات: صفوف RETURNING محمّلة بالكامل، وبدون هذا يعيد
+    SQLAlchemy قراءة كل صف على حدة عند بناء الرد (نفس كلفة db.refresh لكل صف).
+    """
+    db.expire_on_commit = False
     try:
         db.commit()
-        for p in predictions_to_save:
-            db.refresh(p)
-        return predictions_to_save
+    finally:
+        db.expire_on_commit = True
+
+
+def access_rows(user_id, forecasts: list) -> list:
+    """صف واحد في سجل الوصول لكل توقع (5 صفوف Prediction = توقع واحد)"""
+    keys = dict.fromkeys(forecast_key(p) for p in forecasts)
+    return [dict(zip(FORECAST_KEY, key), user_id=user_id) for key in keys]
+
+
+def log_access(db: Session, user_id, forecasts: list):
+    """📝 سجل الوصول append-only: INSERT واحد بدون RETURNING (بدون commit)"""
+    rows = access_rows(user_id, forecasts)
+    if rows:
+        db.execute(insert(models.PredictionAccess).values(rows))
+
+
+def latest_candle_timestamp(db: Session, asset_id: int, timeframe_id: int):
+    return db.query(func.max(models.Candle.timestamp)).filter(
+        models.Candle.asset_id == asset_id,
+        models.Candle.timeframe_id == timeframe_id
+    ).scalar()
+
+
+def features_updated_at(db: Session, asset_id: int, timeframe_id: int, latest_ts=None):
+    """
+    آخر تعديل في صفوف نافذة التوقع (آخر SEQ_LEN صف في مخزن الميزات حتى latest_ts):
+    قراءة قصيرة من الفهرس. None إذا لم يتغير أي صف منها منذ التعبئة الأولى.
+    """
+    window = select(models.FeatureRow.updated_at).where(
+        models.FeatureRow.asset_id == asset_id,
+        models.FeatureRow.timeframe_id == timeframe_id,
+    )
+    if latest_ts is not None:
+        window = window.where(models.FeatureRow.timestamp <= latest_ts)
+    window = window.order_by(models.FeatureRow.timestamp.desc()).limit(SEQ_LEN).subquery()
+    return db.execute(select(func.max(window.c.updated_at))).scalar()
+
+
+def prepare_inference(db: Session, assets: list, timeframe_id: int):
+    """
+    المرحلة الأولى (قاعدة البيانات فقط): العملات الموجودة في الكاش تُرجع مباشرة،
+    والباقي تُجلب نوافذها لتُرسل للمحرك دفعة واحدة.
+    يُرجع (outputs, pending): outputs = {symbol: (ai_output, current_price, latest_ts)}
+    و pending = [(asset, latest_ts, features_at, window, current_price)].
+    """
+    try:
+        active_version = model_registry.get_active_version()
+    except Exception as e:
+        print(f"Model registry error: {e}")
+        active_version = None
+
+    outputs = {}
+    pending = []
+    for asset in assets:
+        latest_ts = latest_candle_timestamp(db, asset.asset_id, timeframe_id)
+        features_at = features_updated_at(db, asset.asset_id, timeframe_id) if latest_ts is not None else None
+        # الكاش مفتاحه النسخة الفعالة حالياً، فتبديل النسخة يتجاوز النتائج القديمة تلقائياً
+        cached = None
+        if latest_ts is not None and active_version:
+            cached = prediction_cache.get(make_key(asset.asset_id, timeframe_id, latest_ts, active_version,
+                                                   features_at))
+        if cached:
+            outputs[asset.symbol] = (cached["ai_output"], cached["current_price"], latest_ts)
+            continue
+
+        window = fetch_feature_window(db, asset.asset_id, timeframe_id)
+        if window is None:
+            print(f"Insufficient data for {asset.symbol}. Need {SEQ_LEN} joined records.")
+            continue
+        pending.append((asset, latest_ts, features_at, *window))
+    return outputs, pending
+
+
+def pending_inputs(pending: list, timeframe_id: int):
+    windows = [window for _, _, _, window, _ in pending]
+    keys = [(asset.asset_id, timeframe_id) for asset, _, _, _, _ in pending]
+    return windows, keys
+
+
+def finish_predictions(db: Session, assets: list, timeframe_id: int, user_id: int,
+                       outputs: dict, pending: list, ai_outputs: list) -> dict:
+    """المرحلة الأخيرة: تخزين النتائج الجديدة في الكاش، ثم حفظ التوقعات وسجل الوصول بـ commit واحد"""
+    for (asset, latest_ts, features_at, _, current_price), ai_output in zip(pending, ai_outputs):
+        if "error" in ai_output:
+            print(f"AI Engine Error: {ai_output['error']}")
+            continue
+        outputs[asset.symbol] = (ai_output, current_price, latest_ts)
+        # نخزّن تحت النسخة التي حسبت النتيجة فعلاً (قد تكون القديمة أثناء التبديل)
+        if latest_ts is not None and ai_output.get("model_version"):
+            key = make_key(asset.asset_id, timeframe_id, latest_ts, ai_output["model_version"], features_at)
+            prediction_cache.set(key, {"ai_output": ai_output, "current_price": current_price})
+
+    rows = []
+    for asset in assets:
+        if asset.symbol in outputs:
+            ai_output, current_price, latest_ts = outputs[asset.symbol]
+            rows.extend(forecast_rows(ai_output, current_price, asset.asset_id, asset.symbol,
+                                      timeframe_id, source_ts=latest_ts))
+
+    # التوقعات تُخزّن مرة واحدة للجميع، ومن طلبها يُسجَّل في prediction_access — commit واحد
+    try:
+        saved = save_forecasts(db, rows)
+        log_access(db, user_id, saved)
+        commit_keep_loaded(db)
     except Exception as e:
         db.rollback()
         print(f"Save Error: {e}")
-        return None
\ No newline at end of file
+        return {asset.symbol: None for asset in assets}
+
+    by_asset = {}
+    for p in saved:
+        by_asset.setdefault(p.asset_id, []).append(p)
+    return {asset.symbol: by_asset.get(asset.asset_id) for asset in assets}
+
+
+def generate_batch_predictions(db: Session, assets: list, timeframe_id: int, user_id: int) -> dict:
+    """
+    🔮 توقع عدة عملات بتمريرة واحدة عبر المحرك (scaler + XGBoost + LSTM مرة واحدة).
+    العملات الموجودة في الكاش لا تدخل الدفعة أصلاً.
+    assets: قائمة كائنات CryptoAsset. يُرجع {symbol: predictions | None}.
+    """
+    outputs, pending = prepare_inference(db, assets, timeframe_id)
+    ai_outputs = []
+    if pending:
+        windows, keys = pending_inputs(pending, timeframe_id)
+        ai_outputs = get_inference_engine().predict_batch(windows, keys=keys)
+    return finish_predictions(db, assets, timeframe_id, user_id, outputs, pending, ai_outputs)
+
+
+async def generate_batch_predictions_async(db: Session, assets: list, timeframe_id: int, user_id: int) -> dict:
+    """
+    نفس generate_batch_predictions لكن للـ handlers الـ async: عمل قاعدة البيانات في الـ threadpool،
+    والحساب في محرك التوقع المنفصل (inference_executor) بدون حجز عامل الطلب.
+    قد ترفع InferenceQueueFull عند امتلاء الطابور.
+    """
+    outputs, pending = await run_in_threadpool(prepare_inference, db, assets, timeframe_id)
+    ai_outputs = []
+    if pending:
+        windows, keys = pending_inputs(pending, timeframe_id)
+        ai_outputs = await inference_executor.predict_batch(windows, keys)
+    return await run_in_threadpool(finish_predictions, db, assets, timeframe_id, user_id,
+                                   outputs, pending, ai_outputs)
+
+
+def generate_predictions(db: Session, asset_id: int, timeframe_id: int, user_id: int):
+    asset = db.query(models.CryptoAsset).filter(models.CryptoAsset.asset_id == asset_id).first()
+    if not asset:
+        return None
+    return generate_batch_predictions(db, [asset], timeframe_id, user_id)[asset.symbol]
+
+
+async def generate_predictions_async(db: Session, asset, timeframe_id: int, user_id: int):
+    results = await generate_batch_predictions_async(db, [asset], timeframe_id, user_id)
+    return results[asset.symbol]
@@ -1,8 +1,14 @@
 from datetime import datetime
+import pandas as pd
 import requests
 from sqlalchemy.orm import Session
 from sqlalchemy.dialects.postgresql import insert
 from app.db import models
+from app.services.prediction_cache import prediction_cache
+from app.services.rollup_service import update_rollups
+from app.services.snapshot_service import update_snapshots
+from app.services.feature_store import update_features
+from app.services.partition_service import ensure_partitions_for
 
 def fetch_prices_from_api(asset_id: int, symbol: str, timeframe_id: int, timeframe_code: str, db: Session):
    
@@ -33,13 +39,19 @@ def fetch_prices_from_api(asset_id: int, symbol: str, timeframe_id: int, timefra
     if not values:
         return 0
 
-    stmt = insert(models.OHLCV_Candle).values(values)
+    frame = pd.DataFrame(values)
+    ensure_partitions_for(frame)
+    stmt = insert(models.Candle).values(values)
 
     stmt = stmt.on_conflict_do_nothing(
         index_elements=["asset_id", "timeframe_id", "timestamp"]
     )
 
     db.execute(stmt)
+    update_rollups(db, frame)
+    update_snapshots(db, frame)
+    update_features(db, frame)
     db.commit()
+    prediction_cache.invalidate([asset_id])
 
     return len(values)
\ No newline at end of file
@@ -0,0 +1,193 @@
+import time
+import pandas as pd
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from app.db import models
+from app.db.session import SessionLocal
+
+# ============================================================
+# 🧱 تجميع الفترات الأعلى (4h, 1d, 1w) من البيانات الساعية
+# الـ rollups تُخزّن في نفس جدولي الشموع والمشاعر بـ timeframe_id خاص بها،
+# فكل الاستعلامات (السجل، التوقع، الـ scheduler) تقرأها مباشرة كأي فترة أخرى.
+# ============================================================
+
+BASE_TIMEFRAME = ("1h", "1 hour", "Hourly")
+ROLLUP_TIMEFRAMES = [
+    ("4h", "4 hours", "Four-hourly"),
+    ("1d", "1 day", "Daily"),
+    ("1w", "7 days", "Weekly"),
+]
+# بداية كل bucket: منتصف الليل UTC، والأسبوع يبدأ يوم الاثنين (2000-01-03 كان اثنين)
+BUCKET_ORIGIN = "2000-01-03 00:00:00"
+
+_timeframe_ids = {}
+
+# الـ buckets المتأثرة لكل عملة: من bucket أول ساعة جديدة (أو أول bucket لم يُجمّع بعد،
+# أو أول ساعة في تاريخ العملة إذا لم يوجد أي rollup) حتى bucket آخر ساعة جديدة.
+# bucket لا يُكتب إلا إذا أُغلق: توجد بيانات ساعية حتى نهايته أو بعدها.
+# {table}: الجدول الذي يُكتب فيه الـ rollup (لكلٍ منهما آخر bucket خاص به).
+# MATERIALIZED: الحدود تُحسب مرة لكل عملة، لا مرة لكل صف ساعي (وإلا تتكرر الاستعلامات
+# الفرعية على كل partitions الجدول لكل صف).
+_RANGES_SQL = """
+    WITH changed AS (
+        SELECT * FROM unnest(CAST(:asset_ids AS integer[]), CAST(:starts AS timestamp[]),
+                             CAST(:ends AS timestamp[])) AS r(asset_id, start_ts, end_ts)
+    ),
+    ranges AS MATERIALIZED (
+        SELECT c.asset_id,
+               LEAST(
+                   date_bin(CAST(:step AS interval), c.start_ts, TIMESTAMP '{origin}'),
+                   COALESCE(
+                       (SELECT max(timestamp) + CAST(:step AS interval) FROM {table}
+                        WHERE asset_id = c.asset_id AND timeframe_id = :tf_id),
+                       (SELECT date_bin(CAST(:step AS interval), min(timestamp), TIMESTAMP '{origin}')
+                        FROM candle_ohlcv WHERE asset_id = c.asset_id AND timeframe_id = :base_id)
+                   )
+               ) AS range_start,
+               date_bin(CAST(:step AS interval), c.end_ts, TIMESTAMP '{origin}') + CAST(:step AS interval) AS range_end,
+               (SELECT max(timestamp) + interval '1 hour' FROM candle_ohlcv
+                WHERE asset_id = c.asset_id AND timeframe_id = :base_id) AS data_end
+        FROM changed c
+    )
+"""
+
+_CANDLE_ROLLUP_SQL = (_RANGES_SQL + """
+    INSERT INTO candle_ohlcv (asset_id, timeframe_id, timestamp, open, high, low, close, volume, exchange)
+    SELECT h.asset_id, :tf_id, h.bucket,
+           (array_agg(h.open ORDER BY h.timestamp))[1],
+           max(h.high), min(h.low),
+           (array_agg(h.close ORDER BY h.timestamp DESC))[1],
+           sum(h.volume),
+           'Rollup'
+    FROM (
+        SELECT c.*, date_bin(CAST(:step AS interval), c.timestamp, TIMESTAMP '{origin}') AS bucket, r.data_end
+        FROM ranges r
+        JOIN candle_ohlcv c ON c.asset_id = r.asset_id AND c.timeframe_id = :base_id
+         AND c.timestamp >= r.range_start AND c.timestamp < r.range_end
+    ) h
+    GROUP BY h.asset_id, h.bucket, h.data_end
+    HAVING h.bucket + CAST(:step AS interval) <= h.data_end
+    ON CONFLICT (asset_id, timeframe_id, timestamp) DO UPDATE SET
+        open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+        close = EXCLUDED.close, volume = EXCLUDED.volume
+    WHERE (candle_ohlcv.open, candle_ohlcv.high, candle_ohlcv.low, candle_ohlcv.close, candle_ohlcv.volume)
+          IS DISTINCT FROM (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low, EXCLUDED.close, EXCLUDED.volume)
+""").format(origin=BUCKET_ORIGIN, table="candle_ohlcv")
+
+# المشاعر: مجموع العدادات، متوسط المشاعر موزون بعدد الأخبار، والنسب تُحسب من جديد من العدادات.
+# المتوسط يُجمع بـ numeric: مجموع float يتغير آخر رقم فيه حسب ترتيب الصفوف في الخطة،
+# فيبدو الـ bucket "متغيراً" عند كل إعادة حساب ويُعاد كتابته بلا داعٍ.
+_SENTIMENT_ROLLUP_SQL = (_RANGES_SQL + """
+    INSERT INTO sentiments (asset_id, timeframe_id, timestamp, avg_sentiment, sent_count, pos_count, neg_count,
+                            neu_count, pos_ratio, neg_ratio, neu_ratio, has_news)
+    SELECT h.asset_id, :tf_id, h.bucket,
+           CAST(COALESCE(sum(h.avg_sentiment * h.sent_count) / NULLIF(sum(h.sent_count), 0),
+                         avg(h.avg_sentiment)) AS float),
+           sum(h.sent_count), sum(h.pos_count), sum(h.neg_count), sum(h.neu_count),
+           COALESCE(sum(h.pos_count)::float / NULLIF(sum(h.pos_count + h.neg_count + h.neu_count), 0), 0),
+           COALESCE(sum(h.neg_count)::float / NULLIF(sum(h.pos_count + h.neg_count + h.neu_count), 0), 0),
+           COALESCE(sum(h.neu_count)::float / NULLIF(sum(h.pos_count + h.neg_count + h.neu_count), 0), 0),
+           max(h.has_news)
+    FROM (
+        SELECT s.asset_id, CAST(s.avg_sentiment AS numeric) AS avg_sentiment,
+               COALESCE(s.sent_count, 0) AS sent_count, COALESCE(s.pos_count, 0) AS pos_count,
+               COALESCE(s.neg_count, 0) AS neg_count, COALESCE(s.neu_count, 0) AS neu_count,
+               COALESCE(s.has_news, 0) AS has_news,
+               date_bin(CAST(:step AS interval), CAST(s.timestamp AS timestamp), TIMESTAMP '{origin}') AS bucket,
+               r.data_end
+        FROM ranges r
+        JOIN sentiments s ON s.asset_id = r.asset_id AND s.timeframe_id = :base_id
+         AND s.timestamp >= r.range_start AND s.timestamp < r.range_end
+    ) h
+    GROUP BY h.asset_id, h.bucket, h.data_end
+    HAVING h.bucket + CAST(:step AS interval) <= h.data_end
+    ON CONFLICT (asset_id, timeframe_id, timestamp) DO UPDATE SET
+        avg_sentiment = EXCLUDED.avg_sentiment, sent_count = EXCLUDED.sent_count,
+        pos_count = EXCLUDED.pos_count, neg_count = EXCLUDED.neg_count, neu_count = EXCLUDED.neu_count,
+        pos_ratio = EXCLUDED.pos_ratio, neg_ratio = EXCLUDED.neg_ratio, neu_ratio = EXCLUDED.neu_ratio,
+        has_news = EXCLUDED.has_news
+    WHERE (sentiments.avg_sentiment, sentiments.sent_count, sentiments.pos_count, sentiments.neg_count,
+           sentiments.neu_count, sentiments.has_news)
+          IS DISTINCT FROM (EXCLUDED.avg_sentiment, EXCLUDED.sent_count, EXCLUDED.pos_count,
+                            EXCLUDED.neg_count, EXCLUDED.neu_count, EXCLUDED.has_news)
+""").format(origin=BUCKET_ORIGIN, table="sentiments")
+
+
+def timeframe_ids() -> dict:
+    """
+    {code: timeframe_id} للفترة الأساسية والفترات المجمّعة (تُنشأ عند أول استخدام).
+    جلسة مستقلة: إنشاء الفترات لا يجب أن يُثبّت (commit) معاملة الإدخال الجارية.
+    """
+    if not _timeframe_ids:
+        db = SessionLocal()
+        try:
+            for code, _, description in [BASE_TIMEFRAME] + ROLLUP_TIMEFRAMES:
+                tf = db.query(models.Timeframe).filter(models.Timeframe.code == code).first()
+                if not tf:
+                    tf = models.Timeframe(code=code, description=description)
+                    db.add(tf)
+                    db.commit()
+                _timeframe_ids[code] = tf.timeframe_id
+        finally:
+            db.close()
+    return _timeframe_ids
+
+
+def resolve_timeframe_id(code: str):
+    """رمز الفترة من الـ API ('1h', '4h', '1d', '1w') → timeframe_id، أو None إذا لم تكن مدعومة"""
+    return timeframe_ids().get((code or BASE_TIMEFRAME[0]).lower())
+
+
+def base_timeframe_id() -> int:
+    return timeframe_ids()[BASE_TIMEFRAME[0]]
+
+
+def update_rollups(db: Session, candles) -> dict:
+    """
+    🔁 تحديث الـ rollups بعد إدخال شموع أو مشاعر ساعية (بدون commit — ضمن نفس معاملة الإدخال).
+    candles: DataFrame فيه asset_id و timeframe_id و timestamp (شموع أو مشاعر). يُعاد حساب
+    الـ buckets التي لمستها الصفوف الجديدة فقط، لا التاريخ كاملاً.
+    """
+    if candles is None or len(candles) == 0:
+        return {}
+    ids = timeframe_ids()
+    base = candles[candles["timeframe_id"] == ids[BASE_TIMEFRAME[0]]]
+    if base.empty:
+        return {}
+
+    bounds = base.groupby("asset_id")["timestamp"].agg(["min", "max"])
+    params = {
+        "asset_ids": [int(a) for a in bounds.index],
+        "starts": [ts.to_pydatetime().replace(tzinfo=None) for ts in bounds["min"]],
+        "ends": [ts.to_pydatetime().replace(tzinfo=None) for ts in bounds["max"]],
+        "base_id": ids[BASE_TIMEFRAME[0]],
+    }
+    return rollup(db, params)
+
+
+def rollup(db: Session, params: dict) -> dict:
+    start = time.perf_counter()
+    ids = timeframe_ids()
+    counts = {}
+    for code, step, _ in ROLLUP_TIMEFRAMES:
+        step_params = {**params, "tf_id": ids[code], "step": step}
+        candles = db.execute(text(_CANDLE_ROLLUP_SQL), step_params).rowcount
+        sentiments = db.execute(text(_SENTIMENT_ROLLUP_SQL), step_params).rowcount
+        counts[code] = {"candles": candles, "sentiments": sentiments}
+    counts["elapsed_sec"] = round(time.perf_counter() - start, 3)
+    return counts
+
+
+def hourly_bounds(db: Session, asset_ids: list = None):
+    """
+    أول وآخر شمعة ساعية لكل عملة، بنفس شكل دفعة الإدخال (asset_id، timeframe_id، timestamp):
+    تمريرها إلى update_rollups / update_snapshots / update_features يعيد بناء التاريخ كاملاً.
+    """
+    base_id = timeframe_ids()[BASE_TIMEFRAME[0]]
+    query = db.query(
+        models.Candle.asset_id, func.min(models.Candle.timestamp), func.max(models.Candle.timestamp)
+    ).filter(models.Candle.timeframe_id == base_id).group_by(models.Candle.asset_id)
+    if asset_ids:
+        query = query.filter(models.Candle.asset_id.in_(asset_ids))
+    rows = [(asset_id, base_id, ts) for asset_id, first, last in query.all() for ts in (first, last)]
+    return pd.DataFrame(rows, columns=["asset_id", "timeframe_id", "timestamp"])
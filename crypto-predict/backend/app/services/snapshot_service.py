@@ -0,0 +1,61 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.services.rollup_service import base_timeframe_id
+
+# ============================================================
+# 📸 ملخص آخر سعر لكل عملة (asset_snapshots): آخر إغلاق، الإغلاق قبل 24 ساعة،
+# أعلى/أدنى سعر وحجم التداول خلال 24 ساعة، ونسبة التغير.
+# يُحدَّث في نفس معاملة الإدخال للعملات التي وصلتها شموع ساعية فقط؛ كل قيمة قراءة
+# قصيرة من فهرس الشموع (آخر شمعة، الشمعة قبل 24 ساعة، و24 شمعة بينهما).
+# الـ 24 ساعة تُحسب من آخر شمعة للعملة وليس من الوقت الحالي (البيانات قد تكون تاريخية).
+# ============================================================
+
+SNAPSHOT_SQL = """
+    INSERT INTO asset_snapshots (asset_id, last_ts, last_close, close_24h_ago, high_24h, low_24h, volume_24h,
+                                 change_24h_pct, updated_at)
+    SELECT a.asset_id, latest.timestamp, latest.close, previous.close, day.high, day.low, day.volume,
+           CAST((latest.close - previous.close) / NULLIF(previous.close, 0) * 100 AS float),
+           now()
+    FROM unnest(CAST(:asset_ids AS integer[])) AS a(asset_id)
+    CROSS JOIN LATERAL (
+        SELECT timestamp, close FROM candle_ohlcv
+        WHERE asset_id = a.asset_id AND timeframe_id = :base_id
+        ORDER BY timestamp DESC LIMIT 1
+    ) latest
+    LEFT JOIN LATERAL (
+        SELECT close FROM candle_ohlcv
+        WHERE asset_id = a.asset_id AND timeframe_id = :base_id
+          AND timestamp <= latest.timestamp - interval '24 hours'
+        ORDER BY timestamp DESC LIMIT 1
+    ) previous ON true
+    CROSS JOIN LATERAL (
+        SELECT max(high) AS high, min(low) AS low, sum(volume) AS volume FROM candle_ohlcv
+        WHERE asset_id = a.asset_id AND timeframe_id = :base_id
+          AND timestamp > latest.timestamp - interval '24 hours' AND timestamp <= latest.timestamp
+    ) day
+    ON CONFLICT (asset_id) DO UPDATE SET
+        last_ts = EXCLUDED.last_ts, last_close = EXCLUDED.last_close, close_24h_ago = EXCLUDED.close_24h_ago,
+        high_24h = EXCLUDED.high_24h, low_24h = EXCLUDED.low_24h, volume_24h = EXCLUDED.volume_24h,
+        change_24h_pct = EXCLUDED.change_24h_pct, updated_at = EXCLUDED.updated_at
+"""
+
+
+def update_snapshots(db: Session, candles) -> int:
+    """
+    🔁 تحديث ملخص العملات بعد إدخال شموع (بدون commit — ضمن نفس معاملة الإدخال).
+    candles: DataFrame فيه asset_id و timeframe_id؛ الفترات المجمّعة لا تغيّر الملخص.
+    """
+    if candles is None or len(candles) == 0:
+        return 0
+    base_id = base_timeframe_id()
+    asset_ids = candles.loc[candles["timeframe_id"] == base_id, "asset_id"].unique()
+    if len(asset_ids) == 0:
+        return 0
+    return refresh_snapshots(db, [int(a) for a in asset_ids], base_id)
+
+
+def refresh_snapshots(db: Session, asset_ids: list, base_id: int = None) -> int:
+    return db.execute(text(SNAPSHOT_SQL), {
+        "asset_ids": asset_ids,
+        "base_id": base_id or base_timeframe_id(),
+    }).rowcount
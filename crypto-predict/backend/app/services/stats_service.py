@@ -0,0 +1,103 @@
+import time
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import get_settings
+from app.db.session import engine
+
+# ============================================================
+# 📊 أعداد صفوف لوحة التحكم بدون COUNT(*) على جداول بعشرات الملايين من الصفوف
+# لكل رقم طريقة حسابه:
+#   exact    → عدادات الـ triggers (table_row_counts): دقيقة، قراءة بضعة صفوف
+#   estimate → pg_class.reltuples (مجموع الـ partitions): تقديري من آخر ANALYZE
+#   count    → COUNT(*) فعلي، فقط إذا لم تتوفر الطريقتان السابقتان
+# والنتيجة تُحفظ STATS_CACHE_TTL_SEC ثانية: تحديث اللوحة المتكرر لا يلمس قاعدة البيانات.
+# ============================================================
+
+settings = get_settings()
+
+_cache = {}
+
+_EXACT_SQL = """
+    SELECT table_name, sum(delta) FROM table_row_counts
+    WHERE table_name = ANY(CAST(:tables AS text[])) GROUP BY table_name
+"""
+
+# الجدول العادي نفسه، أو partitions الجدول المقسّم (reltuples للأب بعد ANALYZE يدوي = المجموع
+# مرة ثانية فلا يُجمع). reltuples = -1 لجدول لم يُحلَّل بعد (ANALYZE أو autovacuum).
+_ESTIMATE_SQL = """
+    SELECT t.name, sum(c.reltuples) FILTER (WHERE c.reltuples >= 0),
+           bool_or(c.reltuples >= 0)
+    FROM unnest(CAST(:tables AS text[])) AS t(name)
+    JOIN pg_class c ON c.oid = to_regclass(t.name)
+        OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(t.name))
+    WHERE c.relkind = 'r'
+    GROUP BY t.name
+"""
+
+# دمج صفوف العدادات: صف واحد لكل جدول. الحذف يرى فقط الصفوف المُثبّتة قبله، فما يُضاف
+# أثناء الدمج يبقى كما هو ويدخل في الدمج التالي.
+_COMPACT_SQL = """
+    WITH merged AS (DELETE FROM table_row_counts RETURNING table_name, delta)
+    INSERT INTO table_row_counts (table_name, delta)
+    SELECT table_name, sum(delta) FROM merged GROUP BY table_name
+"""
+
+
+async def exact_counts(db: AsyncSession, tables: list) -> dict:
+    return {name: int(total) for name, total in (await db.execute(text(_EXACT_SQL), {"tables": tables})).all()}
+
+
+async def estimated_counts(db: AsyncSession, tables: list) -> dict:
+    return {
+        name: int(total) for name, total, analyzed in (await db.execute(text(_ESTIMATE_SQL), {"tables": tables})).all()
+        if analyzed
+    }
+
+
+async def table_counts(db: AsyncSession, tables: list, mode: str = None) -> dict:
+    """
+    {الجدول: {"value": العدد, "mode": الطريقة التي أنتجته}}. mode: exact (افتراضياً STATS_COUNT_MODE)
+    يرجع إلى estimate للجداول بدون عدادات، و estimate يرجع إلى count إذا لم يُحلَّل الجدول بعد.
+    """
+    mode = mode or settings.STATS_COUNT_MODE
+    counts, missing = {}, list(tables)
+    if mode == "exact":
+        for name, value in (await exact_counts(db, missing)).items():
+            counts[name] = {"value": value, "mode": "exact"}
+        missing = [name for name in missing if name not in counts]
+    if missing:
+        for name, value in (await estimated_counts(db, missing)).items():
+            counts[name] = {"value": value, "mode": "estimate"}
+        missing = [name for name in missing if name not in counts]
+    for name in missing:
+        value = (await db.execute(text(f'SELECT count(*) FROM "{name}"'))).scalar()
+        counts[name] = {"value": value, "mode": "count"}
+    return counts
+
+
+async def cached_table_counts(db: AsyncSession, tables: list) -> dict:
+    """table_counts مع كاش قصير: {"counts": ..., "cache": {"hit", "age_sec", "ttl_sec"}}"""
+    key = tuple(tables)
+    now = time.monotonic()
+    cached = _cache.get(key)
+    ttl = settings.STATS_CACHE_TTL_SEC
+    if cached is not None and now - cached[0] < ttl:
+        return {"counts": cached[1], "cache": {"hit": True, "age_sec": round(now - cached[0], 1), "ttl_sec": ttl}}
+
+    counts = await table_counts(db, tables)
+    _cache[key] = (now, counts)
+    return {"counts": counts, "cache": {"hit": False, "age_sec": 0.0, "ttl_sec": ttl}}
+
+
+def compact_row_counts(conn=None) -> int:
+    """
+    مهمة دورية في الـ scheduler: يُرجع عدد صفوف العدادات بعد الدمج (0 إذا كان دمج آخر جارياً).
+    conn: اتصال في معاملة مفتوحة (الاختبارات)، وإلا معاملة مستقلة على engine التطبيق.
+    """
+    if conn is None:
+        with engine.begin() as conn:
+            return compact_row_counts(conn)
+    # عدة workers قد يشغّلون نفس المهمة في نفس اللحظة
+    if not conn.execute(text("SELECT pg_try_advisory_xact_lock(hashtext('table_row_counts'))")).scalar():
+        return 0
+    return conn.execute(text(_COMPACT_SQL)).rowcount
@@ -1,16 +1,24 @@
 import pandas as pd
 import numpy as np
 import joblib
+import json
 import os
+import tempfile
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from xgboost import XGBRegressor
 from datetime import datetime
 from app.db import models
+from app.services import model_registry
+from app.services.feature_pipeline import FEATURES
+from app.services.rollup_service import base_timeframe_id
 
-def retrain_model_logic(db: Session):
+def retrain_model_logic(db: Session, user_id: int = None, activate: bool = False):
     """
     نسخة مطورة تشمل نظام تسجيل العمليات (Logging System).
-    تقوم بتدريب الموديل وحفظ النتيجة في جدول model_logs.
+    تقوم بتدريب موديل XGBoost جديد ونشره كنسخة جديدة في الـ model registry
+    (باقي الملفات: scaler و LSTM و features تُنسخ من النسخة الفعالة)،
+    وحفظ النتيجة في جدول model_logs. يُرجع رقم النسخة الجديدة أو False.
     """
     # متغيرات لتتبع الحالة
     start_time = datetime.now()
@@ -19,57 +27,81 @@ def retrain_model_logic(db: Session):
     try:
         print(f"[{start_time}] Starting Model Retraining...")
 
-        # 1. جلب البيانات (كما هي في كودك)
-        candles = db.query(models.Candle).all()
-        df_prices = pd.DataFrame([{'asset': c.asset, 'timestamp': c.timestamp, 'close': c.close, 'open': c.open, 'high': c.high, 'low': c.low, 'volume': c.volume} for c in candles])
-        
-        sentiments = db.query(models.Sentiment).all()
-        df_sentiments = pd.DataFrame([{'asset': s.asset, 'timestamp': s.timestamp, 'sent_count': s.sent_count, 'avg_sentiment': s.avg_sentiment, 'pos_count': s.pos_count, 'neg_count': s.neg_count, 'neu_count': s.neu_count, 'pos_ratio': s.pos_ratio, 'neg_ratio': s.neg_ratio, 'neu_ratio': s.neu_ratio, 'has_news': s.has_news} for s in sentiments])
+        parent = model_registry.get_active_version()
+        if parent is None:
+            raise Exception("No active model version to base the new version on.")
+        parent_dir = model_registry.version_dir(parent)
+        with open(os.path.join(parent_dir, "features.json")) as f:
+            feature_cols = json.load(f)
+        scaler = joblib.load(os.path.join(parent_dir, "scaler.pkl"))
+
+        # 1. جلب البيانات من مخزن الميزات (الشموع مع مشاعرها بعد قواعد التعبئة) بقراءة واحدة
+        # الموديل يتدرب على الفترة الساعية فقط (الـ rollups مشتقة منها)
+        rows = db.execute(select(
+            models.FeatureRow.asset_id, models.FeatureRow.price,
+            *(getattr(models.FeatureRow, name) for name in FEATURES)
+        ).where(models.FeatureRow.timeframe_id == base_timeframe_id()).order_by(
+            models.FeatureRow.asset_id, models.FeatureRow.timestamp
+        )).all()
 
-        if df_prices.empty or df_sentiments.empty:
+        if not rows:
             raise Exception("Database tables are empty. Cannot train model.")
 
-        # 2. دمج البيانات ومعالجة الأهداف
-        df_total = pd.merge(df_prices, df_sentiments, on=['asset', 'timestamp'], how='inner')
+        df_total = pd.DataFrame.from_records(rows, columns=["asset_id", "price", *FEATURES])
+        df_total[FEATURES] = df_total[FEATURES].astype(np.float32)
         records_used = len(df_total) # تخزين عدد السجلات للـ Log
-        
-        df_total['target'] = df_total.groupby('asset')['close'].shift(-1)
+
+        # 2. الهدف: العائد للشمعة التالية (نفس ما يتوقعه المحرك كـ predicted_return)
+        df_total['target'] = df_total.groupby('asset_id')['price'].shift(-1) / df_total['price'] - 1
         df_total = df_total.dropna()
 
-        # 3. التدريب والحفظ (استخدام الـ 14 خاصية)
-        feature_cols = ["open", "high", "low", "close", "volume", "sent_count", "avg_sentiment", "pos_count", "neg_count", "neu_count", "pos_ratio", "neg_ratio", "neu_ratio", "has_news"]
-        X = df_total[feature_cols]
+        # 3. التدريب على نفس الخصائص بعد الـ scaler كما في المحرك
+        X = pd.DataFrame(scaler.transform(df_total[feature_cols]), columns=feature_cols)
         y = df_total['target']
 
         model = XGBRegressor(n_estimators=200, learning_rate=0.05, max_depth=6, random_state=42)
         model.fit(X, y)
+        rmse = float(np.sqrt(np.mean((model.predict(X) - y.to_numpy()) ** 2)))
 
-        model_path = "app/models/latest_model.pkl"
-        os.makedirs(os.path.dirname(model_path), exist_ok=True)
-        joblib.dump(model, model_path)
+        # 4. نشر نسخة جديدة (immutable) في الـ registry
+        with tempfile.TemporaryDirectory() as tmp:
+            xgb_path = os.path.join(tmp, "xgb_model.json")
+            model.get_booster().save_model(xgb_path)
+            files = {name: os.path.join(parent_dir, name)
+                     for name in os.listdir(parent_dir) if name != model_registry.MANIFEST}
+            files["xgb_model.json"] = xgb_path
+            version_id = model_registry.publish_version(
+                files, source="trainer", parent=parent,
+                metrics={"records": records_used, "train_rmse": round(rmse, 6)},
+            )
+        if activate:
+            model_registry.set_active(version_id)
 
-        # --- 4. تسجيل نجاح العملية في قاعدة البيانات ---
+        # --- 5. تسجيل نجاح العملية في قاعدة البيانات ---
         new_log = models.ModelLog(
             trained_at=start_time,
             records_count=records_used,
-            status="Success"
+            status="Success",
+            model_version=version_id,
+            user_id=user_id
         )
         db.add(new_log)
         db.commit()
         
-        print(f"✅ Success: Model retrained on {records_used} records.")
-        return True
+        print(f"✅ Success: Model retrained on {records_used} records (version {version_id}).")
+        return version_id
 
     except Exception as e:
         db.rollback() # التراجع في حال حدوث خطأ أثناء التعامل مع الـ Database
         error_msg = str(e)
         
-        # --- 5. تسجيل فشل العملية مع ذكر السبب ---
+        # --- 6. تسجيل فشل العملية مع ذكر السبب ---
         fail_log = models.ModelLog(
             trained_at=start_time,
             records_count=records_used,
             status="Failed",
-            error_message=error_msg[:500] # نأخذ أول 500 حرف فقط
+            error_message=error_msg[:500], # نأخذ أول 500 حرف فقط
+            user_id=user_id
         )
         db.add(fail_log)
         db.commit()
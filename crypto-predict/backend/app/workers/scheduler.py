@@ -1,14 +1,19 @@
 from apscheduler.schedulers.background import BackgroundScheduler
+from datetime import datetime
 from sqlalchemy.orm import Session
 import logging
 import os
 
+from app.core.config import get_settings
 from app.db.session import SessionLocal
 from app.services.prices_service import fetch_prices_from_api
 from app.services.sentiment_service import analyze_texts
+from app.services import forecast_service, partition_service, stats_service
 
 logging.basicConfig(level=logging.INFO)
 
+_scheduler = None
+
 
 def scheduled_fetch_prices():
     """🔄 Job: جلب أسعار bitcoin وتخزينها في قاعدة البيانات"""
@@ -43,36 +48,117 @@ def scheduled_sentiment():
         db.close()
 
 
+def scheduled_refresh_forecasts():
+    """🔮 Job: حساب التوقع المشترك لكل عملة أُغلقت لها شمعة جديدة"""
+    db: Session = SessionLocal()
+    try:
+        summary = forecast_service.refresh_forecasts(db)
+        if summary.get("refreshed") or summary.get("failed"):
+            logging.info(f"✔️ Forecasts refreshed: {summary}")
+    except Exception as e:
+        logging.error(f"❌ Error in forecast refresh job: {e}")
+    finally:
+        db.close()
+
+
+def scheduled_partitions():
+    """🗂️ Job: partitions الأشهر القادمة للشموع والمشاعر"""
+    try:
+        partition_service.ensure_future_partitions()
+    except Exception as e:
+        logging.error(f"❌ Error in partition maintenance job: {e}")
+
+
+def scheduled_compact_row_counts():
+    """🔢 Job: دمج صفوف عدادات الجداول"""
+    try:
+        stats_service.compact_row_counts()
+    except Exception as e:
+        logging.error(f"❌ Error in row counts compaction job: {e}")
+
+
 def start_scheduler():
     """
     🚀 تشغيل الـ BackgroundScheduler
     ✅ يمنع تشغيله أكثر من مرة مع uvicorn --reload
+    مهام جلب الأسعار والمشاعر تعمل فقط في العملية الرئيسية (RUN_MAIN)، أما تحديث
+    التوقعات المشتركة فيعمل في كل worker (الإدخال مع ON CONFLICT DO NOTHING فلا تكرار)
     """
 
-    # 🔒 هذا السطر هو الحل
-    if os.environ.get("RUN_MAIN") != "true":
-        logging.info("⏭ Scheduler not started (not main process)")
+    global _scheduler
+    if _scheduler is not None:
         return
-
+    settings = get_settings()
     scheduler = BackgroundScheduler()
 
-    # 🕒 كل 10 دقائق: جلب الأسعار
-    scheduler.add_job(
-        scheduled_fetch_prices,
-        "interval",
-        minutes=10,
-        id="fetch_prices_job",
-        replace_existing=True,
-    )
+    # 🔒 هذا السطر هو الحل
+    if os.environ.get("RUN_MAIN") == "true":
+        # 🕒 كل 10 دقائق: جلب الأسعار
+        scheduler.add_job(
+            scheduled_fetch_prices,
+            "interval",
+            minutes=10,
+            id="fetch_prices_job",
+            replace_existing=True,
+        )
+
+        # 🕒 كل 30 دقيقة: تحليل المشاعر
+        scheduler.add_job(
+            scheduled_sentiment,
+            "interval",
+            minutes=30,
+            id="sentiment_job",
+            replace_existing=True,
+        )
+    else:
+        logging.info("⏭ Price/sentiment jobs not started (not main process)")
 
-    # 🕒 كل 30 دقيقة: تحليل المشاعر
+    # 🕒 كل دقيقة (FORECAST_REFRESH_SEC): توقعات الشموع المغلقة حديثاً
+    if settings.FORECAST_REFRESH_SEC > 0:
+        scheduler.add_job(
+            scheduled_refresh_forecasts,
+            "interval",
+            seconds=settings.FORECAST_REFRESH_SEC,
+            id="refresh_forecasts_job",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
+    # 🕒 عند الإقلاع ثم يومياً: partitions الأشهر القادمة
+    # (آمن في كل worker: الإنشاء محمي بـ advisory lock ويتجاهل الموجود)
     scheduler.add_job(
-        scheduled_sentiment,
+        scheduled_partitions,
         "interval",
-        minutes=30,
-        id="sentiment_job",
+        hours=24,
+        next_run_time=datetime.now(),
+        id="partitions_job",
         replace_existing=True,
+        max_instances=1,
+        coalesce=True,
     )
 
+    # 🕒 كل 10 دقائق (STATS_COMPACT_MINUTES): دمج عدادات الصفوف
+    if settings.STATS_COMPACT_MINUTES > 0:
+        scheduler.add_job(
+            scheduled_compact_row_counts,
+            "interval",
+            minutes=settings.STATS_COMPACT_MINUTES,
+            id="compact_row_counts_job",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
+    if not scheduler.get_jobs():
+        return
     scheduler.start()
+    _scheduler = scheduler
     logging.info("🚀 Scheduler started successfully (single instance)")
+
+
+def stop_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
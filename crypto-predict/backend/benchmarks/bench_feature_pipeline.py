@@ -0,0 +1,123 @@
+"""
+⏱️ مقارنة مسار الميزات القديم (ORM → dicts → DataFrame → scaler.transform → DMatrix)
+مع المسار المُجمّع (float32 متصل → scaler خطي في المكان → inplace_predict).
+
+مثال (من مجلد backend):
+    python -m benchmarks.bench_feature_pipeline --iterations 500
+    python -m benchmarks.bench_feature_pipeline --asset-id 1 --timeframe-id 1   # يشمل جلب النافذة من قاعدة البيانات
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.services import model_registry
+from app.services.feature_pipeline import fetch_window_array
+from app.services.inference_service import InferenceService, SEQ_LEN
+
+
+# -------------------------------------------------
+# 🔹 المسار القديم كما كان في InferenceService.predict و fetch_feature_window
+# -------------------------------------------------
+def legacy_fetch(db, asset_id: int, timeframe_id: int):
+    from app.db import models
+
+    rows = db.query(models.Candle, models.Sentiment).join(
+        models.Sentiment,
+        (models.Candle.asset_id == models.Sentiment.asset_id) &
+        (models.Candle.timeframe_id == models.Sentiment.timeframe_id) &
+        (models.Candle.timestamp == models.Sentiment.timestamp)
+    ).filter(
+        models.Candle.asset_id == asset_id,
+        models.Candle.timeframe_id == timeframe_id
+    ).order_by(models.Candle.timestamp.desc()).limit(SEQ_LEN).all()
+    rows.reverse()
+
+    data_list = []
+    for candle, sentiment in rows:
+        data_list.append({
+            "open": float(candle.open), "high": float(candle.high), "low": float(candle.low),
+            "close": float(candle.close), "volume": float(candle.volume),
+            "avg_sentiment": sentiment.avg_sentiment or 0.0, "sent_count": sentiment.sent_count or 0,
+            "pos_count": sentiment.pos_count or 0, "neg_count": sentiment.neg_count or 0,
+            "neu_count": sentiment.neu_count or 0, "pos_ratio": sentiment.pos_ratio or 0.0,
+            "neg_ratio": sentiment.neg_ratio or 0.0, "neu_ratio": sentiment.neu_ratio or 0.0,
+            "has_news": sentiment.has_news or 0,
+        })
+    return pd.DataFrame(data_list), float(rows[-1][0].close)
+
+
+def legacy_predict(engine: InferenceService, df_input: pd.DataFrame):
+    import torch
+    import xgboost as xgb
+
+    X = df_input[engine.features].to_numpy(dtype=np.float64)[-SEQ_LEN:][None]
+    flat = pd.DataFrame(X.reshape(-1, len(engine.features)), columns=engine.features)
+    X_scaled = engine.scaler.transform(flat).reshape(1, SEQ_LEN, len(engine.features))
+    xgb_return = engine.xgb_model.predict(xgb.DMatrix(pd.DataFrame(X_scaled[:, -1, :], columns=engine.features)))
+    with torch.no_grad():
+        prob = torch.sigmoid(engine.lstm_model(torch.tensor(X_scaled, dtype=torch.float32)))
+    return float(xgb_return[0]), float(prob[0])
+
+
+def measure(fn, iterations: int) -> dict:
+    for _ in range(5):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings = np.array(timings)
+    return {"p50": np.percentile(timings, 50), "p95": np.percentile(timings, 95)}
+
+
+def report(name: str, r: dict):
+    print(f"{name:<28} {r['p50']:>9.3f} {r['p95']:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Feature pipeline latency benchmark")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--asset-id", type=int, default=None)
+    parser.add_argument("--timeframe-id", type=int, default=1)
+    args = parser.parse_args()
+
+    engine = InferenceService(model_registry.get_active_version())
+    if engine.lstm_model is None:
+        raise SystemExit(f"Model not loaded: {engine.load_error}")
+
+    rng = np.random.default_rng(0)
+    window = (engine.scaler.mean_ + rng.standard_normal((SEQ_LEN, len(engine.features))) * engine.scaler.scale_)
+    window = window.astype(np.float32)
+    df_input = pd.DataFrame(window.astype(np.float64), columns=engine.features)
+
+    # نفس النتيجة قبل القياس
+    new = engine.predict(window)
+    old_return, old_prob = legacy_predict(engine, df_input)
+    print(f"predicted_return legacy={old_return:.6f} compiled={new['predicted_return']:.6f}")
+    print(f"lstm_prob        legacy={old_prob:.6f} compiled={new['confidence']}")
+
+    print(f"\n{'stage':<28} {'p50 ms':>9} {'p95 ms':>9}")
+    report("predict legacy (DataFrame)", measure(lambda: legacy_predict(engine, df_input), args.iterations))
+    report("predict compiled (float32)", measure(lambda: engine.predict(window), args.iterations))
+
+    if args.asset_id is not None:
+        from app.db.session import SessionLocal
+
+        db = SessionLocal()
+        try:
+            report("fetch legacy (ORM)", measure(lambda: legacy_fetch(db, args.asset_id, args.timeframe_id), args.iterations))
+            report("fetch compiled (columns)",
+                   measure(lambda: fetch_window_array(db, args.asset_id, args.timeframe_id, SEQ_LEN), args.iterations))
+            report("end-to-end legacy", measure(
+                lambda: legacy_predict(engine, legacy_fetch(db, args.asset_id, args.timeframe_id)[0]), args.iterations))
+            report("end-to-end compiled", measure(
+                lambda: engine.predict(fetch_window_array(db, args.asset_id, args.timeframe_id, SEQ_LEN)[0]), args.iterations))
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
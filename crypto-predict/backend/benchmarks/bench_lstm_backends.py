@@ -0,0 +1,67 @@
+"""
+⏱️ مقارنة محركي الـ LSTM (torch و numpy): زمن الإقلاع البارد، الذاكرة (RSS)، وزمن التوقع.
+
+كل محرك يُقاس في process جديد حتى يشمل الإقلاع البارد استيراد المكتبات وتحميل الأوزان.
+
+مثال (من مجلد backend):
+    python -m benchmarks.bench_lstm_backends
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+CHILD = r"""
+import json, resource, sys, time
+start = time.perf_counter()
+from app.services import inference_service
+engine = inference_service.get_inference_engine()
+import numpy as np, pandas as pd
+window = pd.DataFrame(np.random.default_rng(0).standard_normal((inference_service.SEQ_LEN, len(engine.features))),
+                      columns=engine.features)
+engine.predict(window)
+cold_start = time.perf_counter() - start
+
+timings = {}
+for batch in (1, 64):
+    windows = [window] * batch
+    engine.predict_batch(windows)
+    t = time.perf_counter()
+    for _ in range(ITERATIONS):
+        engine.predict_batch(windows)
+    timings[batch] = (time.perf_counter() - t) / ITERATIONS * 1000
+
+print(json.dumps({
+    "cold_start_sec": cold_start,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "torch_imported": "torch" in sys.modules,
+    "predict_ms": timings,
+}))
+"""
+
+
+def run_backend(backend: str, iterations: int) -> dict:
+    env = dict(os.environ, LSTM_BACKEND=backend, LSTM_STREAMING="false")
+    env.setdefault("DATABASE_URL", "postgresql://bench@localhost/bench")
+    env.setdefault("JWT_SECRET", "bench")
+    code = CHILD.replace("ITERATIONS", str(iterations))
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="torch vs numpy LSTM backend benchmark")
+    parser.add_argument("--backends", nargs="+", default=["torch", "numpy"])
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'cold start s':>12} {'max RSS MB':>11} {'torch':>6} {'batch=1 ms':>11} {'batch=64 ms':>12}")
+    for backend in args.backends:
+        r = run_backend(backend, args.iterations)
+        print(f"{backend:<8} {r['cold_start_sec']:>12.2f} {r['max_rss_mb']:>11.1f} {str(r['torch_imported']):>6} "
+              f"{r['predict_ms']['1']:>11.2f} {r['predict_ms']['64']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
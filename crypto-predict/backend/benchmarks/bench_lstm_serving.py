@@ -0,0 +1,55 @@
+"""
+⏱️ قياس زمن استجابة الـ LSTM على الـ CPU لكل وضع تقديم وعدد خيوط وحجم دفعة.
+
+مثال (من مجلد backend):
+    python -m benchmarks.bench_lstm_serving --threads 1 4 --batches 1 16 64
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import torch
+
+from app.services.inference_service import MODEL_DIR, SEQ_LEN
+from app.services.lstm_service import SERVING_MODES, load_lstm, optimize_for_serving
+
+N_FEATURES = 14
+
+
+def measure(model, batch: int, iterations: int) -> dict:
+    x = torch.randn(batch, SEQ_LEN, N_FEATURES)
+    timings = []
+    with torch.no_grad():
+        for _ in range(5):
+            model(x)
+        for _ in range(iterations):
+            start = time.perf_counter()
+            model(x)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings = np.array(timings)
+    return {"p50": np.percentile(timings, 50), "p95": np.percentile(timings, 95)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LSTM serving latency benchmark")
+    parser.add_argument("--modes", nargs="+", default=list(SERVING_MODES), choices=SERVING_MODES)
+    parser.add_argument("--threads", nargs="+", type=int, default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--batches", nargs="+", type=int, default=[1, 16, 64])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    eager = load_lstm(os.path.join(MODEL_DIR, "lstm_model.pt"), N_FEATURES)
+    models = {mode: optimize_for_serving(eager, mode) for mode in args.modes}
+
+    print(f"{'mode':<10} {'threads':>7} {'batch':>6} {'p50 ms':>9} {'p95 ms':>9}")
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        for mode, model in models.items():
+            for batch in args.batches:
+                r = measure(model, batch, args.iterations)
+                print(f"{mode:<10} {threads:>7} {batch:>6} {r['p50']:>9.2f} {r['p95']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
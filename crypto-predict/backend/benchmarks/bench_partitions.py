@@ -0,0 +1,196 @@
+"""
+⏱️ خطط الاستعلامات الساخنة على جدولي الشموع والمشاعر بحجم كبير (50M صف افتراضياً):
+السجل (prices.py)، نافذة التوقع (feature_pipeline، بحدود زمنية وبدونها)، وآخر شمعة (forecast_service).
+
+البيانات تُولّد داخل schema مستقل (bench_partitions) في نفس قاعدة DATABASE_URL ولا تلمس جداول التطبيق.
+لكل استعلام: نوع المسح، Heap Fetches، عدد الـ partitions التي قُرئت فعلاً، والزمن.
+
+مثال (من مجلد backend):
+    python -m benchmarks.bench_partitions --rows 50000000 --assets 1000
+    python -m benchmarks.bench_partitions --rows 2000000 --layout plain     # الجدول القديم للمقارنة
+    python -m benchmarks.bench_partitions --skip-load                        # إعادة القياس فقط
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.dialects import postgresql
+
+from app.core.config import get_settings
+from app.db import models
+from app.db.session import Base
+from app.services.feature_pipeline import _WINDOW_COLUMNS, _bounded, WINDOW_SPAN_FACTOR
+from app.services.partition_service import _create_partition, next_month
+from app.services.inference_service import SEQ_LEN
+
+SCHEMA = "bench_partitions"
+START = datetime(2020, 1, 1)
+
+
+# -------------------------------------------------
+# 🔹 الاستعلامات كما يبنيها التطبيق
+# -------------------------------------------------
+def hot_queries(asset_id: int, latest_ts: datetime) -> dict:
+    Candle, Sentiment = models.Candle, models.Sentiment
+    history = select(Candle.timestamp, Candle.open, Candle.high, Candle.low, Candle.close).where(
+        Candle.asset_id == asset_id, Candle.timeframe_id == 1
+    ).order_by(Candle.timestamp.desc()).limit(150)
+    window = select(*_WINDOW_COLUMNS).select_from(Candle).join(
+        Sentiment,
+        (Candle.asset_id == Sentiment.asset_id) & (Candle.timeframe_id == Sentiment.timeframe_id) &
+        (Candle.timestamp == Sentiment.timestamp)
+    ).where(Candle.asset_id == asset_id, Candle.timeframe_id == 1).order_by(Candle.timestamp.desc()).limit(SEQ_LEN)
+    # نفس النافذة مع وقت آخر شمعة (مسار الـ scheduler): الأشهر الأخرى تُستبعد وقت التخطيط
+    window_bounded = _bounded(window, latest_ts, latest_ts - timedelta(hours=SEQ_LEN * WINDOW_SPAN_FACTOR))
+    latest = select(Candle.timestamp).where(
+        Candle.asset_id == asset_id, Candle.timeframe_id == 1
+    ).order_by(Candle.timestamp.desc()).limit(1)
+    return {
+        name: str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        for name, stmt in [("history", history), ("feature_window", window),
+                           ("feature_window_bounded", window_bounded), ("latest_candle", latest)]
+    }
+
+
+# -------------------------------------------------
+# 🔹 توليد البيانات
+# -------------------------------------------------
+def create_schema(engine, layout: str, months: list):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        if layout == "plain":
+            # الشكل قبل التقسيم: جدول واحد + المفتاح الطبيعي بدون أعمدة مغطّاة
+            for model in (models.Candle, models.Sentiment):
+                table, id_column = model.__tablename__, model.__table__.primary_key.columns.keys()[0]
+                key_name = next(iter(model.__table__.indexes)).name
+                sequence = conn.execute(text("SELECT pg_get_serial_sequence(:t, :c)"),
+                                        {"t": table, "c": id_column}).scalar()
+                conn.execute(text(f"CREATE TABLE {table}_plain (LIKE {table} INCLUDING DEFAULTS)"))
+                conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}_plain.{id_column}"))
+                conn.execute(text(f"DROP TABLE {table}"))
+                conn.execute(text(f"ALTER TABLE {table}_plain RENAME TO {table}"))
+                conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY ({id_column})"))
+                conn.execute(text(f"CREATE UNIQUE INDEX {key_name} ON {table} (asset_id, timeframe_id, timestamp)"))
+        else:
+            for table in ("candle_ohlcv", "sentiments"):
+                for month in months:
+                    _create_partition(conn, table, month)
+
+
+def load(engine, assets: int, hours: int):
+    end = START + timedelta(hours=hours)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO crypto_assets (asset_id, symbol) SELECT a, 'A' || a FROM generate_series(1, :n) a"),
+                     {"n": assets})
+        conn.execute(text("INSERT INTO timeframes (timeframe_id, code) VALUES (1, '1h')"))
+
+    # شهراً بشهر لكل العملات معاً (نفس ترتيب الوصول في الإدخال الحقيقي)
+    month, loaded, started = START, 0, time.perf_counter()
+    while month < end:
+        upper = min(next_month(month), end)
+        params = {"lower": month, "upper": upper - timedelta(hours=1), "assets": assets}
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO candle_ohlcv (asset_id, timeframe_id, timestamp, open, high, low, close, volume, exchange)
+                SELECT a, 1, ts, p, p * 1.01, p * 0.99, p * (1 + (random() - 0.5) / 50), random() * 1000, 'Bench'
+                FROM generate_series(1, :assets) a,
+                     generate_series(CAST(:lower AS timestamp), CAST(:upper AS timestamp), interval '1 hour') ts,
+                     LATERAL (SELECT 100 + a + random() * 10 AS p) price
+            """), params)
+            conn.execute(text("""
+                INSERT INTO sentiments (asset_id, timeframe_id, timestamp, avg_sentiment, sent_count, pos_count,
+                                        neg_count, neu_count, pos_ratio, neg_ratio, neu_ratio, has_news)
+                SELECT a, 1, ts, random() * 2 - 1, 3, 1, 1, 1, 0.33, 0.33, 0.34, 1
+                FROM generate_series(1, :assets) a,
+                     generate_series(CAST(:lower AS timestamp), CAST(:upper AS timestamp), interval '1 hour') ts
+            """), params)
+        loaded += assets * int((upper - month).total_seconds() // 3600)
+        print(f"  {month:%Y-%m}: {loaded:,} candles ({time.perf_counter() - started:.0f}s)")
+        month = upper
+
+    # الـ visibility map: بدونه كل Index Only Scan يزور الجدول (Heap Fetches)
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM ANALYZE"))
+
+
+# -------------------------------------------------
+# 🔹 القياس
+# -------------------------------------------------
+def _walk(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def explain(conn, sql: str) -> dict:
+    plan = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")).scalar()[0]
+    scans = [node for node in _walk(plan["Plan"]) if "Scan" in node["Node Type"]]
+    executed = [node for node in scans if node.get("Actual Loops", 0) > 0]
+    return {
+        "scan_types": sorted({node["Node Type"] for node in executed}),
+        "relations_read": len({node.get("Relation Name") for node in executed}),
+        "heap_fetches": sum(node.get("Heap Fetches", 0) for node in executed),
+        "shared_blocks": plan["Plan"].get("Shared Hit Blocks", 0) + plan["Plan"].get("Shared Read Blocks", 0),
+        "planning_ms": plan["Planning Time"],
+        "execution_ms": plan["Execution Time"],
+    }
+
+
+def measure(engine, assets: int, hours: int, iterations: int):
+    with engine.connect() as conn:
+        total = conn.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'candle_ohlcv'")).scalar()
+        partitions = conn.execute(text(
+            "SELECT count(*) FROM pg_inherits WHERE inhparent = CAST('candle_ohlcv' AS regclass)"
+        )).scalar()
+        print(f"\ncandle_ohlcv: ~{total:,} rows (reltuples; partitions: {partitions})")
+
+        latest_ts = START + timedelta(hours=hours - 1)
+        for name, sql in hot_queries(max(1, assets // 2), latest_ts).items():
+            info = explain(conn, sql)
+            timings = []
+            for asset_id in range(1, iterations + 1):
+                query = hot_queries((asset_id % assets) + 1, latest_ts)[name]
+                start = time.perf_counter()
+                conn.execute(text(query)).all()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            print(f"\n{name}")
+            print(f"  scans: {', '.join(info['scan_types'])}")
+            print(f"  heap fetches: {info['heap_fetches']}, relations read: {info['relations_read']}, "
+                  f"buffers: {info['shared_blocks']}")
+            print(f"  planning {info['planning_ms']:.2f} ms, execution {info['execution_ms']:.2f} ms")
+            print(f"  round trip p50 {statistics.median(timings):.2f} ms, "
+                  f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms ({iterations} assets)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000_000, help="عدد الشموع (ونفس العدد من المشاعر)")
+    parser.add_argument("--assets", type=int, default=1000)
+    parser.add_argument("--layout", choices=["partitioned", "plain"], default="partitioned")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--skip-load", action="store_true", help="القياس على بيانات مولّدة سابقاً")
+    args = parser.parse_args()
+
+    engine = create_engine(get_settings().DATABASE_URL,
+                           connect_args={"options": f"-csearch_path={SCHEMA}"})
+    hours = args.rows // args.assets
+    if not args.skip_load:
+        months, month = [], START
+        while month < START + timedelta(hours=hours):
+            months.append(month)
+            month = next_month(month)
+        print(f"Loading {args.assets * hours:,} candles ({args.assets} assets x {hours:,} hours, "
+              f"{len(months)} months, layout={args.layout}) into schema {SCHEMA}...")
+        create_schema(engine, args.layout, months)
+        load(engine, args.assets, hours)
+    measure(engine, args.assets, hours, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
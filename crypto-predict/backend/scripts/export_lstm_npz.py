@@ -0,0 +1,38 @@
+"""
+📦 تصدير أوزان الـ LSTM من lstm_model.pt إلى lstm_model.npz
+حتى يعمل الـ backend المبني على NumPy (LSTM_BACKEND=numpy) بدون torch.
+
+مثال (من مجلد backend):
+    python scripts/export_lstm_npz.py
+    python scripts/export_lstm_npz.py --src app/ml_models/lstm_model.pt --dst app/ml_models/lstm_model.npz
+"""
+import argparse
+import os
+
+import numpy as np
+import torch
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "ml_models")
+
+
+def export(src: str, dst: str) -> dict:
+    state_dict = torch.load(src, map_location="cpu")
+    weights = {name: tensor.detach().cpu().numpy().astype(np.float32) for name, tensor in state_dict.items()}
+    np.savez(dst, **weights)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export LSTM weights to .npz")
+    parser.add_argument("--src", default=os.path.join(MODEL_DIR, "lstm_model.pt"))
+    parser.add_argument("--dst", default=os.path.join(MODEL_DIR, "lstm_model.npz"))
+    args = parser.parse_args()
+
+    weights = export(args.src, args.dst)
+    for name, array in weights.items():
+        print(f"  {name:<22} {str(array.shape):<12} {array.dtype}")
+    print(f"✅ Exported {len(weights)} tensors to {args.dst}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+from app.services.ingest_service import DatasetReader
+
+ROWS = "2024-03-01 00:00:00,BTC,100,101,99,100.5,12,extra\n"
+
+
+def _write(tmp_path, header):
+    path = tmp_path / "data.csv"
+    path.write_text(header + "\n" + ROWS, encoding="utf-8")
+    return str(path)
+
+
+# -------------------------------------------------
+# 🔹 رأس CSV بعلامات تنصيص (تصدير الجداول) يحتفظ بالأعمدة المطلوبة فقط
+# -------------------------------------------------
+def test_quoted_csv_header_keeps_projection(tmp_path):
+    path = _write(tmp_path, '"open_time","symbol","open","high","low","close","volume","notes"')
+
+    reader = DatasetReader(path)
+
+    assert reader.columns == ["open_time", "symbol", "open", "high", "low", "close", "volume"]
+    df = reader.read_all()
+    assert list(df.columns) == reader.columns
+    assert df["symbol"].tolist() == ["BTC"]
+
+
+def test_plain_csv_header_with_bom(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_bytes(b"\xef\xbb\xbfopen_time,symbol,close\r\n2024-03-01 00:00:00,BTC,100.5\r\n")
+
+    reader = DatasetReader(str(path), columns=["open_time", "symbol", "close"])
+
+    assert reader.format == "csv"
+    assert reader.columns == ["open_time", "symbol", "close"]
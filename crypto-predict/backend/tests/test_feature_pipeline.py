@@ -0,0 +1,47 @@
+import os
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import MinMaxScaler, RobustScaler, StandardScaler
+
+from app.services.feature_pipeline import FEATURES, affine_from_scaler, apply_affine
+from app.services.inference_service import MODEL_DIR, SEQ_LEN
+
+
+# -------------------------------------------------
+# 🔹 الـ scaler الخطي يطابق scaler.transform (نفس توزيع البيانات الحقيقية تقريباً)
+# -------------------------------------------------
+@pytest.fixture(scope="module")
+def scaler():
+    return joblib.load(os.path.join(MODEL_DIR, "scaler.pkl"))
+
+
+def _raw_windows(scaler, n=64):
+    rng = np.random.default_rng(0)
+    return (scaler.mean_ + rng.standard_normal((n, SEQ_LEN, len(FEATURES))) * scaler.scale_).astype(np.float32)
+
+
+def test_feature_order_matches_scaler(scaler):
+    assert list(scaler.feature_names_in_) == FEATURES
+
+
+def test_affine_matches_scaler_transform(scaler):
+    X = _raw_windows(scaler)
+    expected = scaler.transform(pd.DataFrame(X.reshape(-1, len(FEATURES)).astype(np.float64), columns=FEATURES))
+
+    scale, offset = affine_from_scaler(scaler)
+    result = apply_affine(X, scale, offset)
+
+    assert result is X
+    assert np.allclose(X.reshape(-1, len(FEATURES)), expected, atol=1e-4)
+
+
+@pytest.mark.parametrize("scaler_cls", [StandardScaler, MinMaxScaler, RobustScaler])
+def test_affine_supports_common_scalers(scaler_cls):
+    rng = np.random.default_rng(1)
+    data = rng.standard_normal((200, 3)) * [1, 50, 1000] + [0, 10, 40000]
+    fitted = scaler_cls().fit(data)
+
+    scale, offset = affine_from_scaler(fitted, dtype=np.float64)
+    assert np.allclose(data * scale + offset, fitted.transform(data))
@@ -0,0 +1,39 @@
+import json
+import os
+
+import pandas as pd
+from sqlalchemy import REAL
+
+from app.db import models
+from app.services.feature_pipeline import FEATURES
+from app.services.feature_store import SENTIMENT_FILL, bucket_start
+from app.services.inference_service import MODEL_DIR
+
+
+# -------------------------------------------------
+# 🔹 مخزن الميزات فيه عمود float32 لكل ميزة يقرأها الموديل
+# -------------------------------------------------
+def test_store_has_every_model_feature():
+    with open(os.path.join(MODEL_DIR, "features.json")) as f:
+        model_features = json.load(f)
+    columns = models.FeatureRow.__table__.columns
+    for name in model_features:
+        assert isinstance(columns[name].type, REAL)
+        assert not columns[name].nullable
+
+
+def test_every_sentiment_feature_has_a_fill_rule():
+    candle = {"open", "high", "low", "close", "volume"}
+    assert set(SENTIMENT_FILL) == set(FEATURES) - candle
+
+
+# -------------------------------------------------
+# 🔹 بداية الـ bucket تطابق date_bin في الـ rollups (الأسبوع يبدأ الاثنين)
+# -------------------------------------------------
+def test_bucket_start_matches_rollup_boundaries():
+    ts = pd.Timestamp("2024-05-16 13:00")  # خميس
+    assert bucket_start(ts, "1 hour") == ts
+    assert bucket_start(ts, "4 hours") == pd.Timestamp("2024-05-16 12:00")
+    assert bucket_start(ts, "1 day") == pd.Timestamp("2024-05-16")
+    assert bucket_start(ts, "7 days") == pd.Timestamp("2024-05-13")
+    assert bucket_start(pd.Timestamp("2024-05-13"), "7 days") == pd.Timestamp("2024-05-13")
@@ -0,0 +1,274 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sqlalchemy import func, inspect, text
+from sqlalchemy.orm import Session
+
+from app.db import models
+from app.services import forecast_service, inference_executor
+from app.services.feature_pipeline import FEATURES
+from app.services.prediction_service import commit_keep_loaded, forecast_rows, save_forecasts
+
+T0 = datetime(2024, 3, 1, 10)
+T1 = T0 + timedelta(hours=1)
+
+
+@pytest.fixture
+def market(db):
+    # partition واحد لكل التواريخ داخل معاملة الاختبار (يُلغى مع الـ Rollback)
+    for table in ("candle_ohlcv", "feature_store"):
+        db.execute(text(f"CREATE TABLE {table}_test PARTITION OF {table} FOR VALUES FROM (MINVALUE) TO (MAXVALUE)"))
+    asset = models.CryptoAsset(symbol="TST", name="Test")
+    tf = models.Timeframe(code="1h", description="Hourly")
+    db.add_all([asset, tf])
+    db.flush()
+    return asset, tf
+
+
+def _add_candle(db, asset, tf, ts, close=100):
+    db.add(models.Candle(asset_id=asset.asset_id, timeframe_id=tf.timeframe_id, timestamp=ts,
+                         open=close, high=close, low=close, close=close, volume=1))
+    db.flush()
+
+
+def _save(db, asset, tf, source_ts, version, predicted_return=0.01):
+    ai_output = {"predicted_return": predicted_return, "confidence": 0.9, "model_version": version}
+    saved = save_forecasts(db, forecast_rows(ai_output, 100.0, asset.asset_id, asset.symbol,
+                                             tf.timeframe_id, source_ts=source_ts))
+    db.commit()
+    return saved
+
+
+# -------------------------------------------------
+# 🔹 آخر توقع مشترك: الخطوات الخمس لأحدث شمعة مصدر، تصاعدياً
+# -------------------------------------------------
+def test_latest_forecast_returns_newest_source_in_step_order(db, market):
+    asset, tf = market
+    _save(db, asset, tf, T0, "v1")
+    newest = _save(db, asset, tf, T1, "v1")
+
+    forecast = forecast_service.latest_forecast(db, asset.asset_id, tf.timeframe_id)
+
+    assert [p.step for p in forecast] == [1, 2, 3, 4, 5]
+    assert {p.source_ts for p in forecast} == {T1}
+    assert [p.id_Prediction for p in forecast] == [p.id_Prediction for p in newest]
+
+
+def test_latest_forecast_empty_without_shared_forecast(db, market):
+    asset, tf = market
+    assert forecast_service.latest_forecast(db, asset.asset_id, tf.timeframe_id) == []
+
+
+def test_latest_forecast_prefers_last_saved_version(db, market):
+    # الاسم الاحتياطي أكبر أبجدياً من أرقام النسخ (تبدأ بتاريخ)، فالترتيب يجب ألا يعتمد عليه
+    asset, tf = market
+    _save(db, asset, tf, T0, "XGB-LSTM_Hybrid")
+    _save(db, asset, tf, T0, "20260101000000-abcde")
+
+    forecast = forecast_service.latest_forecast(db, asset.asset_id, tf.timeframe_id)
+
+    assert [p.model_used for p in forecast] == ["20260101000000-abcde"] * 5
+    assert [p.step for p in forecast] == [1, 2, 3, 4, 5]
+
+
+# -------------------------------------------------
+# 🔹 الحفظ: التوقع المكرر لا يُكتب مرة ثانية بل تُرجع صفوفه الموجودة
+# -------------------------------------------------
+def _count_shared(db):
+    return db.query(func.count(models.Prediction.id_Prediction)).filter(models.Prediction.user_id.is_(None)).scalar()
+
+
+def test_duplicate_save_returns_existing_rows(db, market):
+    asset, tf = market
+    first = _save(db, asset, tf, T0, "v1")
+    again = _save(db, asset, tf, T0, "v1", predicted_return=0.5)
+
+    assert [p.id_Prediction for p in again] == [p.id_Prediction for p in first]
+    assert [p.predicted_price for p in again] == [p.predicted_price for p in first]
+    assert _count_shared(db) == 5
+
+
+def test_partial_duplicate_save_mixes_new_and_existing(db, market):
+    asset, tf = market
+    other = models.CryptoAsset(symbol="OTH", name="Other")
+    db.add(other)
+    db.flush()
+    existing = _save(db, asset, tf, T0, "v1")
+
+    ai_output = {"predicted_return": 0.01, "confidence": 0.9, "model_version": "v1"}
+    rows = [*forecast_rows(ai_output, 100.0, asset.asset_id, asset.symbol, tf.timeframe_id, source_ts=T0),
+            *forecast_rows(ai_output, 50.0, other.asset_id, other.symbol, tf.timeframe_id, source_ts=T0)]
+    saved = save_forecasts(db, rows)
+
+    assert len(saved) == 10
+    assert [p.id_Prediction for p in saved if p.asset_id == asset.asset_id] == [p.id_Prediction for p in existing]
+    assert _count_shared(db) == 10
+
+
+def test_commit_keep_loaded_leaves_rows_loaded(db, market):
+    asset, tf = market
+    ai_output = {"predicted_return": 0.01, "confidence": 0.9, "model_version": "v1"}
+    saved = save_forecasts(db, forecast_rows(ai_output, 100.0, asset.asset_id, asset.symbol,
+                                             tf.timeframe_id, source_ts=T0))
+    commit_keep_loaded(db)
+
+    assert all(not inspect(p).expired_attributes for p in saved)
+    assert db.expire_on_commit is True
+
+
+# -------------------------------------------------
+# 🔹 سجل الوصول: صف واحد لكل توقع (لا لكل خطوة) عبر جلسة مستقلة
+# -------------------------------------------------
+def test_record_access_logs_one_row_per_forecast(db, market, monkeypatch):
+    asset, tf = market
+    user = models.User(User_Name="reader", email="reader@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    forecast = _save(db, asset, tf, T0, "v1")
+    monkeypatch.setattr(forecast_service, "SessionLocal", lambda: Session(bind=db.connection()))
+
+    forecast_service.record_access(user.user_id, forecast)
+
+    access = db.query(models.PredictionAccess).all()
+    assert [(a.user_id, a.asset_id, a.source_ts, a.model_used) for a in access] == \
+        [(user.user_id, asset.asset_id, T0, "v1")]
+
+
+# -------------------------------------------------
+# 🔹 هيدرات العمر والتقادم
+# -------------------------------------------------
+def _forecast(source_ts, created_at):
+    return [SimpleNamespace(source_ts=source_ts, created_at=created_at)]
+
+
+def test_freshness_headers_report_source_and_age():
+    headers = forecast_service.freshness_headers(_forecast(T0, forecast_service._utcnow() - timedelta(seconds=90)))
+    assert headers["X-Forecast-Source-Ts"] == T0.isoformat()
+    assert 89 <= float(headers["X-Forecast-Age-Sec"]) < 120
+    assert "X-Forecast-Stale" not in headers
+
+
+def test_freshness_headers_flag_forecast_older_than_latest_candle():
+    forecast = _forecast(T0, None)
+    assert forecast_service.freshness_headers(forecast, T0)["X-Forecast-Stale"] == "false"
+    assert forecast_service.freshness_headers(forecast, T1)["X-Forecast-Stale"] == "true"
+    assert forecast_service.freshness_headers(forecast)["X-Forecast-Age-Sec"] == ""
+
+
+def test_freshness_headers_flag_forecast_older_than_its_features():
+    forecast = _forecast(T0, T1)
+    assert forecast_service.freshness_headers(forecast, T0, T0)["X-Forecast-Stale"] == "false"
+    assert forecast_service.freshness_headers(forecast, T0, T1 + timedelta(seconds=1))["X-Forecast-Stale"] == "true"
+
+
+# -------------------------------------------------
+# 🔹 توقع أقدم من آخر شمعة يُعاد حسابه عند القراءة (بدون scheduler)
+# -------------------------------------------------
+@pytest.fixture
+def engine_stub(monkeypatch):
+    calls = []
+
+    def collect_inputs(db, due):
+        calls.append(due)
+        return [(item, np.zeros((48, 14), dtype=np.float32), 100.0) for item in due], [None] * len(due), []
+
+    async def predict_batch(windows, keys=None):
+        return [{"predicted_return": 0.02, "confidence": 0.8, "model_version": "v2"} for _ in windows]
+
+    monkeypatch.setattr(forecast_service, "_collect_inputs", collect_inputs)
+    monkeypatch.setattr(inference_executor, "predict_batch", predict_batch)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_stale_forecast_is_recomputed(db, market, engine_stub):
+    asset, tf = market
+    _add_candle(db, asset, tf, T0)
+    _save(db, asset, tf, T0, "v1")
+    _add_candle(db, asset, tf, T1)
+
+    forecast, latest_ts, _ = await forecast_service.ensure_forecast_async(db, asset, tf.timeframe_id)
+
+    assert latest_ts == T1
+    assert {p.source_ts for p in forecast} == {T1}
+    assert forecast_service.freshness_headers(forecast, latest_ts)["X-Forecast-Stale"] == "false"
+
+
+@pytest.mark.asyncio
+async def test_fresh_forecast_is_read_only(db, market, engine_stub):
+    asset, tf = market
+    _add_candle(db, asset, tf, T0)
+    saved = _save(db, asset, tf, T0, "v1")
+
+    forecast, _, _ = await forecast_service.ensure_forecast_async(db, asset, tf.timeframe_id)
+
+    assert [p.id_Prediction for p in forecast] == [p.id_Prediction for p in saved]
+    assert engine_stub == []
+
+
+@pytest.mark.asyncio
+async def test_stale_forecast_served_when_engine_is_busy(db, market, engine_stub, monkeypatch):
+    asset, tf = market
+    _add_candle(db, asset, tf, T0)
+    _save(db, asset, tf, T0, "v1")
+    _add_candle(db, asset, tf, T1)
+
+    async def busy(windows, keys=None):
+        raise inference_executor.InferenceQueueFull("busy")
+    monkeypatch.setattr(inference_executor, "predict_batch", busy)
+
+    forecast, latest_ts, _ = await forecast_service.ensure_forecast_async(db, asset, tf.timeframe_id)
+
+    assert {p.source_ts for p in forecast} == {T0}
+    assert forecast_service.freshness_headers(forecast, latest_ts)["X-Forecast-Stale"] == "true"
+
+
+# -------------------------------------------------
+# 🔹 مشاعر متأخرة بعد حساب التوقع: نفس شمعة المصدر، لكن النافذة تغيرت فيُعاد الحساب
+# -------------------------------------------------
+def _touch_features(db, asset, tf, ts, updated_at):
+    features = dict.fromkeys(FEATURES, 0.0)
+    db.add(models.FeatureRow(asset_id=asset.asset_id, timeframe_id=tf.timeframe_id, timestamp=ts,
+                             **features, price=100.0, updated_at=updated_at))
+    db.flush()
+
+
+def test_status_marks_forecast_older_than_its_features_stale(db, market):
+    asset, tf = market
+    _add_candle(db, asset, tf, T0)
+    saved = _save(db, asset, tf, T0, "v1")
+    _touch_features(db, asset, tf, T0 - timedelta(hours=1), saved[0].created_at - timedelta(minutes=5))
+
+    def status():
+        return [item for item in forecast_service.forecast_status(db, tf.timeframe_id) if item["asset"] == asset]
+
+    assert [item["stale"] for item in status()] == [False]
+
+    _touch_features(db, asset, tf, T0, saved[0].created_at + timedelta(minutes=5))
+
+    assert [(item["stale"], item["forecast_source"]) for item in status()] == [(True, T0)]
+
+
+@pytest.mark.asyncio
+async def test_forecast_recomputed_after_late_sentiments(db, market, engine_stub):
+    asset, tf = market
+    _add_candle(db, asset, tf, T0)
+    saved = _save(db, asset, tf, T0, "v2")
+    old_ids = [p.id_Prediction for p in saved]
+    old_prices = [p.predicted_price for p in saved]
+    _touch_features(db, asset, tf, T0, forecast_service._utcnow())
+
+    forecast, latest_ts, features_at = await forecast_service.ensure_forecast_async(db, asset, tf.timeframe_id)
+
+    # نفس المفتاح (شمعة المصدر والنسخة): الصفوف نفسها تُستبدل بالقيم الجديدة
+    assert len(engine_stub) == 1
+    assert [p.id_Prediction for p in forecast] == old_ids
+    assert [p.predicted_price for p in forecast] != old_prices
+    assert _count_shared(db) == 5
+    assert forecast_service.freshness_headers(forecast, latest_ts, features_at)["X-Forecast-Stale"] == "false"
+
+    # القراءة التالية لا تعيد الحساب
+    await forecast_service.ensure_forecast_async(db, asset, tf.timeframe_id)
+    assert len(engine_stub) == 1
@@ -0,0 +1,7 @@
+# -------------------------------------------------
+# 🔹 المسارات async تعمل على قاعدة الاختبار (override لـ get_async_db في conftest)
+# -------------------------------------------------
+def test_health_reaches_test_database(client):
+    response = client.get("/api/health/")
+    assert response.status_code == 200
+    assert response.json()["database"] == "Connected"
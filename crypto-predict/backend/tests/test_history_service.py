@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+
+from app.services.history_service import _ORIGIN, bucket_width
+
+
+# -------------------------------------------------
+# 🔹 عرض الـ bucket: حجم الرد لا يتجاوز max_points مهما طال المدى
+# -------------------------------------------------
+def test_short_range_is_not_downsampled():
+    start = datetime(2024, 1, 1)
+    assert bucket_width(start, start + timedelta(hours=149), timedelta(hours=1), 150) is None
+    assert bucket_width(start, start + timedelta(hours=150), timedelta(hours=1), 150) == timedelta(hours=2)
+
+
+def test_bucket_count_never_exceeds_max_points():
+    step = timedelta(hours=1)
+    for max_points in (2, 37, 150, 500):
+        for hours in (200, 1001, 8760, 50_000):
+            for offset in range(0, 48, 7):
+                start = datetime(2023, 1, 1) + timedelta(hours=offset)
+                end = start + timedelta(hours=hours)
+                width = bucket_width(start, end, step, max_points)
+                if width is None:
+                    assert hours + 1 <= max_points
+                    continue
+                first, last = (start - _ORIGIN) // width, (end - _ORIGIN) // width
+                assert width % step == timedelta(0)
+                assert last - first + 1 <= max_points
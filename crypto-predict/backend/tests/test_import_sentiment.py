@@ -0,0 +1,35 @@
+import importlib.util
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from app.services import ingest_service
+
+# أداة الاستيراد في جذر المستودع (خارج الباك إند)
+SCRIPT = Path(__file__).resolve().parents[3] / "import_sentiment.py"
+
+
+@pytest.fixture(scope="module")
+def importer():
+    if not SCRIPT.exists():
+        pytest.skip("import_sentiment.py is not part of this checkout")
+    spec = importlib.util.spec_from_file_location("import_sentiment", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# -------------------------------------------------
+# 🔹 الرموز بحالات أحرف مختلفة = عملة واحدة ومجموعة واحدة (لا صفوف تضيع)
+# -------------------------------------------------
+def test_mixed_case_symbols_share_one_group(db, importer):
+    df = pd.DataFrame({"symbol": ["btc", "BTC", "eth"], "sent_count": [1, 2, 3]})
+    df["asset_id"] = ingest_service.resolve_asset_ids(db, df["symbol"])
+
+    groups = importer.group_by_asset(df)
+
+    assert sorted(symbol for symbol, _ in groups.values()) == ["BTC", "ETH"]
+    assert sum(len(frame) for _, frame in groups.values()) == 3
+    btc = next(frame for symbol, frame in groups.values() if symbol == "BTC")
+    assert btc["sent_count"].tolist() == [1, 2]
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers import predict
+from app.schemas.prediction_schema import BatchPredictionRequest
+from app.services import inference_executor, inference_service
+
+MAX_PENDING = 2
+RUN_SEC = 0.05
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """
+    طابور بخانتين و"pool" من عامل واحد (threads بدل العمليات)، ومحرك stub ينتظر release
+    ثم يستغرق RUN_SEC: الطلب الثاني ينتظر الأول، فيظهر في wait_ms.
+    """
+    state = SimpleNamespace(calls=0, release=threading.Event())
+
+    class _Engine:
+        def predict_batch(self, windows, keys=None):
+            state.calls += 1
+            assert state.release.wait(5)
+            time.sleep(RUN_SEC)
+            return [{"window": w} for w in windows]
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(inference_executor.settings, "INFERENCE_WORKERS", 1)
+    monkeypatch.setattr(inference_executor.settings, "INFERENCE_MAX_PENDING", MAX_PENDING)
+    monkeypatch.setattr(inference_executor, "_slots", threading.BoundedSemaphore(MAX_PENDING))
+    monkeypatch.setattr(inference_executor, "_get_pool", lambda: pool)
+    monkeypatch.setattr(inference_executor, "_counters", {"submitted": 0, "completed": 0, "rejected": 0, "failed": 0})
+    monkeypatch.setattr(inference_executor, "_wait_ms", deque(maxlen=inference_executor.METRICS_WINDOW))
+    monkeypatch.setattr(inference_executor, "_run_ms", deque(maxlen=inference_executor.METRICS_WINDOW))
+    monkeypatch.setattr(inference_service, "get_inference_engine", lambda: _Engine())
+    yield state
+    state.release.set()
+    pool.shutdown(wait=True)
+
+
+async def _fill_queue():
+    tasks = [asyncio.create_task(inference_executor.predict_batch([i])) for i in range(MAX_PENDING)]
+    # نترك المهام تحجز خاناتها قبل الطلب التالي
+    while inference_executor.stats()["queue_depth"] < MAX_PENDING:
+        await asyncio.sleep(0.001)
+    return tasks
+
+
+# -------------------------------------------------
+# 🔹 الطابور ممتلئ: InferenceQueueFull فوراً، والـ endpoint يردّ بـ 503 و Retry-After
+# -------------------------------------------------
+@pytest.mark.asyncio
+async def test_full_queue_rejects_immediately(engine):
+    tasks = await _fill_queue()
+
+    with pytest.raises(inference_executor.InferenceQueueFull):
+        await inference_executor.predict_batch([99])
+    assert inference_executor.stats()["rejected"] == 1
+
+    engine.release.set()
+    assert await asyncio.gather(*tasks) == [[{"window": 0}], [{"window": 1}]]
+    # الخانات عادت: الطلب التالي يُقبل
+    assert await inference_executor.predict_batch([2]) == [{"window": 2}]
+
+
+@pytest.mark.asyncio
+async def test_batch_endpoint_returns_503_when_queue_is_full(engine, monkeypatch):
+    async def generate(db, assets, timeframe_id, user_id):
+        return await inference_executor.predict_batch([asset.asset_id for asset in assets])
+
+    monkeypatch.setattr(predict, "get_timeframe", lambda db, code: SimpleNamespace(timeframe_id=1))
+    monkeypatch.setattr(predict, "get_assets", lambda db, symbols: [SimpleNamespace(asset_id=1)])
+    monkeypatch.setattr(predict, "generate_batch_predictions_async", generate)
+    tasks = await _fill_queue()
+
+    with pytest.raises(HTTPException) as error:
+        await predict.get_batch_predictions(BatchPredictionRequest(symbols=["BTC"]), db=None,
+                                            current_user=SimpleNamespace(user_id=1))
+
+    assert error.value.status_code == 503
+    assert error.value.headers == {"Retry-After": "1"}
+    engine.release.set()
+    await asyncio.gather(*tasks)
+
+
+# -------------------------------------------------
+# 🔹 المقاييس: wait_ms = الانتظار خلف الطلب السابق، run_ms = زمن المحرك
+# -------------------------------------------------
+@pytest.mark.asyncio
+async def test_wait_and_run_metrics(engine):
+    tasks = await _fill_queue()
+    engine.release.set()
+    await asyncio.gather(*tasks)
+
+    stats = inference_executor.stats()
+    assert (stats["submitted"], stats["completed"], stats["queue_depth"]) == (2, 2, 0)
+    assert stats["mode"] == "process_pool"
+    assert stats["run_ms"]["avg"] >= RUN_SEC * 1000 * 0.9
+    # الطلب الثاني انتظر تنفيذ الأول كاملاً، والأول لم ينتظر تقريباً
+    assert stats["wait_ms"]["max"] >= RUN_SEC * 1000 * 0.9
+    assert min(inference_executor._wait_ms) < RUN_SEC * 1000
@@ -0,0 +1,136 @@
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import ingest_jobs, ingest_service
+
+MAX_PENDING = 2
+
+
+class _Session:
+    def __init__(self):
+        self.rolled_back = False
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    """
+    طابور بحجم 2 وعامل واحد، ومهمة stub بدل التحميل الفعلي: تنتظر release ثم تنجح،
+    أو تفشل إذا كان محتوى الملف "fail". لا قاعدة بيانات.
+    """
+    state = SimpleNamespace(started=threading.Event(), release=threading.Event(), sessions=[], paths=[])
+
+    def session():
+        state.sessions.append(_Session())
+        return state.sessions[-1]
+
+    def ingest_stream(db, path, timeframe_id, chunk_rows, progress, on_conflict):
+        state.paths.append(path)
+        state.started.set()
+        assert state.release.wait(5)
+        with open(path, "rb") as f:
+            if f.read() == b"fail":
+                raise ValueError("bad file")
+        progress.add_chunk(10, 10, 4, progress.total_bytes)
+        progress.finish()
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(ingest_jobs, "_slots", threading.BoundedSemaphore(MAX_PENDING))
+    monkeypatch.setattr(ingest_jobs.settings, "INGEST_MAX_PENDING", MAX_PENDING)
+    monkeypatch.setattr(ingest_jobs, "_executor", executor)
+    monkeypatch.setattr(ingest_jobs, "_jobs", OrderedDict())
+    monkeypatch.setattr(ingest_jobs, "SessionLocal", session)
+    monkeypatch.setattr(ingest_service, "get_or_create_timeframe", lambda db, code, desc: SimpleNamespace(timeframe_id=1))
+    monkeypatch.setattr(ingest_service, "DatasetReader", lambda path: path)
+    monkeypatch.setattr(ingest_service, "ingest_stream", ingest_stream)
+    yield state
+    state.release.set()
+    executor.shutdown(wait=True)
+
+
+def _submit(content=b"ok"):
+    return ingest_jobs.submit_upload(io.BytesIO(content), "data.csv")
+
+
+def _wait_finished(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.state not in ("completed", "failed"):
+        assert time.monotonic() < deadline, f"job still {job.state}"
+        time.sleep(0.01)
+
+
+# -------------------------------------------------
+# 🔹 حد الطابور: بعد INGEST_MAX_PENDING مهمة معلّقة يرد الـ endpoint بـ 503 و Retry-After
+# -------------------------------------------------
+def test_upload_rejected_when_queue_is_full(jobs):
+    client = TestClient(app)
+
+    def upload():
+        return client.post("/api/admin/upload-dataset", files={"file": ("data.csv", b"ok", "text/csv")})
+
+    assert [upload().status_code for _ in range(MAX_PENDING)] == [202] * MAX_PENDING
+    rejected = upload()
+    assert rejected.status_code == 503
+    assert rejected.headers["Retry-After"] == "30"
+    assert len(ingest_jobs.list_jobs()) == MAX_PENDING
+
+    # انتهاء المهام يعيد الأماكن
+    jobs.release.set()
+    for job in list(ingest_jobs._jobs.values()):
+        _wait_finished(job)
+    assert upload().status_code == 202
+
+
+# -------------------------------------------------
+# 🔹 الحالات: queued → running → completed، والملف المؤقت يُحذف بعد المهمة
+# -------------------------------------------------
+def test_job_state_transitions(jobs):
+    first, second = _submit(), _submit()
+    assert jobs.started.wait(5)
+
+    assert (first.state, second.state) == ("running", "queued")
+    assert ingest_jobs.queue_depth() == 1
+    assert ingest_jobs.get_job(second.job_id) is second
+
+    jobs.release.set()
+    _wait_finished(first)
+    _wait_finished(second)
+
+    status = ingest_jobs.get_job(first.job_id).as_dict()
+    assert (status["state"], status["candles"], status["percent"], status["error"]) == ("completed", 10, 100.0, None)
+    assert status["started_at"] <= status["finished_at"]
+    assert ingest_jobs.queue_depth() == 0
+    assert not any(os.path.exists(path) for path in jobs.paths)
+
+
+# -------------------------------------------------
+# 🔹 مهمة فاشلة: الحالة failed مع رسالة الخطأ، rollback، والمكان في الطابور يعود
+# -------------------------------------------------
+def test_failed_job_reports_error_and_releases_slot(jobs):
+    jobs.release.set()
+    job = _submit(b"fail")
+    _wait_finished(job)
+
+    assert job.as_dict()["state"] == "failed"
+    assert job.error == "bad file"
+    assert jobs.sessions[0].rolled_back
+    assert not os.path.exists(jobs.paths[0])
+
+    # المهمة الفاشلة لا تحجز مكاناً: يمكن إرسال MAX_PENDING مهمة جديدة
+    for job in [_submit() for _ in range(MAX_PENDING)]:
+        _wait_finished(job)
+        assert job.state == "completed"
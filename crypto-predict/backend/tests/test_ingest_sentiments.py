@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from app.db import models
+from app.services import ingest_service, prediction_service, rollup_service
+from app.services.feature_store import SENTIMENT_FILL, update_features
+from app.services.prediction_cache import make_key
+
+START = datetime(2024, 3, 4)  # اثنين: بداية bucket لكل الفترات
+HOURS = 8
+
+
+@pytest.fixture
+def hourly(db, monkeypatch):
+    """عملة بـ 8 شموع ساعية (bucketان 4h مغلقان) بدون مشاعر، و partitions تغطي كل التواريخ"""
+    for table in ("candle_ohlcv", "sentiments", "feature_store"):
+        db.execute(text(f"CREATE TABLE {table}_test PARTITION OF {table} FOR VALUES FROM (MINVALUE) TO (MAXVALUE)"))
+    asset = models.CryptoAsset(symbol="TST", name="Test")
+    timeframes = {code: models.Timeframe(code=code, description=description)
+                  for code, _, description in [rollup_service.BASE_TIMEFRAME] + rollup_service.ROLLUP_TIMEFRAMES}
+    db.add_all([asset, *timeframes.values()])
+    db.flush()
+    # الفترات من قاعدة الاختبار (timeframe_ids تقرأ عبر جلسة التطبيق)
+    monkeypatch.setattr(rollup_service, "_timeframe_ids", {code: tf.timeframe_id for code, tf in timeframes.items()})
+    # partition_service ينشئ الأشهر عبر engine التطبيق، والـ partition أعلاه يغطيها
+    monkeypatch.setattr(ingest_service, "ensure_partitions_for", lambda frame: [])
+    base_id = timeframes["1h"].timeframe_id
+    db.add_all([
+        models.Candle(asset_id=asset.asset_id, timeframe_id=base_id, timestamp=START + timedelta(hours=h),
+                      open=100, high=101, low=99, close=100, volume=1)
+        for h in range(HOURS)
+    ])
+    db.flush()
+    return asset, timeframes
+
+
+def _sentiment_frame(asset, base_id, hours, sent_count=2):
+    rows = pd.DataFrame({
+        "open_time": [(START + timedelta(hours=h)).isoformat() for h in hours],
+        "avg_sentiment": 0.5, "sent_count": sent_count, "pos_count": sent_count, "neg_count": 0, "neu_count": 0,
+        "pos_ratio": 1.0, "neg_ratio": 0.0, "neu_ratio": 0.0, "has_news": 1,
+    })
+    asset_ids = pd.Series(asset.asset_id, index=rows.index)
+    return ingest_service.build_sentiment_frame(rows, asset_ids, base_id)
+
+
+# -------------------------------------------------
+# 🔹 مشاعر بدون شموع جديدة تُحدّث الفترات المجمّعة أيضاً
+# -------------------------------------------------
+def test_sentiment_only_import_updates_rollups(db, hourly):
+    asset, timeframes = hourly
+    frame = _sentiment_frame(asset, timeframes["1h"].timeframe_id, range(HOURS))
+
+    assert ingest_service.ingest_sentiments(db, frame) == HOURS
+
+    rollups = db.query(models.Sentiment.timestamp, models.Sentiment.sent_count).filter(
+        models.Sentiment.asset_id == asset.asset_id,
+        models.Sentiment.timeframe_id == timeframes["4h"].timeframe_id,
+    ).order_by(models.Sentiment.timestamp).all()
+    assert [(ts.replace(tzinfo=None), count) for ts, count in rollups] == [
+        (START, 8), (START + timedelta(hours=4), 8),
+    ]
+
+
+def test_sentiment_only_import_ensures_partitions(db, hourly, monkeypatch):
+    # لا يوجد partition افتراضي، فأشهر المشاعر تُنشأ قبل الإدخال حتى بدون شموع فيها
+    asset, timeframes = hourly
+    frame = _sentiment_frame(asset, timeframes["1h"].timeframe_id, range(HOURS))
+    covered = []
+    monkeypatch.setattr(ingest_service, "ensure_partitions_for", lambda f: covered.append(f["timestamp"].tolist()))
+
+    ingest_service.ingest_sentiments(db, frame)
+
+    assert covered == [frame["timestamp"].tolist()]
+
+
+# -------------------------------------------------
+# 🔹 مخزن الميزات: ساعة بدون صف مشاعر = أصفار، ومشاعر متأخرة تستبدلها
+# -------------------------------------------------
+def _stored_sentiment(db, asset, timeframe_id):
+    rows = db.query(models.FeatureRow).filter(
+        models.FeatureRow.asset_id == asset.asset_id,
+        models.FeatureRow.timeframe_id == timeframe_id,
+    ).order_by(models.FeatureRow.timestamp).all()
+    return [(row.timestamp, row.sent_count, row.avg_sentiment, row.has_news) for row in rows]
+
+
+def test_late_sentiments_replace_feature_fill(db, hourly):
+    asset, timeframes = hourly
+    base_id, rollup_id = timeframes["1h"].timeframe_id, timeframes["4h"].timeframe_id
+    candles = pd.DataFrame({
+        "asset_id": asset.asset_id, "timeframe_id": base_id,
+        "timestamp": [START + timedelta(hours=h) for h in range(HOURS)],
+    })
+    rollup_service.update_rollups(db, candles)
+    update_features(db, candles)
+
+    # الشموع وصلت قبل مشاعرها: كل الساعات (والـ buckets المجمّعة) بقيم SENTIMENT_FILL
+    hours = [START + timedelta(hours=h) for h in range(HOURS)]
+    assert set(SENTIMENT_FILL.values()) == {0}
+    assert _stored_sentiment(db, asset, base_id) == [(ts, 0, 0, 0) for ts in hours]
+    assert _stored_sentiment(db, asset, rollup_id) == [(START, 0, 0, 0), (START + timedelta(hours=4), 0, 0, 0)]
+
+    ingest_service.ingest_sentiments(db, _sentiment_frame(asset, base_id, range(4)))
+
+    assert _stored_sentiment(db, asset, base_id) == \
+        [(ts, 2, 0.5, 1) for ts in hours[:4]] + [(ts, 0, 0, 0) for ts in hours[4:]]
+    assert _stored_sentiment(db, asset, rollup_id) == [(START, 8, 0.5, 1), (START + timedelta(hours=4), 0, 0, 0)]
+
+
+# -------------------------------------------------
+# 🔹 مفتاح الكاش: مشاعر متأخرة تغيّر آخر تعديل في النافذة، وإعادة نفس البيانات لا تغيّره
+# -------------------------------------------------
+def test_late_sentiments_change_prediction_cache_key(db, hourly):
+    asset, timeframes = hourly
+    base_id = timeframes["1h"].timeframe_id
+    candles = pd.DataFrame({
+        "asset_id": asset.asset_id, "timeframe_id": base_id,
+        "timestamp": [START + timedelta(hours=h) for h in range(HOURS)],
+    })
+    update_features(db, candles)
+    latest_ts = START + timedelta(hours=HOURS - 1)
+
+    def key():
+        features_at = prediction_service.features_updated_at(db, asset.asset_id, base_id)
+        return make_key(asset.asset_id, base_id, latest_ts, "v1", features_at)
+
+    before = key()
+    ingest_service.ingest_sentiments(db, _sentiment_frame(asset, base_id, range(4)))
+    after = key()
+    # نفس الملف مرة ثانية: لا قيم تتغير في المخزن
+    ingest_service.ingest_sentiments(db, _sentiment_frame(asset, base_id, range(4)))
+
+    assert after != before
+    assert key() == after
+    assert before.startswith(f"predcache:{asset.asset_id}:")
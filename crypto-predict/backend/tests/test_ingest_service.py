@@ -0,0 +1,227 @@
+import importlib.util
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import pytest
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from app.db import models
+from app.services import ingest_service
+from app.services.ingest_service import CANDLE_COLUMNS, SENTIMENT_COLUMNS
+
+
+@pytest.fixture
+def timeframe(db):
+    for table in ("candle_ohlcv", "sentiments"):
+        db.execute(text(f"CREATE TABLE {table}_test PARTITION OF {table} FOR VALUES FROM (MINVALUE) TO (MAXVALUE)"))
+    tf = models.Timeframe(code="1h", description="Hourly")
+    db.add(tf)
+    db.flush()
+    return tf
+
+
+def _dataset(open_times, symbols=None, **columns):
+    n = len(open_times)
+    df = pd.DataFrame({
+        "open_time": open_times, "symbol": symbols or ["BTC"] * n,
+        "open": 100.0, "high": 101.0, "low": 99.0, "close": 100.5, "volume": 12.0,
+    })
+    for name, values in columns.items():
+        df[name] = values
+    return df
+
+
+# -------------------------------------------------
+# 🔹 الرموز → asset_id: بدون حساسية لحالة الأحرف، والعملات الجديدة تُضاف مرة واحدة
+# -------------------------------------------------
+def test_resolve_asset_ids_is_case_insensitive(db):
+    existing = models.CryptoAsset(symbol="Btc", name="Bitcoin")
+    db.add(existing)
+    db.flush()
+    symbols = pd.Series(["btc", "BTC", "eth", "Eth"], index=[10, 11, 12, 13])
+
+    ids = ingest_service.resolve_asset_ids(db, symbols)
+
+    assert list(ids.index) == [10, 11, 12, 13]
+    assert ids[10] == ids[11] == existing.asset_id
+    assert ids[12] == ids[13] != existing.asset_id
+    created = db.query(models.CryptoAsset).filter(models.CryptoAsset.asset_id == int(ids[12])).one()
+    assert created.symbol == "ETH"
+    assert db.query(models.CryptoAsset).count() == 2
+
+
+# -------------------------------------------------
+# 🔹 الأوقات: بدون timezone = UTC، والإزاحة تُحوَّل إلى UTC قبل الـ COPY
+# -------------------------------------------------
+def test_candle_timestamps_are_stored_as_utc(db, timeframe):
+    asset = models.CryptoAsset(symbol="BTC", name="BTC")
+    db.add(asset)
+    db.flush()
+    for open_time in ["2024-03-01 00:00:00", "2024-03-01T03:00:00+02:00"]:
+        df = _dataset([open_time])
+        candles = ingest_service.build_candle_frame(df, pd.Series(asset.asset_id, index=df.index),
+                                                    timeframe.timeframe_id)
+        assert str(candles["timestamp"].dt.tz) == "UTC"
+        assert ingest_service.copy_frame(db, candles, "candle_ohlcv", CANDLE_COLUMNS) == 1
+
+    stored = db.execute(text("SELECT timestamp FROM candle_ohlcv ORDER BY timestamp")).scalars().all()
+    assert stored == [datetime(2024, 3, 1, 0), datetime(2024, 3, 1, 1)]
+
+
+# -------------------------------------------------
+# 🔹 المشاعر: الساعات بدون أخبار لا تُكتب، والقيم الفارغة تصل كـ NULL
+# -------------------------------------------------
+def test_sentiment_frame_keeps_hours_with_news(timeframe):
+    df = _dataset(["2024-03-01 00:00", "2024-03-01 01:00", "2024-03-01 02:00"],
+                  avg_sentiment=[0.5, 0.0, 0.1], sent_count=[3, 0, np.nan],
+                  pos_count=[2, 0, 0], neg_count=[1, 0, 0])
+
+    sentiments = ingest_service.build_sentiment_frame(df, pd.Series(1, index=df.index), timeframe.timeframe_id)
+
+    assert len(sentiments) == 1
+    assert list(sentiments.columns) == SENTIMENT_COLUMNS
+    assert sentiments["sent_count"].dtype == "Int64"
+
+
+def test_sentiment_nan_values_are_copied_as_null(db, timeframe):
+    asset = models.CryptoAsset(symbol="BTC", name="BTC")
+    db.add(asset)
+    db.flush()
+    # neu_count والنسب غير موجودة في الملف، و avg_sentiment و neg_count فارغة في صف
+    df = _dataset(["2024-03-01 00:00", "2024-03-01 01:00"],
+                  avg_sentiment=[0.5, np.nan], sent_count=[3.0, 2.0], pos_count=[2.0, 2.0],
+                  neg_count=[1.0, np.nan], has_news=[1, 1])
+    sentiments = ingest_service.build_sentiment_frame(df, pd.Series(asset.asset_id, index=df.index),
+                                                      timeframe.timeframe_id)
+
+    assert ingest_service.copy_frame(db, sentiments, "sentiments", SENTIMENT_COLUMNS) == 2
+
+    rows = db.execute(text(
+        "SELECT timestamp, avg_sentiment, sent_count, neg_count, neu_count, pos_ratio FROM sentiments ORDER BY timestamp"
+    )).all()
+    assert [tuple(row) for row in rows] == [
+        (datetime(2024, 3, 1, 0, tzinfo=timezone.utc), 0.5, 3, 1, None, None),
+        (datetime(2024, 3, 1, 1, tzinfo=timezone.utc), None, 2, None, None, None),
+    ]
+
+
+# -------------------------------------------------
+# 🔹 merge_frame: إعادة رفع نفس الملف لا تكتب شيئاً، والمفتاح المكرر داخل الملف يُحسم
+# -------------------------------------------------
+HOURS = ["2024-03-01 00:00", "2024-03-01 01:00", "2024-03-01 02:00"]
+
+
+@pytest.fixture
+def btc(db, timeframe):
+    asset = models.CryptoAsset(symbol="BTC", name="BTC")
+    db.add(asset)
+    db.flush()
+    return asset, timeframe
+
+
+def _candles(asset, tf, open_times=HOURS, close=100.5):
+    df = _dataset(open_times)
+    df["close"] = close
+    return ingest_service.build_candle_frame(df, pd.Series(asset.asset_id, index=df.index), tf.timeframe_id)
+
+
+def _merge(db, frame, mode):
+    return ingest_service.merge_frame(db, frame, "candle_ohlcv", CANDLE_COLUMNS, mode)
+
+
+def _closes(db):
+    return [float(c) for c in db.execute(text("SELECT close FROM candle_ohlcv ORDER BY timestamp")).scalars()]
+
+
+@pytest.mark.parametrize("mode", ["ignore", "update"])
+def test_reupload_writes_nothing(db, btc, mode):
+    assert _merge(db, _candles(*btc), mode) == 3
+    assert _merge(db, _candles(*btc), mode) == 0
+    assert _closes(db) == [100.5] * 3
+
+
+def test_update_rewrites_changed_rows_only(db, btc):
+    _merge(db, _candles(*btc), "update")
+    changed = _candles(*btc)
+    changed.loc[1, "close"] = 200.0
+
+    assert _merge(db, changed, "update") == 1
+    assert _closes(db) == [100.5, 200.0, 100.5]
+
+
+def test_ignore_keeps_existing_rows(db, btc):
+    _merge(db, _candles(*btc), "ignore")
+
+    assert _merge(db, _candles(*btc, close=200.0), "ignore") == 0
+    assert _closes(db) == [100.5] * 3
+
+
+@pytest.mark.parametrize("mode", ["ignore", "update"])
+def test_duplicate_keys_in_one_file_keep_last_row(db, btc, mode):
+    frame = pd.concat([_candles(*btc, HOURS[:1], close=1.0), _candles(*btc, HOURS[:1], close=2.0)],
+                      ignore_index=True)
+
+    assert _merge(db, frame, mode) == 1
+    assert _closes(db) == [2.0]
+
+
+def test_error_mode_rejects_existing_and_duplicate_keys(db, btc):
+    assert _merge(db, _candles(*btc), "error") == 3
+
+    # COPY مباشر: أي مفتاح موجود (أو مكرر في الملف) يُفشل الدفعة كاملة
+    with pytest.raises(psycopg2.errors.UniqueViolation), db.begin_nested():
+        _merge(db, _candles(*btc), "error")
+    duplicated = pd.concat([_candles(*btc, ["2024-03-02 00:00"])] * 2, ignore_index=True)
+    with pytest.raises(psycopg2.errors.UniqueViolation), db.begin_nested():
+        _merge(db, duplicated, "error")
+    assert _closes(db) == [100.5] * 3
+
+
+def test_unknown_conflict_mode_is_rejected(db, btc):
+    with pytest.raises(ValueError):
+        _merge(db, _candles(*btc), "replace")
+
+
+# -------------------------------------------------
+# 🔹 migration المفاتيح الطبيعية: حذف المكرر (يبقى الأحدث) ثم القيد الفريد
+# -------------------------------------------------
+def _load_migration(revision):
+    path = next(Path(__file__).resolve().parents[1].glob(f"alembic/versions/{revision}_*.py"))
+    spec = importlib.util.spec_from_file_location(f"migration_{revision}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_natural_key_migration_keeps_newest_duplicate(db):
+    # الجداول كما كانت قبل الـ migration، في schema مؤقت داخل معاملة الاختبار
+    conn = db.connection()
+    conn.execute(text("CREATE SCHEMA natural_keys_test"))
+    conn.execute(text("SET LOCAL search_path TO natural_keys_test"))
+    conn.execute(text("""
+        CREATE TABLE timeframes (timeframe_id serial PRIMARY KEY, code varchar(10), description varchar(50));
+        CREATE TABLE candle_ohlcv (candle_id serial PRIMARY KEY, asset_id int, timeframe_id int,
+                                   timestamp timestamp, close numeric);
+        CREATE TABLE sentiments (id serial PRIMARY KEY, asset_id int, timestamp timestamptz, avg_sentiment float);
+        INSERT INTO timeframes (code, description) VALUES ('1h', 'Hourly');
+        INSERT INTO candle_ohlcv (asset_id, timeframe_id, timestamp, close) VALUES
+            (1, 1, '2024-03-01 00:00', 1), (1, 1, '2024-03-01 00:00', 2), (1, 1, '2024-03-01 01:00', 3),
+            (2, 1, '2024-03-01 00:00', 4);
+        INSERT INTO sentiments (asset_id, timestamp, avg_sentiment) VALUES
+            (1, '2024-03-01 00:00+00', 0.1), (1, '2024-03-01 00:00+00', 0.2), (1, '2024-03-01 01:00+00', 0.3);
+    """))
+
+    with Operations.context(MigrationContext.configure(conn)):
+        _load_migration("5f2c8a1d9e4b").upgrade()
+
+    assert conn.execute(text("SELECT close FROM candle_ohlcv ORDER BY candle_id")).scalars().all() == [2, 3, 4]
+    assert conn.execute(text("SELECT avg_sentiment, timeframe_id FROM sentiments ORDER BY id")).all() == \
+        [(0.2, 1), (0.3, 1)]
+    with pytest.raises(IntegrityError), db.begin_nested():
+        conn.execute(text("INSERT INTO candle_ohlcv (asset_id, timeframe_id, timestamp) VALUES (1, 1, '2024-03-01 00:00')"))
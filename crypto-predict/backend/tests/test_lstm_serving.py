@@ -0,0 +1,80 @@
+import os
+import numpy as np
+import pytest
+import torch
+
+from app.services.inference_service import MODEL_DIR, SEQ_LEN
+from app.services.lstm_service import find_shift, load_lstm, optimize_for_serving, stream_init, stream_step
+
+N_FEATURES = 14
+
+
+# -------------------------------------------------
+# 🔹 الموديل الأصلي (eager) + مدخلات ثابتة بنفس توزيع البيانات بعد الـ scaler
+# -------------------------------------------------
+@pytest.fixture(scope="module")
+def eager_model():
+    return load_lstm(os.path.join(MODEL_DIR, "lstm_model.pt"), N_FEATURES)
+
+
+@pytest.fixture(scope="module")
+def windows():
+    torch.manual_seed(0)
+    return torch.randn(512, SEQ_LEN, N_FEATURES)
+
+
+def _probs(model, x):
+    with torch.no_grad():
+        return torch.sigmoid(model(x))
+
+
+def test_script_mode_matches_eager(eager_model, windows):
+    scripted = optimize_for_serving(eager_model, "script")
+    assert torch.allclose(_probs(scripted, windows), _probs(eager_model, windows), atol=1e-6)
+
+
+def test_quantized_mode_within_tolerance(eager_model, windows):
+    quantized = optimize_for_serving(eager_model, "quantized")
+    diff = (_probs(quantized, windows) - _probs(eager_model, windows)).abs()
+
+    # int8 يغيّر الاحتمالات قليلاً: نسمح بفرق متوسط صغير وبحد أقصى معقول
+    assert diff.mean().item() < 0.03
+    assert diff.max().item() < 0.5
+
+
+def test_script_mode_supports_any_batch_size(eager_model):
+    scripted = optimize_for_serving(eager_model, "script")
+    for batch in (1, 7, 64):
+        assert _probs(scripted, torch.zeros(batch, SEQ_LEN, N_FEATURES)).shape == (batch,)
+
+
+def test_unknown_mode_is_rejected(eager_model):
+    with pytest.raises(ValueError):
+        optimize_for_serving(eager_model, "onnx")
+
+
+# -------------------------------------------------
+# 🔹 الـ streaming: كل شمعة خطوة واحدة، والنتيجة مطابقة لإعادة الحساب الكاملة
+# -------------------------------------------------
+def test_streaming_matches_full_recompute(eager_model):
+    torch.manual_seed(1)
+    history = torch.randn(SEQ_LEN + 100, N_FEATURES)
+
+    state = stream_init(eager_model, history[:SEQ_LEN])
+    for t in range(SEQ_LEN, len(history) + 1):
+        if t > SEQ_LEN:
+            stream_step(eager_model, state, history[t - 1:t])
+        with torch.no_grad():
+            expected = eager_model(history[t - SEQ_LEN:t].unsqueeze(0))[0]
+        assert abs(float(state.logit[0]) - float(expected)) < 1e-5
+
+
+def test_find_shift_detects_new_rows_and_backfills():
+    old = np.arange(SEQ_LEN * 2, dtype=float).reshape(SEQ_LEN, 2)
+    new = np.vstack([old[2:], [[-1, -1], [-2, -2]]])
+    assert find_shift(old, old, 12) == 0
+    assert find_shift(old, new, 12) == 2
+
+    corrected = new.copy()
+    corrected[5] += 1
+    assert find_shift(old, corrected, 12) is None
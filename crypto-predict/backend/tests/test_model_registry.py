@@ -0,0 +1,149 @@
+import hashlib
+import os
+
+import pytest
+
+from app.services import model_registry
+from app.services.model_registry import ModelRegistryError
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """registry و ml_models مؤقتان: لا شيء يلمس ملفات الموديل الحقيقية"""
+    legacy, root = tmp_path / "ml_models", tmp_path / "registry"
+    legacy.mkdir()
+    monkeypatch.setattr(model_registry, "LEGACY_MODEL_DIR", str(legacy))
+    monkeypatch.setattr(model_registry, "REGISTRY_DIR", str(root))
+    monkeypatch.setattr(model_registry, "VERSIONS_DIR", str(root / "versions"))
+    monkeypatch.setattr(model_registry, "ACTIVE_FILE", str(root / "ACTIVE"))
+    monkeypatch.setattr(model_registry, "HISTORY_FILE", str(root / "activations.log"))
+    monkeypatch.setattr(model_registry, "_active_cache", {})
+    return legacy
+
+
+def _artifacts(directory, tag):
+    files = {}
+    for name in model_registry.REQUIRED_ARTIFACTS:
+        path = directory / name
+        path.write_text(f"{tag}:{name}")
+        files[name] = str(path)
+    return files
+
+
+def _publish(tmp_path, tag, **kwargs):
+    source = tmp_path / tag
+    source.mkdir()
+    return model_registry.publish_version(_artifacts(source, tag), source="test", **kwargs)
+
+
+def _active_file():
+    with open(model_registry.ACTIVE_FILE) as f:
+        return f.read().strip()
+
+
+# -------------------------------------------------
+# 🔹 النشر: manifest بـ sha256 لكل ملف، وملفات للقراءة فقط
+# -------------------------------------------------
+def test_publish_writes_manifest_with_checksums(registry, tmp_path):
+    version = _publish(tmp_path, "v1", metrics={"accuracy": 0.6})
+
+    manifest = model_registry.verify_version(version)
+    assert manifest["version"] == version
+    assert manifest["metrics"] == {"accuracy": 0.6}
+    assert set(manifest["files"]) == set(model_registry.REQUIRED_ARTIFACTS)
+    content = b"v1:scaler.pkl"
+    assert manifest["files"]["scaler.pkl"] == {"sha256": hashlib.sha256(content).hexdigest(), "size": len(content)}
+    assert os.stat(os.path.join(model_registry.version_dir(version), "scaler.pkl")).st_mode & 0o777 == 0o444
+    # النشر وحده لا يغيّر النسخة الفعالة
+    assert not os.path.exists(model_registry.ACTIVE_FILE)
+
+
+def test_publish_rejects_missing_artifacts(registry, tmp_path):
+    files = _artifacts(tmp_path, "v1")
+    del files["xgb_model.json"]
+    with pytest.raises(ModelRegistryError):
+        model_registry.publish_version(files, source="test")
+    assert not os.path.isdir(model_registry.VERSIONS_DIR) or os.listdir(model_registry.VERSIONS_DIR) == []
+
+
+# -------------------------------------------------
+# 🔹 التفعيل: ACTIVE يُستبدل بـ os.replace، والـ rollback يرجع للنسخة السابقة
+# -------------------------------------------------
+def test_set_active_replaces_pointer_atomically(registry, tmp_path, monkeypatch):
+    first = _publish(tmp_path, "v1", activate=True)
+    second = _publish(tmp_path, "v2")
+    replaced = []
+    real_replace = os.replace
+    monkeypatch.setattr(model_registry.os, "replace",
+                        lambda src, dst: (replaced.append((src, dst)), real_replace(src, dst))[1])
+
+    model_registry.set_active(second)
+
+    assert [dst for _, dst in replaced] == [model_registry.ACTIVE_FILE]
+    assert not os.path.exists(replaced[0][0])
+    assert _active_file() == second
+    assert model_registry.get_active_version() == second
+    assert model_registry.activation_history() == [first, second]
+
+
+def test_rollback_returns_to_previous_version(registry, tmp_path):
+    first = _publish(tmp_path, "v1", activate=True)
+    second = _publish(tmp_path, "v2", activate=True)
+
+    assert model_registry.rollback() == first
+    assert model_registry.get_active_version() == first
+    assert [v["version"] for v in model_registry.list_versions() if v["active"]] == [first]
+    # الـ rollback التالي يرجع إلى الثانية (آخر نسخة فعالة غير الحالية)
+    assert model_registry.rollback() == second
+
+
+def test_rollback_without_history_fails(registry, tmp_path):
+    _publish(tmp_path, "v1", activate=True)
+    with pytest.raises(ModelRegistryError):
+        model_registry.rollback()
+
+
+# -------------------------------------------------
+# 🔹 أول تشغيل: الملفات القديمة في ml_models تصبح أول نسخة فعالة
+# -------------------------------------------------
+def test_bootstrap_from_legacy_files(registry):
+    _artifacts(registry, "legacy")
+    (registry / "lstm_config.json").write_text("{}")
+
+    version = model_registry.get_active_version()
+
+    manifest = model_registry.verify_version(version)
+    assert manifest["source"] == "bootstrap"
+    assert "lstm_config.json" in manifest["files"]
+    assert _active_file() == version
+
+
+def test_no_active_version_without_legacy_files(registry):
+    (registry / "features.json").write_text("[]")
+    assert model_registry.get_active_version() is None
+    assert not os.path.exists(model_registry.ACTIVE_FILE)
+
+
+# -------------------------------------------------
+# 🔹 نسخة تالفة: ملف معدّل أو محذوف يُرفض ولا يغيّر النسخة الفعالة
+# -------------------------------------------------
+@pytest.mark.parametrize("damage", ["modified", "deleted"])
+def test_corrupt_version_is_rejected(registry, tmp_path, damage):
+    good = _publish(tmp_path, "v1", activate=True)
+    bad = _publish(tmp_path, "v2")
+    path = os.path.join(model_registry.version_dir(bad), "xgb_model.json")
+    if damage == "modified":
+        os.chmod(path, 0o644)
+        with open(path, "a") as f:
+            f.write("tampered")
+    else:
+        os.remove(path)
+
+    with pytest.raises(ModelRegistryError):
+        model_registry.set_active(bad)
+    assert _active_file() == good
+
+
+def test_unknown_version_is_rejected(registry):
+    with pytest.raises(ModelRegistryError):
+        model_registry.set_active("20240101000000-abcde")
@@ -0,0 +1,48 @@
+import os
+import numpy as np
+import pytest
+import torch
+
+from app.services.inference_service import MODEL_DIR, SEQ_LEN
+from app.services.lstm_service import load_lstm
+from app.services.numpy_lstm_service import load_numpy_lstm
+
+N_FEATURES = 14
+PT_PATH = os.path.join(MODEL_DIR, "lstm_model.pt")
+NPZ_PATH = os.path.join(MODEL_DIR, "lstm_model.npz")
+
+
+@pytest.fixture(scope="module")
+def torch_model():
+    return load_lstm(PT_PATH, N_FEATURES)
+
+
+@pytest.fixture(scope="module")
+def windows():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((256, SEQ_LEN, N_FEATURES)).astype(np.float32)
+
+
+def _torch_logits(model, x):
+    with torch.no_grad():
+        return model(torch.from_numpy(x)).numpy()
+
+
+@pytest.mark.parametrize("path", [PT_PATH, NPZ_PATH])
+def test_numpy_backend_matches_torch(torch_model, windows, path):
+    numpy_model = load_numpy_lstm(path)
+    np.testing.assert_allclose(numpy_model(windows), _torch_logits(torch_model, windows), atol=1e-5)
+
+
+def test_numpy_backend_handles_single_window(torch_model, windows):
+    numpy_model = load_numpy_lstm(NPZ_PATH)
+    assert numpy_model(windows[:1]).shape == (1,)
+    np.testing.assert_allclose(numpy_model(windows[:1]), _torch_logits(torch_model, windows[:1]), atol=1e-5)
+
+
+def test_exported_npz_matches_pt_weights():
+    state_dict = torch.load(PT_PATH, map_location="cpu")
+    with np.load(NPZ_PATH) as exported:
+        assert set(exported.files) == set(state_dict)
+        for name, tensor in state_dict.items():
+            np.testing.assert_array_equal(exported[name], tensor.numpy())
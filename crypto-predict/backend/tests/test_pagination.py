@@ -0,0 +1,28 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services.pagination import InvalidCursor, decode_cursor, encode_cursor, page
+
+
+# -------------------------------------------------
+# 🔹 المؤشر المعتم: ذهاب وإياب بنفس القيم (مع الـ timezone)
+# -------------------------------------------------
+def test_cursor_round_trip():
+    values = [datetime(2024, 3, 1, 12, tzinfo=timezone.utc), 42]
+    assert decode_cursor(encode_cursor(values), 2) == values
+    assert decode_cursor(encode_cursor([datetime(2024, 3, 1)]), 1) == [datetime(2024, 3, 1)]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor([1, 2]), encode_cursor(["2024-01-01"])])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, 1)
+
+
+def test_page_has_next_cursor_only_when_more_rows():
+    rows = [(datetime(2024, 1, 1, h),) for h in (3, 2, 1)]
+    first = page(rows, 2, key_of=lambda r: [r[0]], to_item=lambda r: r[0])
+    assert first["items"] == [datetime(2024, 1, 1, 3), datetime(2024, 1, 1, 2)]
+    assert decode_cursor(first["next_cursor"], 1) == [datetime(2024, 1, 1, 2)]
+    assert page(rows, 3, key_of=lambda r: [r[0]], to_item=lambda r: r[0])["next_cursor"] is None
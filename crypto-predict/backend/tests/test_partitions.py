@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from app.services import partition_service
+from app.services.partition_service import _months, month_start, next_month, partition_name
+
+
+# -------------------------------------------------
+# 🔹 حساب الأشهر وأسماء الـ partitions (بدون قاعدة بيانات)
+# -------------------------------------------------
+def test_month_boundaries():
+    assert month_start(datetime(2024, 2, 29, 23, 59, tzinfo=timezone.utc)) == datetime(2024, 2, 1)
+    assert next_month(datetime(2024, 12, 1)) == datetime(2025, 1, 1)
+    assert partition_name("candle_ohlcv", datetime(2024, 3, 1)) == "candle_ohlcv_y2024m03"
+
+
+def test_months_cover_both_ends():
+    months = _months(datetime(2023, 11, 30, 23), datetime(2024, 2, 1))
+    assert months == [datetime(2023, 11, 1), datetime(2023, 12, 1), datetime(2024, 1, 1), datetime(2024, 2, 1)]
+
+
+def test_frame_range_includes_weekly_rollup_lookback(monkeypatch):
+    calls = []
+    monkeypatch.setattr(partition_service, "ensure_partitions", lambda start, end: calls.append((start, end)))
+
+    # أول ساعة يوم السبت 2022-01-01: bucket الأسبوع يبدأ الاثنين 2021-12-27 (شهر سابق)
+    partition_service.ensure_partitions_for(pd.DataFrame({"timestamp": pd.to_datetime(["2022-01-01", "2022-01-05"])}))
+    (start, end), = calls
+    assert month_start(start) == datetime(2021, 12, 1)
+    assert end == datetime(2022, 1, 5)
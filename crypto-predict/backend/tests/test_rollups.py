@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from app.db import models
+from app.routers import admin_reports
+from app.services import rollup_service
+
+START = datetime(2024, 3, 1)
+
+# أول bucket (4h): الافتتاح الأول والإغلاق الأخير ليسا الأعلى ولا الأدنى
+FIRST_BUCKET = [
+    # open, high, low, close, volume
+    (103, 104, 100, 101, 1),
+    (107, 108, 104, 105, 2),
+    (101, 105, 100, 104, 3),
+    (105, 106, 101, 102, 4),
+]
+
+
+@pytest.fixture
+def market(db, monkeypatch):
+    db.execute(text("CREATE TABLE candle_ohlcv_test PARTITION OF candle_ohlcv FOR VALUES FROM (MINVALUE) TO (MAXVALUE)"))
+    asset = models.CryptoAsset(symbol="TST", name="Test")
+    timeframes = {code: models.Timeframe(code=code, description=description)
+                  for code, _, description in [rollup_service.BASE_TIMEFRAME] + rollup_service.ROLLUP_TIMEFRAMES}
+    db.add_all([asset, *timeframes.values()])
+    db.flush()
+    monkeypatch.setattr(rollup_service, "_timeframe_ids", {code: tf.timeframe_id for code, tf in timeframes.items()})
+    return asset, timeframes
+
+
+def _add_hours(db, asset, tf, hours):
+    rows = []
+    for h in hours:
+        o, hi, lo, c, v = FIRST_BUCKET[h] if h < len(FIRST_BUCKET) else (100, 101, 99, 100, 1)
+        rows.append(models.Candle(asset_id=asset.asset_id, timeframe_id=tf.timeframe_id,
+                                  timestamp=START + timedelta(hours=h), open=o, high=hi, low=lo, close=c, volume=v))
+    db.add_all(rows)
+    db.flush()
+    return pd.DataFrame({"asset_id": asset.asset_id, "timeframe_id": tf.timeframe_id,
+                         "timestamp": [pd.Timestamp(r.timestamp) for r in rows]})
+
+
+def _rollups(db, asset, tf):
+    return db.execute(text(
+        "SELECT timestamp, open, high, low, close, volume FROM candle_ohlcv "
+        "WHERE asset_id = :asset AND timeframe_id = :tf ORDER BY timestamp"
+    ), {"asset": asset.asset_id, "tf": tf.timeframe_id}).all()
+
+
+# -------------------------------------------------
+# 🔹 bucket مغلق: أول افتتاح، آخر إغلاق، أعلى/أدنى، ومجموع الحجم؛ الـ bucket الناقص لا يُكتب
+# -------------------------------------------------
+def test_closed_bucket_matches_hourly_ohlcv(db, market):
+    asset, tfs = market
+    rollup_service.update_rollups(db, _add_hours(db, asset, tfs["1h"], range(6)))
+
+    assert [tuple(r) for r in _rollups(db, asset, tfs["4h"])] == [(START, 103, 108, 100, 102, 10)]
+    assert _rollups(db, asset, tfs["1d"]) == []
+
+
+# -------------------------------------------------
+# 🔹 تحديث تدريجي: دفعة لا تلمس إلا آخر ساعتين تُكمل الـ buckets التي لم تُجمّع بعد
+# -------------------------------------------------
+def test_incremental_update_catches_up_unrolled_buckets(db, market):
+    asset, tfs = market
+    rollup_service.update_rollups(db, _add_hours(db, asset, tfs["1h"], range(6)))
+    _add_hours(db, asset, tfs["1h"], range(6, 12))
+
+    counts = rollup_service.update_rollups(db, _add_hours(db, asset, tfs["1h"], range(12, 14)))
+
+    assert counts["4h"]["candles"] == 2
+    assert [r.timestamp for r in _rollups(db, asset, tfs["4h"])] == \
+        [START, START + timedelta(hours=4), START + timedelta(hours=8)]
+    # الـ bucket الأول لم يتغير، والأخير (12:00) ما زال ناقصاً
+    assert tuple(_rollups(db, asset, tfs["4h"])[0]) == (START, 103, 108, 100, 102, 10)
+
+
+# -------------------------------------------------
+# 🔹 إعادة البناء الكاملة: الـ rollups والميزات والملخص في نفس المعاملة
+# -------------------------------------------------
+def test_rebuild_refreshes_features_and_snapshots(db, market):
+    asset, tfs = market
+    db.execute(text("CREATE TABLE feature_store_test PARTITION OF feature_store FOR VALUES FROM (MINVALUE) TO (MAXVALUE)"))
+    _add_hours(db, asset, tfs["1h"], range(10))
+
+    result = admin_reports.rebuild_rollups(db=db, current_user=SimpleNamespace(role="admin"))
+
+    assert result["rollups"]["4h"]["candles"] == 2
+    stored = db.execute(text(
+        "SELECT timeframe_id, count(*) FROM feature_store WHERE asset_id = :asset GROUP BY timeframe_id"
+    ), {"asset": asset.asset_id}).all()
+    assert dict(stored) == {tfs["1h"].timeframe_id: 10, tfs["4h"].timeframe_id: 2}
+    assert db.get(models.AssetSnapshot, asset.asset_id).last_ts == START + timedelta(hours=9)
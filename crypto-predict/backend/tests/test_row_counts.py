@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app.db import models
+from app.services import partition_service, stats_service
+from tests.conftest import engine
+
+MONTH = datetime(2024, 3, 1)
+
+
+@pytest.fixture
+def market(db):
+    asset = models.CryptoAsset(symbol="TST", name="Test")
+    tf = models.Timeframe(code="1h", description="Hourly")
+    db.add_all([asset, tf])
+    db.flush()
+    return asset, tf
+
+
+def _values(asset, tf, hours):
+    return ", ".join(
+        f"({asset.asset_id}, {tf.timeframe_id}, '{MONTH + timedelta(hours=h):%Y-%m-%d %H:%M}+00', 1, 1, 1, 1, 1)"
+        for h in hours
+    )
+
+
+def _insert(db, table, asset, tf, hours):
+    db.execute(text(f"INSERT INTO {table} (asset_id, timeframe_id, timestamp, open, high, low, close, volume) "
+                    f"VALUES {_values(asset, tf, hours)}"))
+
+
+def _counted(db, table="candle_ohlcv"):
+    return db.execute(text("SELECT sum(delta) FROM table_row_counts WHERE table_name = :table"),
+                      {"table": table}).scalar()
+
+
+def _counter_rows(db, table="candle_ohlcv"):
+    return db.execute(text("SELECT count(*) FROM table_row_counts WHERE table_name = :table"),
+                      {"table": table}).scalar()
+
+
+# -------------------------------------------------
+# 🔹 triggers الجملة على الجدول الأب: INSERT / DELETE / TRUNCATE
+# -------------------------------------------------
+@pytest.fixture
+def partitioned(db, market):
+    # الشهر عبر partition_service: نفس الـ triggers التي تُنشأ مع الأشهر الجديدة
+    name = partition_service._create_partition(db.connection(), "candle_ohlcv", MONTH)
+    return (*market, name)
+
+
+def test_parent_statements_update_counter(db, partitioned):
+    asset, tf, _ = partitioned
+    assert _counted(db) == 0
+
+    _insert(db, "candle_ohlcv", asset, tf, range(5))
+    assert _counted(db) == 5
+
+    db.execute(text("DELETE FROM candle_ohlcv WHERE timestamp >= :ts"), {"ts": MONTH + timedelta(hours=3)})
+    assert _counted(db) == 3
+
+    db.execute(text("TRUNCATE candle_ohlcv"))
+    assert _counted(db) == 0
+    assert _counter_rows(db) == 1
+
+
+# -------------------------------------------------
+# 🔹 جمل مباشرة على partition واحد تُحسب في عداد الأب
+# -------------------------------------------------
+def test_partition_statements_count_toward_parent(db, partitioned):
+    asset, tf, name = partitioned
+    _insert(db, "candle_ohlcv", asset, tf, range(5))
+
+    _insert(db, name, asset, tf, range(5, 8))
+    assert _counted(db) == 8
+
+    db.execute(text(f"DELETE FROM {name} WHERE timestamp >= :ts"), {"ts": MONTH + timedelta(hours=6)})
+    assert _counted(db) == 6
+
+    db.execute(text(f"TRUNCATE {name}"))
+    assert _counted(db) == 0
+    assert _counted(db, name) is None
+
+
+def test_detach_partition_subtracts_rows(db, partitioned):
+    asset, tf, name = partitioned
+    _insert(db, "candle_ohlcv", asset, tf, range(4))
+
+    assert partition_service.detach_partition(db.connection(), "candle_ohlcv", MONTH) == 4
+    assert _counted(db) == 0
+
+    # الجدول المفصول لم يعد يكتب في عداد الأب
+    _insert(db, name, asset, tf, range(4, 6))
+    assert _counted(db) == 0
+
+
+# -------------------------------------------------
+# 🔹 الدمج: صف واحد لكل جدول بنفس المجموع، وتخطٍّ إذا كان دمج آخر يمسك القفل
+# -------------------------------------------------
+def test_compaction_merges_deltas(db, partitioned):
+    asset, tf, _ = partitioned
+    for hour in range(3):
+        _insert(db, "candle_ohlcv", asset, tf, [hour])
+    assert _counter_rows(db) == 4
+
+    assert stats_service.compact_row_counts(db.connection()) >= 1
+    assert _counter_rows(db) == 1
+    assert _counted(db) == 3
+
+
+def test_compaction_skips_while_another_holds_the_lock(db, partitioned):
+    asset, tf, _ = partitioned
+    _insert(db, "candle_ohlcv", asset, tf, [0])
+    with engine.connect() as other, other.begin():
+        other.execute(text("SELECT pg_advisory_xact_lock(hashtext('table_row_counts'))"))
+
+        assert stats_service.compact_row_counts(db.connection()) == 0
+
+    assert _counter_rows(db) == 2
+
+
+# -------------------------------------------------
+# 🔹 التقدير: مجموع reltuples للـ partitions (الأب المقسّم بلا صفوف)
+# -------------------------------------------------
+@pytest.mark.asyncio
+async def test_estimate_sums_leaf_partitions(async_db):
+    await async_db.execute(text(
+        "CREATE TABLE candle_ohlcv_early PARTITION OF candle_ohlcv FOR VALUES FROM (MINVALUE) TO ('2024-03-01')"))
+    await async_db.execute(text(
+        "CREATE TABLE candle_ohlcv_late PARTITION OF candle_ohlcv FOR VALUES FROM ('2024-03-01') TO (MAXVALUE)"))
+    assert await stats_service.estimated_counts(async_db, ["candle_ohlcv"]) == {}
+
+    tf = models.Timeframe(code="1h", description="Hourly")
+    async_db.add(tf)
+    await async_db.flush()
+    await async_db.execute(text(
+        "INSERT INTO candle_ohlcv (timestamp, open, high, low, close, volume, timeframe_id) "
+        "SELECT timestamp '2024-03-01' + h * interval '1 day', 1, 1, 1, 1, 1, :tf FROM generate_series(-3, 6) AS h"
+    ), {"tf": tf.timeframe_id})
+    await async_db.execute(text("ANALYZE candle_ohlcv"))
+
+    assert await stats_service.estimated_counts(async_db, ["candle_ohlcv"]) == {"candle_ohlcv": 10}
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from app.db import models
+from app.routers import prices
+from app.services import rollup_service
+from app.services.snapshot_service import refresh_snapshots, update_snapshots
+
+START = datetime(2024, 3, 1)
+
+
+@pytest.fixture
+def market(db, monkeypatch):
+    db.execute(text("CREATE TABLE candle_ohlcv_test PARTITION OF candle_ohlcv FOR VALUES FROM (MINVALUE) TO (MAXVALUE)"))
+    asset = models.CryptoAsset(symbol="TST", name="Test")
+    hourly, daily = models.Timeframe(code="1h", description="Hourly"), models.Timeframe(code="1d", description="Daily")
+    db.add_all([asset, hourly, daily])
+    db.flush()
+    # base_timeframe_id تقرأ عبر جلسة التطبيق
+    monkeypatch.setattr(rollup_service, "_timeframe_ids", {"1h": hourly.timeframe_id, "1d": daily.timeframe_id})
+    return asset, hourly, daily
+
+
+def _add_hours(db, asset, tf, hours):
+    # الإغلاق يزيد 1 كل ساعة، والـ high/low ±1 حوله
+    db.add_all([
+        models.Candle(asset_id=asset.asset_id, timeframe_id=tf.timeframe_id, timestamp=START + timedelta(hours=h),
+                      open=100 + h, high=101 + h, low=99 + h, close=100 + h, volume=2)
+        for h in hours
+    ])
+    db.flush()
+
+
+def _frame(asset, tf):
+    return pd.DataFrame({"asset_id": [asset.asset_id], "timeframe_id": [tf.timeframe_id]})
+
+
+def _snapshot(db, asset):
+    db.expire_all()
+    return db.get(models.AssetSnapshot, asset.asset_id)
+
+
+# -------------------------------------------------
+# 🔹 الملخص: آخر إغلاق مقابل آخر شمعة قبل 24 ساعة، والنطاق خلال الـ 24 ساعة
+# -------------------------------------------------
+def test_update_snapshots_summarizes_last_24_hours(db, market):
+    asset, hourly, _ = market
+    _add_hours(db, asset, hourly, range(30))
+
+    assert update_snapshots(db, _frame(asset, hourly)) == 1
+
+    snapshot = _snapshot(db, asset)
+    assert snapshot.last_ts == START + timedelta(hours=29)
+    assert (snapshot.last_close, snapshot.close_24h_ago) == (129, 105)
+    assert (snapshot.high_24h, snapshot.low_24h, snapshot.volume_24h) == (130, 105, 48)
+    assert snapshot.change_24h_pct == pytest.approx(24 / 105 * 100)
+
+
+def test_snapshot_without_24_hours_of_history_has_no_change(db, market):
+    asset, hourly, _ = market
+    _add_hours(db, asset, hourly, range(3))
+
+    update_snapshots(db, _frame(asset, hourly))
+
+    snapshot = _snapshot(db, asset)
+    assert snapshot.close_24h_ago is None
+    assert snapshot.change_24h_pct is None
+    assert (snapshot.high_24h, snapshot.low_24h, snapshot.volume_24h) == (103, 99, 6)
+
+
+def test_update_snapshots_ignores_rollup_timeframes(db, market):
+    asset, _, daily = market
+    assert update_snapshots(db, _frame(asset, daily)) == 0
+    assert _snapshot(db, asset) is None
+
+
+def test_refresh_snapshots_replaces_existing_row(db, market):
+    asset, hourly, _ = market
+    _add_hours(db, asset, hourly, range(3))
+    refresh_snapshots(db, [asset.asset_id])
+    _add_hours(db, asset, hourly, range(3, 30))
+
+    assert refresh_snapshots(db, [asset.asset_id]) == 1
+
+    snapshot = _snapshot(db, asset)
+    assert (snapshot.last_close, snapshot.close_24h_ago) == (129, 105)
+
+
+# -------------------------------------------------
+# 🔹 top-assets: قيم الـ 24 ساعة الفارغة تُرجع None
+# -------------------------------------------------
+@pytest.mark.asyncio
+async def test_top_assets_with_empty_24h_values(async_db):
+    asset = models.CryptoAsset(symbol="tst", name="Test")
+    async_db.add(asset)
+    await async_db.flush()
+    async_db.add(models.AssetSnapshot(asset_id=asset.asset_id, last_ts=START, last_close=100))
+    await async_db.flush()
+
+    top = await prices.get_top_assets(db=async_db)
+
+    assert [row for row in top if row["id"] == asset.asset_id] == [{
+        "id": asset.asset_id, "name": "TST", "price": 100.0, "change": None,
+        "high_24h": None, "low_24h": None, "volume_24h": None, "last_update": START,
+    }]